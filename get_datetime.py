@@ -1,12 +1,91 @@
 #!/usr/bin/env python3
 # -*- encoding: utf-8 -*-
 
+import os
+import sys
+
+# Unix socket of a `--serve' daemon used when set in the environment
+SOCKET_ENV = "GET_DATETIME_SOCKET"
+# Modes reading local files or stdin are never forwarded to a daemon, the
+# parser does not allow abbreviations so the option names are matched exactly
+LOCAL_MODES = {
+    "--serve",
+    "--stream",
+    "--merge",
+    "--between",
+    "--histogram",
+    "--batch",
+}
+
+
+def is_local(args: list) -> bool:
+    """Return whether a command line uses a mode which is never forwarded to
+    a daemon"""
+    return any(arg.partition("=")[0] in LOCAL_MODES for arg in args)
+
+
+def connect(path: str, args: list, color: bool = False) -> dict:
+    """Return the response of a `--serve' daemon for command line arguments,
+    color is whether the output may include ANSI color codes
+
+    Only light modules are imported so a client skips loading zone data,
+    relative paths are resolved against the client's working directory
+    """
+    import json
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        request = {"argv": args, "color": color, "cwd": os.getcwd()}
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+# Forward the command line to a daemon before the heavier imports below
+if __name__ == "__main__":
+    _args = sys.argv[1:]
+    _path = os.environ.get(SOCKET_ENV)
+    _explicit = "--connect" in _args
+    if _explicit:
+        _i = _args.index("--connect")
+        _path = _args[_i + 1] if _i + 1 < len(_args) else None
+        del _args[_i : _i + 2]
+    if _path and not is_local(_args):
+        try:
+            _color = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+            _response = connect(_path, _args, color=_color)
+        except OSError as err:
+            # Fall back to running locally unless the daemon was asked for
+            if _explicit:
+                print(f"Error: {err}")
+                sys.exit(1)
+        else:
+            sys.stdout.write(_response.get("output", ""))
+            sys.stderr.write(_response.get("error", ""))
+            sys.exit(_response.get("status", 0))
+
+import re
+
 from argparse import ArgumentParser
-from datetime import datetime, timedelta
-from re import search
+from array import array
+from bisect import bisect_left, bisect_right
+from calendar import isleap, monthrange
+from collections import OrderedDict, deque
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from itertools import compress, islice, product
 from pathlib import Path
-from sys import exit
-from zoneinfo import ZoneInfo, available_timezones
+from operator import itemgetter
+from struct import unpack_from
+from sys import exit, stderr, stdin, stdout
+from time import perf_counter_ns, time
+from zoneinfo import TZPATH, ZoneInfo, available_timezones
+
+# python -m pip install --upgrade pip numpy
+# Imported on first use by the batch functions, see `_import_numpy'
+numpy = None
 
 
 __version__ = "0.0.1c"
@@ -16,6 +95,192 @@ DEFAULT_FORMAT_ISO = "%Y-%m-%d %H:%M:%S (UTC%z) %Z"
 DEFAULT_LOCALZONE = "America/Denver"
 PROGRAM_NAME = Path(__file__).name
 
+UTC = ZoneInfo("UTC")
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=UTC)
+
+# Simple map for month names to int values
+MONTH_TO_INT = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+
+# Simple map for abbreviated time zone names to known zone names
+ABBR_TO_ZONE = {
+    "BJT": "Asia/Singapore",  # Beijing Time, China Standard Time
+    "BT": "Europe/London",  # British Time
+    "BST": "Europe/London",  # British Summer Time
+    "ET": "US/Eastern",  # US timezone
+    "EST": "US/Eastern",  # US timezone
+    "EDT": "US/Eastern",  # US timezone
+    "CT": "US/Central",  # US timezone
+    "CST": "US/Central",  # US timezone
+    "CDT": "US/Central",  # US timezone
+    "MT": "US/Mountain",  # US timezone
+    "MST": "US/Mountain",  # US timezone
+    "MDT": "US/Mountain",  # US timezone
+    "PT": "US/Pacific",  # US timezone
+    "PST": "US/Pacific",  # US timezone
+    "PDT": "US/Pacific",  # US timezone
+}
+
+# ISO 86001 datetime trailing UTC offset
+_ISO_OFFSET_PATTERN = re.compile(r".*[\+\-]\d\d:\d\d$")
+# UTC<+/-OFFSET> may be used in place of a timezone name
+_UTC_OFFSET_PATTERN = re.compile(
+    r"UTC(?P<modifier>[\+\-])(?P<hours>\d{1,2})(:)?((?P<minutes>\d{2}))?"
+)
+_WHITESPACE_PATTERN = re.compile(r"\s")
+_WHITESPACE_RUN_PATTERN = re.compile(r"\s+")
+# Locate well known timestamps within a line, (pattern, strptime format)
+_FIND_PATTERNS = (
+    # ISO 86001 datetime
+    (
+        re.compile(
+            r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[\+\-]\d{2}:\d{2})?"
+        ),
+        None,
+    ),
+    # Common Log Format: 13/Feb/2009:23:31:30 +0000
+    (
+        re.compile(r"\d{2}/[A-Za-z]{3}/\d{4}:\d{2}:\d{2}:\d{2} [\+\-]\d{4}"),
+        "%d/%b/%Y:%H:%M:%S %z",
+    ),
+    # Unix epoch timestamp in s, ms, us or ns, a bare number is only taken
+    # for one at the start of a line or after a time key (ts=, "time": ...)
+    # so order ids and phone numbers are left alone
+    (
+        re.compile(
+            r"(?:^\s*[\[\(\"']?|(?i:\bts|_ts|time|stamp|date|epoch|_at)[\"']?\s*[:=]"
+            r"\s*[\"']?)(?P<ts>\d{10}(\d{3}){0,3}(\.\d+)?)(?![\w\.])"
+        ),
+        None,
+    ),
+    # or anywhere with a fraction of a second
+    (re.compile(r"(?<![\w\.])(?P<ts>\d{10}(\d{3}){0,3}\.\d+)(?![\w\.])"), None),
+)
+
+# strptime directives handled by `FormatEngine', the same regular expressions
+# as `datetime.strptime' so both accept the same input
+_FORMAT_DIRECTIVES = {
+    "Y": r"(?P<Y>\d\d\d\d)",
+    "y": r"(?P<y>\d\d)",
+    "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "b": r"(?P<b>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)",
+    "B": (
+        r"(?P<B>september|february|november|december|january|october|august"
+        r"|march|april|june|july|may)"
+    ),
+    "d": r"(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])",
+    "a": r"(?P<a>mon|tue|wed|thu|fri|sat|sun)",
+    "A": r"(?P<A>wednesday|thursday|saturday|tuesday|monday|friday|sunday)",
+    "H": r"(?P<H>2[0-3]|[0-1]\d|\d)",
+    "M": r"(?P<M>[0-5]\d|\d)",
+    "S": r"(?P<S>6[0-1]|[0-5]\d|\d)",
+    "f": r"(?P<f>[0-9]{1,6})",
+    "z": r"(?P<z>[+-]\d\d:?[0-5]\d|(?-i:Z))",
+    "%": "%",
+}
+# Directives which set the same field
+_FORMAT_CONFLICTS = ({"Y", "y"}, {"m", "b", "B"}, {"a", "A"})
+_FORMAT_FIELDS = ("Y", "y", "m", "b", "B", "d", "H", "M", "S", "f", "z")
+
+# Unix epoch unit scale to nanoseconds by the maximum number of digits,
+# 10 digit seconds last until 2286 and 19 digit nanoseconds until 2262
+EPOCH_DIGITS = ((11, 10**9), (14, 10**6), (17, 10**3), (19, 1))
+# Unix epoch unit scale to nanoseconds by the number of digits
+_EPOCH_SCALES = {
+    digits: next(scale for limit, scale in EPOCH_DIGITS if digits <= limit)
+    for digits in range(1, EPOCH_DIGITS[-1][0] + 1)
+}
+# Unix epoch unit scale to nanoseconds for `--epoch-unit'
+EPOCH_UNITS = {"s": 10**9, "ms": 10**6, "us": 10**3, "ns": 1}
+
+# Range of datetimes which can be represented as datetime64[ns]
+_DATETIME64_MIN = datetime(1677, 9, 22)
+_DATETIME64_MAX = datetime(2262, 4, 11)
+
+# Characters allowed in an ISO 86001 datetime passed to numpy.datetime64
+_ISO_CHARS = "0123456789-:.T "
+
+# Zones listed in the multi-zone report
+REPORT_ZONES = [
+    "UTC",
+    "GMT",
+    "NZ",  # +12:00
+    "Australia/Sydney",  # +11:00 +10:00
+    "Asia/Tokyo",  # +09:00
+    "Asia/Seoul",  # +09:00
+    "Asia/Shanghai",  # +08:00
+    "Asia/Singapore",  # +08:00
+    "Asia/Qatar",  # +03:00
+    "Europe/Moscow",  # +03:00
+    "Europe/Warsaw",  # +02:00 +01:00
+    "Europe/Copenhagen",  # +02:00 +01:00
+    "Europe/Paris",  # +02:00 +01:00
+    "Europe/London",  # +01:00 +00:00
+    "Atlantic/Reykjavik",  # +00:00 +00:00
+    "America/Sao_Paulo",  # -03:00
+    "America/New_York",  # -04:00 -05:00
+    "America/Chicago",  # -05:00 -06:00
+    "America/Denver",  # -06:00 -07:00
+    "America/Los_Angeles",  # -07:00 -08:00
+    "Pacific/Honolulu",  # -10:00
+]
+
+# POSIX TZ string found in the footer of a TZif file, "MST7MDT,M3.2.0,M11.1.0"
+_TZ_NAME = r"[A-Za-z]{3,}|<[\+\-0-9A-Za-z]+>"
+_TZ_OFFSET = r"[\+\-]?\d{1,3}(:\d{2}(:\d{2})?)?"
+_TZ_RULE = r"(J\d{1,3}|\d{1,3}|M\d{1,2}\.\d\.\d)(/[\+\-]?\d{1,3}(:\d{2}(:\d{2})?)?)?"
+_POSIX_TZ_PATTERN = re.compile(
+    rf"^(?P<std>{_TZ_NAME})(?P<std_offset>{_TZ_OFFSET})"
+    rf"((?P<dst>{_TZ_NAME})(?P<dst_offset>{_TZ_OFFSET})?"
+    rf"(,(?P<start>{_TZ_RULE}),(?P<end>{_TZ_RULE}))?)?$"
+)
+
+# Durations such as "90", "5m" or "1h30m"
+_DURATION_PATTERN = re.compile(r"^(\d+[wdhms]?)+$")
+_DURATION_PART_PATTERN = re.compile(r"(?P<value>\d+)(?P<unit>[wdhms]?)")
+DURATION_UNITS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1, "": 1}
+
+# Lines buffered before each write in stream mode
+STREAM_BATCH_SIZE = 4096
+STREAM_BUFFER_SIZE = 1 << 20
+# Bytes of a file normalized by each `--jobs' worker task
+STREAM_CHUNK_SIZE = 1 << 23
+# Largest number of buckets a `Histogram' grows to, 128 MiB of counts
+HISTOGRAM_MAX_BUCKETS = 1 << 24
+# Days reported by `--transitions' without a number of days
+TRANSITION_DAYS = 30
+# Number of resolved inputs kept by a `Resolver'
+RESOLVE_CACHE_SIZE = 4096
+# `ZoneIndex' cache file under $XDG_CACHE_HOME or ~/.cache
+ZONE_INDEX_CACHE = Path("get_datetime") / "zones.json"
+# `TransitionCache' cache file next to the `ZoneIndex' cache file
+TRANSITION_CACHE = Path("get_datetime") / "transitions.json"
+# Geographic zone areas ranked before legacy aliases (US/*, Etc/*, ...)
+ZONE_AREAS = (
+    "Africa",
+    "America",
+    "Asia",
+    "Atlantic",
+    "Australia",
+    "Europe",
+    "Indian",
+    "Pacific",
+    "Antarctica",
+)
+
 
 class Kolor(object):
 
@@ -53,29 +318,902 @@ class Kolor(object):
         "white": 47,
     }
 
+    # Escape prefixes by (color, background, style, bright)
+    prefixes = {}
+
+    def __init__(self, enabled: bool = True):
+        # Text is returned unchanged when disabled, see `isatty'
+        self.enabled = enabled
+
+    @staticmethod
+    def isatty(output=None) -> bool:
+        """Return True when an output stream (default: stdout) is a terminal
+        and NO_COLOR is not set (https://no-color.org)"""
+        output = output or sys.stdout
+        try:
+            return output.isatty() and not os.environ.get("NO_COLOR")
+        except (AttributeError, ValueError):
+            return False
+
     def __call__(self, text=None, **kwargs):
         """Return a string in a ANSI escaped color/style/background codes"""
-        if text is None or kwargs.get("color") is None:
+        color = kwargs.get("color")
+        if text is None or color is None or not self.enabled:
             return text
 
+        key = (
+            color,
+            kwargs.get("background"),
+            kwargs.get("style"),
+            kwargs.get("bright", False),
+        )
+        prefix = self.prefixes.get(key)
+        if prefix is None:
+            prefix = self.prefixes[key] = self.escape(*key)
+        return f"{prefix}{text}\033[0m"
+
+    @classmethod
+    def escape(cls, color, background=None, style=None, bright=False) -> str:
+        """Return the escape sequence starting a color/style/background"""
         # Handle setting bright values
-        if kwargs.get("bright", False):
-            background = f"{self.__background_codes.get(str(kwargs.get('background')).lower(), 0) + 60};"
+        bright = 60 if bright else 0
+        background = cls.__background_codes.get(str(background).lower(), 0) + bright
+        # Handle setting style values
+        style = cls.__style_codes.get(str(style).lower(), 0)
+        # Handle setting color values
+        color = cls.__color_codes.get(str(color).lower(), 0) + bright
+        return f"\033[{background};{style};{color}m"
+
+
+# Date time pattern component parts
+_PATTERN_PARTS = {
+    "year": r"(?P<year>\d{4})",
+    "month": r"(?P<month>\S+)",
+    "day": r"(?P<weekday>\S+)",
+    "date": r"(?P<day>\d{1,2})",
+    "iso86001_date": r"(?P<year>\d{4})\-(?P<month>\d{2})\-(?P<day>\d{1,2})",
+    "hour": r"(?P<hour>\d{1,2})",
+    "minute": r"(?P<minute>\d{2})",
+    "second": r"(:(?P<second>\d{2}))?",
+    "meridiem": r"(\s*(?P<meridiem>(am|pm)))?",
+    "tzinfo_required": r"(?P<tzinfo>\S+)",
+    "tzinfo": r"(\s(?P<tzinfo>\S+))?",
+}
+
+# "Local" datetime patterns in order of precedence along with the
+# separators each one requires, " " stands for any whitespace character
+_PATTERN_TEMPLATES = (
+    # YYYY-mm-dd HH:MM[:SS][ Z]
+    (r"{iso86001_date}.{hour}:{minute}{second}{tzinfo}", "-"),
+    # Month dd HH:MM[:SS] Z YYYY
+    (
+        r"{month}\s{date}\s{hour}:{minute}{second}{meridiem}\s{tzinfo_required}\s{year}",
+        " ",
+    ),
+    # Day, Month dd, YYYY HH:MM[:SS][ Z]
+    (
+        r"{day},\s{month}\s{date},\s{year}\s{hour}:{minute}{second}{meridiem}{tzinfo}",
+        ", ",
+    ),
+    # Day, dd Month YYYY HH:MM[:SS][ Z]
+    (
+        r"{day},\s{date}\s{month}\s{year}\s{hour}:{minute}{second}{meridiem}{tzinfo}",
+        ", ",
+    ),
+    # Month dd HH:MM[:SS][am|pm] YYYY[ Z]
+    (
+        r"{month}\s{date}\s{hour}:{minute}{second}{meridiem}\s{year}{tzinfo}",
+        " ",
+    ),
+    # dd Month YYYY HH:MM[:SS] [Z]
+    (r"{date}\s{month}\s{year}\s{hour}:{minute}{second}{tzinfo}", " "),
+    # HH:MM[:SS][am|pm][ Z]
+    (r"{hour}:{minute}{second}{meridiem}{tzinfo}", ""),
+)
+_PATTERNS = tuple(
+    (re.compile(pattern.format(**_PATTERN_PARTS)), frozenset(required))
+    for pattern, required in _PATTERN_TEMPLATES
+)
+
+# Timezone names taken after a datetime found within a line, anything else
+# is the next word of the line
+_LOCATE_TZINFO = r"(?P<tzinfo>UTC[\+\-]\d{{1,2}}(:?\d{{2}})?|{abbrs})(?!\S)".format(
+    abbrs="|".join(sorted([*ABBR_TO_ZONE, "UTC", "GMT"], key=len, reverse=True))
+)
+_LOCATE_PARTS = dict(
+    _PATTERN_PARTS,
+    year=r"(?P<year>\d{4})(?!\d)",
+    month=(
+        r"\b(?P<month>(?i:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)"
+        r"[A-Za-z]*)"
+    ),
+    day=r"\b(?P<weekday>[A-Za-z]+)",
+    tzinfo_required=_LOCATE_TZINFO,
+    tzinfo=rf"(\s{_LOCATE_TZINFO})?",
+)
+
+# Syslog: Month dd HH:MM:SS, resolved from the groups of the match in the
+# current year
+_SYSLOG_PATTERN = re.compile(
+    r"{month}\s+{date}\s{hour}:{minute}:(?P<second>\d{{2}})(?!\d)".format(
+        **_LOCATE_PARTS
+    )
+)
+
+# Locate datetimes within a line, (pattern, strptime format) in order of
+# precedence, a bare HH:MM is not taken as a datetime
+_LOCATE_PATTERNS = (
+    *_FIND_PATTERNS,
+    *(
+        (re.compile(pattern.format(**_LOCATE_PARTS)), None)
+        for pattern, required in _PATTERN_TEMPLATES[:-1]
+    ),
+    (_SYSLOG_PATTERN, None),
+)
+
+
+class PatternEngine(object):
+    """Precompiled "local" datetime patterns
+
+    An input is classified by the separators it contains and only the
+    patterns which could possibly match are tried, in the same order as
+    the full pattern list.
+    """
+
+    patterns = tuple(pattern for pattern, _ in _PATTERNS)
+
+    # Patterns which fill in the date from the current datetime
+    partial = frozenset(
+        pattern
+        for pattern, _ in _PATTERNS
+        if not {"year", "month", "day"} <= pattern.groupindex.keys()
+    )
+
+    # Candidate patterns keyed on (has "-", has ",", has whitespace)
+    candidates = {
+        key: tuple(
+            pattern
+            for pattern, required in _PATTERNS
+            if required <= set(compress("-, ", key))
+        )
+        for key in product((False, True), repeat=3)
+    }
+
+    @classmethod
+    def classify(cls, dt_in: str) -> tuple:
+        """Return the candidate patterns which could match the input"""
+        # Every pattern requires a HH:MM time component
+        if ":" not in dt_in:
+            return ()
+        return cls.candidates[
+            (
+                "-" in dt_in,
+                "," in dt_in,
+                _WHITESPACE_PATTERN.search(dt_in) is not None,
+            )
+        ]
+
+    @classmethod
+    def search(cls, dt_in: str, trace=None):
+        """Return the first pattern match for the input or None"""
+        for pattern in cls.classify(dt_in):
+            m = pattern.search(dt_in)
+            if trace is not None:
+                trace("pattern", pattern=pattern.pattern, matched=m is not None)
+            if m is not None:
+                return m
+        return None
+
+
+class FormatEngine(object):
+    """Compiled strftime style formats
+
+    A format is compiled once into a regular expression and the fields are
+    converted with int() instead of `datetime.strptime', which looks up its
+    format cache and locale on every call. Formats using other directives,
+    and input the compiled pattern rejects, fall back to `datetime.strptime'
+    so results and errors are the same.
+    """
+
+    formats = {}
+
+    # Fixed offset tzinfo for each %z value
+    offsets = {}
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.pattern = None
+        parts = []
+        directives = set()
+        literal, percent = "", False
+        for char in fmt:
+            if percent:
+                regex = _FORMAT_DIRECTIVES.get(char)
+                if regex is None or char in directives:
+                    return
+                if char != "%":
+                    directives.add(char)
+                parts.append(regex)
+                percent = False
+            elif char == "%":
+                parts.append(self._literal(literal))
+                literal, percent = "", True
+            else:
+                literal += char
+        if percent:
+            return
+        if any(len(directives & conflict) > 1 for conflict in _FORMAT_CONFLICTS):
+            return
+        parts.append(self._literal(literal))
+        self.pattern = re.compile("".join(parts), re.IGNORECASE)
+
+    def __call__(self, dt_in: str) -> datetime:
+        """Return a datetime object like `datetime.strptime'"""
+        if self.pattern is not None:
+            m = self.pattern.match(dt_in)
+            if m is not None and m.end() == len(dt_in):
+                try:
+                    return self._build(m.groupdict())
+                except ValueError:
+                    pass
+        return datetime.strptime(dt_in, self.fmt)
+
+    @classmethod
+    def get(cls, fmt: str):
+        """Return the cached FormatEngine for a format"""
+        engine = cls.formats.get(fmt)
+        if engine is None:
+            engine = cls.formats[fmt] = cls(fmt)
+        return engine
+
+    @staticmethod
+    def _literal(text: str) -> str:
+        """Return a regular expression for format text between directives,
+        whitespace matches any run of whitespace like `datetime.strptime'"""
+        return r"\s+".join(
+            re.escape(part) for part in _WHITESPACE_RUN_PATTERN.split(text)
+        )
+
+    @classmethod
+    def _build(cls, values: dict) -> datetime:
+        """Return a datetime object for the matched fields, missing fields
+        default like `datetime.strptime'"""
+        Y, y, m, b, B, d, H, M, S, f, z = map(values.get, _FORMAT_FIELDS)
+        if Y is not None:
+            year = int(Y)
+        elif y is not None:
+            year = int(y)
+            year += 2000 if year < 69 else 1900
+        else:
+            year = 1900
+        if m is not None:
+            month = int(m)
+        elif b is not None or B is not None:
+            month = MONTH_TO_INT[(b or B).lower()[:3]]
         else:
-            background = f"{self.__background_codes.get(str(kwargs.get('background')).lower(), 0)};"
+            month = 1
+        tzinfo = None
+        if z is not None:
+            tzinfo = cls.offsets.get(z)
+            if tzinfo is None:
+                if z == "Z":
+                    tzinfo = timezone.utc
+                else:
+                    offset = timedelta(hours=int(z[1:3]), minutes=int(z[-2:]))
+                    tzinfo = timezone(-offset if z[0] == "-" else offset)
+                cls.offsets[z] = tzinfo
+        return datetime(
+            year,
+            month,
+            1 if d is None else int(d),
+            0 if H is None else int(H),
+            0 if M is None else int(M),
+            0 if S is None else int(S),
+            0 if f is None else int(f.ljust(6, "0")),
+            tzinfo,
+        )
 
-        # Handle setting style values
-        style = f"{self.__style_codes.get(str(kwargs.get('style')).lower(), 0)};"
 
-        # Handle setting color values
-        if kwargs.get("bright", False):
-            color = (
-                f"{self.__color_codes.get(str(kwargs.get('color')).lower(), 0) + 60}m"
+class Tracer(object):
+    """Record the stages of resolving an input as structured events
+
+    Each event is a dict passed to the sink callable, "elapsed" is the
+    nanoseconds spent since the previous event (the cost of the stage):
+      {"stage": "iso", "elapsed": 1520, "matched": False}
+
+    Code paths only check `trace is not None' so tracing costs nothing
+    when disabled.
+    """
+
+    def __init__(self, sink=None, **kwargs):
+        self.sink = sink if sink is not None else debug_sink
+        self.last = perf_counter_ns()
+
+    def __call__(self, stage: str, **fields):
+        now = perf_counter_ns()
+        self.sink({"stage": stage, "elapsed": now - self.last, **fields})
+        self.last = now
+
+    def reset(self):
+        """Start timing the next stage from now"""
+        self.last = perf_counter_ns()
+
+
+def debug_sink(event: dict):
+    """Print an event in the `--debug' message format to stderr, apart from
+    the output"""
+    for key, value in event.items():
+        if key not in ("stage", "elapsed"):
+            print(
+                f"DEBUG: {event['stage']} - {key} {type(value)}: {value!r}",
+                file=sys.stderr,
+            )
+
+
+def json_sink(event: dict, file=None):
+    """Write an event as a JSON line, to stderr by default"""
+    import json
+
+    print(json.dumps(event, default=repr), file=file or sys.stderr)
+
+
+def get_tracer(**kwargs):
+    """Return the tracer for **kwargs or None when tracing is disabled
+
+    **kwargs
+      trace <Tracer>: used as is
+      debug <bool>: print events in the `--debug' message format
+    """
+    trace = kwargs.get("trace")
+    if trace is None and kwargs.get("debug", False):
+        trace = Tracer(debug_sink)
+    return trace
+
+
+def _import_numpy():
+    """Return the numpy module, imported on first use as it is slow to load"""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            raise ImportError("numpy is required: python -m pip install numpy")
+        numpy = module
+    return numpy
+
+
+def _posix_seconds(value: str) -> int:
+    """Return seconds for a POSIX TZ [+-]hh[:mm[:ss]] value"""
+    sign = -1 if value.startswith("-") else 1
+    parts = [int(part) for part in value.lstrip("+-").split(":")] + [0, 0]
+    return sign * (parts[0] * 3600 + parts[1] * 60 + parts[2])
+
+
+def _posix_transition(rule: str, year: int) -> int:
+    """Return the local wall clock seconds since the Unix epoch a POSIX TZ
+    rule "Mm.w.d[/time]", "Jn[/time]" or "n[/time]" occurs at in a year"""
+    rule, _, time = rule.partition("/")
+    time = _posix_seconds(time) if time else 7200
+    if rule.startswith("M"):
+        month, week, weekday = (int(part) for part in rule[1:].split("."))
+        # POSIX weekdays start on Sunday, datetime weekdays start on Monday
+        first = (datetime(year, month, 1).weekday() + 1) % 7
+        day = 1 + (weekday - first) % 7 + (week - 1) * 7
+        while day > monthrange(year, month)[1]:
+            day -= 7
+        date = datetime(year, month, day)
+    elif rule.startswith("J"):
+        # Julian day 1-365, February 29th is never counted
+        day = int(rule[1:])
+        if isleap(year) and day >= 60:
+            day += 1
+        date = datetime(year, 1, 1) + timedelta(days=day - 1)
+    else:
+        # Zero based day 0-365, February 29th is counted
+        date = datetime(year, 1, 1) + timedelta(days=int(rule))
+    return (date - _EPOCH_NAIVE) // timedelta(seconds=1) + time
+
+
+class ZoneTable(object):
+    """UTC offset transitions of a zone loaded once into sorted arrays
+
+    Transitions are read from the zone's TZif file and those after the last
+    one in the file are generated from its POSIX TZ footer as needed, so the
+    offset and abbreviation in effect at an instant is a binary search. The
+    ZoneInfo object is used when no TZif file can be found.
+    """
+
+    # Loaded tables by zone name
+    tables = {}
+
+    def __init__(self, key: str):
+        self.key = key
+        self.zone = ZoneInfo(key)
+        # UTC epoch seconds of each transition
+        self.times = []
+        # What is in effect after each transition, index 0 is what is in
+        # effect before the first transition so `bisect_right' is the index
+        self.offsets = []
+        self.abbrs = []
+        self.isdst = []
+        self.tzinfos = []
+        # Fixed offset tzinfo objects by (offset, abbreviation)
+        self.fixed = {}
+        # POSIX TZ footer rule used for transitions after the last one loaded
+        self.rule = None
+        self.year = None
+        self.horizon = float("inf")
+        # Transitions found in each UTC year, see `transitions'
+        self.years = {}
+        self.loaded = self._load()
+
+    @classmethod
+    def get(cls, key: str):
+        """Return the table for a zone name, loading it once"""
+        table = cls.tables.get(key)
+        if table is None:
+            table = cls.tables[key] = cls(key)
+        return table
+
+    def _read(self):
+        """Return the TZif file content for the zone or None"""
+        for path in TZPATH:
+            try:
+                return (Path(path) / self.key).read_bytes()
+            except OSError:
+                continue
+        try:
+            from importlib.resources import files
+
+            return files("tzdata.zoneinfo").joinpath(*self.key.split("/")).read_bytes()
+        except (ImportError, OSError, ValueError):
+            return None
+
+    def _load(self) -> bool:
+        """Load transitions from the zone's TZif file (RFC 8536)"""
+        data = self._read()
+        if data is None or not data.startswith(b"TZif"):
+            return False
+
+        # Skip the version 1 data block when 64-bit version 2+ data follows
+        version = data[4:5]
+        width, fmt, offset = 4, "l", 0
+        counts = unpack_from(">6l", data, 20)
+        if version >= b"2":
+            isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = counts
+            offset = 44 + (
+                timecnt * 5 + typecnt * 6 + charcnt + leapcnt * 8 + isstdcnt + isutcnt
+            )
+            width, fmt = 8, "q"
+            counts = unpack_from(">6l", data, offset + 20)
+        isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = counts
+        offset += 44
+
+        times = unpack_from(f">{timecnt}{fmt}", data, offset)
+        offset += timecnt * width
+        indexes = data[offset : offset + timecnt]
+        offset += timecnt
+        types = [unpack_from(">lBB", data, offset + i * 6) for i in range(typecnt)]
+        offset += typecnt * 6
+        chars = data[offset : offset + charcnt]
+        offset += charcnt + leapcnt * (width + 4) + isstdcnt + isutcnt
+
+        def ttinfo(index):
+            utoff, isdst, abbrind = types[index]
+            abbr = chars[abbrind : chars.index(b"\0", abbrind)].decode()
+            return utoff, abbr, bool(isdst)
+
+        self._append(None, *ttinfo(0))
+        for time, index in zip(times, indexes):
+            self._append(time, *ttinfo(index))
+
+        # Transitions after the last one are described by the POSIX TZ footer
+        if version >= b"2":
+            footer = data[offset:].strip(b"\n").decode()
+            m = _POSIX_TZ_PATTERN.search(footer)
+            if m is not None and m.group("start"):
+                std_offset = -_posix_seconds(m.group("std_offset"))
+                if m.group("dst_offset"):
+                    dst_offset = -_posix_seconds(m.group("dst_offset"))
+                else:
+                    dst_offset = std_offset + 3600
+                self.rule = (
+                    (std_offset, m.group("std").strip("<>"), False),
+                    (dst_offset, m.group("dst").strip("<>"), True),
+                    m.group("start"),
+                    m.group("end"),
+                )
+                last = self.times[-1] if self.times else 0
+                self.year = datetime.fromtimestamp(last, tz=UTC).year - 1
+                self.horizon = float("-inf")
+                self._extend(last)
+        return True
+
+    def _extend(self, timestamp):
+        """Generate transitions from the POSIX TZ rule through a timestamp"""
+        std, dst, start, end = self.rule
+        while timestamp >= self.horizon:
+            self.year += 1
+            if self.year > 9999:
+                self.horizon = float("inf")
+                break
+            pending = sorted(
+                [
+                    (_posix_transition(start, self.year) - std[0], dst),
+                    (_posix_transition(end, self.year) - dst[0], std),
+                ]
             )
+            for time, ttinfo in pending:
+                if not self.times or time > self.times[-1]:
+                    self._append(time, *ttinfo)
+            # Transitions early in the next year may fall in this UTC year
+            next_year = datetime(self.year + 1, 1, 1) - _EPOCH_NAIVE
+            self.horizon = next_year // timedelta(seconds=1) - 2 * 86400
+
+    def _append(self, time, offset: int, abbr: str, isdst: bool):
+        """Append a transition, None for what is in effect before the first"""
+        if time is not None:
+            self.times.append(time)
+        tzinfo = self.fixed.get((offset, abbr))
+        if tzinfo is None:
+            tzinfo = self.fixed[(offset, abbr)] = timezone(
+                timedelta(seconds=offset), abbr
+            )
+        self.offsets.append(offset)
+        self.abbrs.append(abbr)
+        self.isdst.append(isdst)
+        self.tzinfos.append(tzinfo)
+
+    def index(self, timestamp) -> int:
+        """Return the index of what is in effect at a UTC epoch timestamp"""
+        if timestamp >= self.horizon:
+            self._extend(timestamp)
+        return bisect_right(self.times, timestamp)
+
+    def lookup(self, timestamp) -> tuple:
+        """Return the (UTC offset seconds, abbreviation) at a UTC epoch timestamp"""
+        if not self.loaded:
+            local = datetime.fromtimestamp(timestamp, tz=self.zone)
+            return local.utcoffset() // timedelta(seconds=1), local.tzname()
+        i = self.index(timestamp)
+        return self.offsets[i], self.abbrs[i]
+
+    def astimezone(self, dt: datetime) -> datetime:
+        """Return a datetime converted to the zone with a fixed offset tzinfo
+        which renders the same as the zone's ZoneInfo with strftime"""
+        if not self.loaded:
+            return dt.astimezone(self.zone)
+        timestamp = dt.timestamp()
+        if timestamp >= self.horizon:
+            self._extend(timestamp)
+        return dt.astimezone(self.tzinfos[bisect_right(self.times, timestamp)])
+
+    def transitions(self, start, end) -> list:
+        """Return (timestamp, (offset, abbreviation) before, (offset,
+        abbreviation) after) for each change from start up to end, UTC
+        epoch seconds, transitions changing nothing are skipped"""
+        first = datetime.fromtimestamp(start, tz=UTC).year
+        last = datetime.fromtimestamp(end, tz=UTC).year
+        return [
+            transition
+            for year in range(first, last + 1)
+            for transition in self.year_transitions(year)
+            if start <= transition[0] < end
+        ]
+
+    def year_transitions(self, year: int) -> list:
+        """Return the changes in a UTC year, found once per year"""
+        found = self.years.get(year)
+        if found is not None:
+            return found
+        start = (datetime(year, 1, 1) - _EPOCH_NAIVE) // timedelta(seconds=1)
+        if year < 9999:
+            end = (datetime(year + 1, 1, 1) - _EPOCH_NAIVE) // timedelta(seconds=1)
         else:
-            color = f"{self.__color_codes.get(str(kwargs.get('color')).lower(), 0)}m"
+            end = (datetime.max - _EPOCH_NAIVE) // timedelta(seconds=1)
+
+        found = self.years[year] = []
+        if self.loaded:
+            self.index(end)
+            for i in range(bisect_left(self.times, start), len(self.times)):
+                if self.times[i] >= end:
+                    break
+                before = self.offsets[i], self.abbrs[i]
+                after = self.offsets[i + 1], self.abbrs[i + 1]
+                if before != after:
+                    found.append((self.times[i], before, after))
+            return found
+
+        # Without transition data compare each day and bisect the seconds
+        # of a day where the offset or abbreviation changed
+        before = self.lookup(start)
+        for day in range(start, end, 86400):
+            after = self.lookup(min(day + 86400, end - 1))
+            if after == before:
+                continue
+            low, high = day, min(day + 86400, end - 1)
+            while low < high:
+                middle = (low + high) // 2
+                if self.lookup(middle) == before:
+                    low = middle + 1
+                else:
+                    high = middle
+            found.append((low, before, self.lookup(low)))
+            before = after
+        return found
+
+    def lookup_batch(self, timestamps):
+        """Return a numpy array of UTC offset seconds for an array of UTC
+        epoch seconds"""
+        numpy = _import_numpy()
+        if not self.loaded:
+            return numpy.array([self.lookup(int(ts))[0] for ts in timestamps])
+        if len(timestamps) and timestamps.max() >= self.horizon:
+            self._extend(int(timestamps.max()))
+        offsets = numpy.array(self.offsets, dtype=numpy.int64)
+        times = numpy.array(self.times, dtype=numpy.int64)
+        return offsets[numpy.searchsorted(times, timestamps, side="right")]
+
+
+class ZoneIndex(object):
+    """Zone names and abbreviations indexed for listing and lookups
+
+    Names are kept sorted so the zones under a prefix are a binary search,
+    abbreviations map to the zones which used them since 1970 taken from
+    the TZif transitions. The index is built once and cached on disk as
+    JSON until the installed tzdata changes.
+    """
+
+    # Loaded index, see `get'
+    index = None
+
+    def __init__(self, names: list, abbrs: dict):
+        self.names = sorted(names)
+        # (lower case name, name) sorted for case insensitive prefixes
+        self.keys = sorted((name.lower(), name) for name in self.names)
+        self.lower = dict(self.keys)
+        # Abbreviation to zone names, zones using it now first
+        self.abbrs = abbrs
+        # Last name component to zone name, "new york" for America/New_York,
+        # geographic areas are ranked first so they win over aliases
+        self.cities = {}
+        for name in sorted(self.names, key=self.rank):
+            city = name.rsplit("/", 1)[-1].replace("_", " ").lower()
+            self.cities.setdefault(city, name)
 
-        return f"\033[{background}{style}{color}{text}\033[0m"
+    @staticmethod
+    def rank(name: str) -> tuple:
+        """Return a sort key ranking geographic zones before aliases"""
+        area = name.split("/", 1)[0]
+        return ZONE_AREAS.index(area) if area in ZONE_AREAS else len(ZONE_AREAS), name
+
+    @classmethod
+    def get(cls):
+        """Return the index, read from the cache file or built once"""
+        import json
+
+        if cls.index is None:
+            path = cls.cache_path()
+            signature = cls.signature()
+            try:
+                with path.open() as f:
+                    data = json.load(f)
+                if data.get("signature") != signature:
+                    raise ValueError(f"Stale zone index: {path}")
+                cls.index = cls(data["names"], data["abbrs"])
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                cls.index = cls.build()
+                cls.index.save(path, signature)
+        return cls.index
+
+    @classmethod
+    def build(cls):
+        """Return an index of the available zones"""
+        now = time()
+        links = cls.links()
+        # Abbreviation to {zone name: in use now}
+        found = {}
+        for name in available_timezones():
+            try:
+                table = ZoneTable(name)
+            except (KeyError, ValueError, OSError):
+                continue
+            if not table.loaded:
+                continue
+            current = {table.lookup(now)[1], table.lookup(now + 182 * 86400)[1]}
+            # Skip numeric abbreviations such as "+08" and "-03"
+            for abbr in set(table.abbrs[table.index(0) :]):
+                if abbr.isalpha():
+                    zones = found.setdefault(abbr.upper(), {})
+                    zones[name] = abbr in current
+        abbrs = {
+            abbr: sorted(
+                zones,
+                key=lambda name: (not zones[name], name in links, *cls.rank(name)),
+            )
+            for abbr, zones in sorted(found.items())
+        }
+        return cls(available_timezones(), abbrs)
+
+    @staticmethod
+    def links() -> set:
+        """Return the zone names which are links to another zone, such as
+        Asia/Calcutta for Asia/Kolkata, read from tzdata.zi when installed"""
+        for path in TZPATH:
+            try:
+                with (Path(path) / "tzdata.zi").open() as f:
+                    return {line.split()[2] for line in f if line.startswith("L ")}
+            except (OSError, IndexError):
+                continue
+        return set()
+
+    @staticmethod
+    def cache_path(name: Path = ZONE_INDEX_CACHE) -> Path:
+        """Return the path of a cache file, the index by default"""
+        cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        return Path(cache) / name
+
+    @staticmethod
+    def signature() -> list:
+        """Return modification times and versions of the installed tzdata"""
+        signature = [__version__]
+        for path in TZPATH:
+            for item in (Path(path), Path(path) / "tzdata.zi"):
+                try:
+                    signature.append(f"{item}:{item.stat().st_mtime_ns}")
+                except OSError:
+                    continue
+        try:
+            from tzdata import IANA_VERSION
+
+            signature.append(f"tzdata:{IANA_VERSION}")
+        except ImportError:
+            pass
+        return signature
+
+    @staticmethod
+    def write(path: Path, data: dict):
+        """Write JSON to a cache file, unwritable caches are skipped"""
+        import json
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Replace the file at once so readers never see a partial cache
+            partial = path.with_name(f"{path.name}.{os.getpid()}")
+            with partial.open("w") as f:
+                json.dump(data, f)
+            partial.replace(path)
+        except OSError:
+            pass
+
+    def save(self, path: Path, signature: list):
+        """Write the index to a cache file, unwritable caches are skipped"""
+        self.write(
+            path, {"signature": signature, "names": self.names, "abbrs": self.abbrs}
+        )
+
+    def prefix(self, prefix: str) -> list:
+        """Return the zone names starting with a prefix, ignoring case"""
+        key = prefix.lower()
+        names = []
+        for i in range(bisect_left(self.keys, (key,)), len(self.keys)):
+            if not self.keys[i][0].startswith(key):
+                break
+            names.append(self.keys[i][1])
+        return sorted(names)
+
+    def resolve(self, name: str) -> str:
+        """Return the zone name for a name in any case, an abbreviation
+        ("MST"), a city ("new york") or a close misspelling
+
+        Raises ValueError for unknown names
+        """
+        key = name.strip().lower()
+        zone = self.lower.get(key) or self.lower.get(key.replace(" ", "_"))
+        if zone is not None:
+            return zone
+
+        # Hand written abbreviations come before those found in tzdata
+        abbr = name.strip().upper()
+        if abbr in ABBR_TO_ZONE:
+            return ABBR_TO_ZONE.get(abbr)
+        if abbr in self.abbrs:
+            return self.abbrs.get(abbr)[0]
+
+        city = key.replace("_", " ")
+        if city in self.cities:
+            return self.cities.get(city)
+
+        # Only misspelled names need the fuzzy matching
+        from difflib import get_close_matches
+
+        matches = get_close_matches(key, self.lower, n=1, cutoff=0.8)
+        if matches:
+            return self.lower.get(matches[0])
+        matches = get_close_matches(city, self.cities, n=1, cutoff=0.8)
+        if matches:
+            return self.cities.get(matches[0])
+        raise ValueError(f"Unknown time zone: {name!r}")
+
+
+class TransitionCache(object):
+    """Changes of each zone by UTC year cached on disk
+
+    Finding the changes of every zone loads each zone's `ZoneTable', so the
+    years found are kept as JSON next to the `ZoneIndex' cache file and
+    dropped with it when the installed tzdata changes.
+    """
+
+    # Loaded cache, see `get'
+    cache = None
+
+    def __init__(self, zones: dict, signature: list):
+        # Zone name to {UTC year: changes}
+        self.zones = zones
+        self.signature = signature
+        self.changed = False
+
+    @classmethod
+    def get(cls):
+        """Return the cache, read from the cache file once"""
+        import json
+
+        if cls.cache is None:
+            path = ZoneIndex.cache_path(TRANSITION_CACHE)
+            signature = ZoneIndex.signature()
+            try:
+                with path.open() as f:
+                    data = json.load(f)
+                if data.get("signature") != signature:
+                    raise ValueError(f"Stale transition cache: {path}")
+                zones = {
+                    zone: {
+                        int(year): [
+                            (timestamp, tuple(before), tuple(after))
+                            for timestamp, before, after in found
+                        ]
+                        for year, found in years.items()
+                    }
+                    for zone, years in data["zones"].items()
+                }
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                zones = {}
+            cls.cache = cls(zones, signature)
+        return cls.cache
+
+    def transitions(self, zone: str, start, end) -> list:
+        """Return the changes of a zone from start up to end like
+        `ZoneTable.transitions', years not cached yet are found once"""
+        years = self.zones.setdefault(zone, {})
+        first = datetime.fromtimestamp(start, tz=UTC).year
+        last = datetime.fromtimestamp(end, tz=UTC).year
+        found = []
+        for year in range(first, last + 1):
+            changes = years.get(year)
+            if changes is None:
+                changes = years[year] = ZoneTable.get(zone).year_transitions(year)
+                self.changed = True
+            found.extend(change for change in changes if start <= change[0] < end)
+        return found
+
+    def save(self):
+        """Write the cache file when years were added"""
+        if self.changed:
+            ZoneIndex.write(
+                ZoneIndex.cache_path(TRANSITION_CACHE),
+                {"signature": self.signature, "zones": self.zones},
+            )
+            self.changed = False
+
+
+def resolve_zone(name: str) -> str:
+    """Return a zone name, names ZoneInfo does not load are looked up in
+    the `ZoneIndex'"""
+    try:
+        ZoneInfo(name)
+        return name
+    except (KeyError, ValueError, OSError):
+        return ZoneIndex.get().resolve(name)
 
 
 class DT(object):
@@ -83,206 +1221,149 @@ class DT(object):
     @staticmethod
     def resolve_input(dt_in: str, **kwargs) -> datetime:
         """Return a datetime object"""
-        debug = kwargs.get("debug", False)
-
-        # Debug message
-        if debug:
-            print(f"DEBUG: DT.resolve_input - dt_in {type(dt_in)}: {dt_in!r}")
-            print(f"DEBUG: DT.resolve_input - **kwargs {type(kwargs)}: {kwargs!r}")
+        return DT.resolve(dt_in, **kwargs)[1]
 
-        # Current datetime WITH tzinfo set to UTC
-        # https://docs.python.org/3/library/datetime.html#datetime.datetime.now
-        now = datetime.now(tz=ZoneInfo("UTC"))
+    @staticmethod
+    def resolve(dt_in: str, **kwargs) -> tuple:
+        """Return a (matcher, datetime) tuple
 
-        # Debug message
-        if debug:
-            print(f"DEBUG: DT.resolve_input - now {type(now)}: {now!r}")
+        The matcher is "epoch", "iso", "fmt" or the re.Match of the "local"
+        datetime pattern which resolved the input, None for an empty input
+        """
+        trace = get_tracer(**kwargs)
+        if trace is not None:
+            trace.reset()
+            trace("start", dt_in=dt_in)
 
         # Return UTC now if the dt_in is empty
+        # https://docs.python.org/3/library/datetime.html#datetime.datetime.now
         if not dt_in:
-            return now
+            return None, datetime.now(tz=UTC)
 
         # Resolve Unix epoch timestamps (also matches floats)
         # 1234567890 == Fri Feb 13 23:31:30 2009 (UTC+0000) UTC
-        m = search(r"^(?P<seconds>\d+(\.\d+)?)$", dt_in)
-        if m is not None:
-            _EPOCH = datetime.fromtimestamp(float(dt_in), tz=ZoneInfo("UTC"))
-            # Debug message
-            if debug:
-                print(f"DEBUG: DT.resolve_input - _EPOCH {type(_EPOCH)}: {_EPOCH!r}")
-            return _EPOCH
+        _EPOCH = DT.resolve_epoch(dt_in, unit=kwargs.get("epoch_unit"))
+        if _EPOCH is not None:
+            # Trace event
+            if trace is not None:
+                trace("epoch", matched=True, dt=_EPOCH)
+            return "epoch", _EPOCH
+        if trace is not None:
+            trace("epoch", matched=False)
 
         # Resolve ISO 86001 datetime format
         try:
-            _ISO_86001 = dt_in
-            if _ISO_86001.endswith("Z"):
-                _ISO_86001 = _ISO_86001.replace("Z", "+00:00")
-            elif search(r".*[\+\-]\d\d:\d\d$", dt_in) is None:
-                _ISO_86001 += "+00:00"
-            _ISO_86001 = datetime.fromisoformat(_ISO_86001)
-            # Debug message
-            if debug:
-                print(
-                    f"DEBUG: DT.resolve_input - _ISO_86001 {type(_ISO_86001)}: {_ISO_86001!r}"
-                )
-            return _ISO_86001
+            _ISO_86001 = DT.resolve_iso(dt_in)
+            # Trace event
+            if trace is not None:
+                trace("iso", matched=True, dt=_ISO_86001)
+            return "iso", _ISO_86001
         except ValueError:
-            pass
+            if trace is not None:
+                trace("iso", matched=False)
 
         # Resolve using a provided datetime format
         if kwargs.get("fmt", False):
-            _FMT = datetime.strptime(dt_in, kwargs.get("fmt"))
-            # Debug message
-            if debug:
-                print(f"DEBUG: DT.resolve_input - _FMT {type(_FMT)}: {_FMT!r}")
-            return _FMT
-
-        # Simple map for month names to int values
-        month_to_int = {
-            "jan": 1,
-            "feb": 2,
-            "mar": 3,
-            "apr": 4,
-            "may": 5,
-            "jun": 6,
-            "jul": 7,
-            "aug": 8,
-            "sep": 9,
-            "oct": 10,
-            "nov": 11,
-            "dec": 12,
-        }
-
-        # Simple map for abbreviated time zone names to known zone names
-        abbr_to_zone = {
-            "BJT": "Asia/Singapore",  # Beijing Time, China Standard Time
-            "BT": "Europe/London",  # British Time
-            "BST": "Europe/London",  # British Summer Time
-            "ET": "US/Eastern",  # US timezone
-            "EST": "US/Eastern",  # US timezone
-            "EDT": "US/Eastern",  # US timezone
-            "CT": "US/Central",  # US timezone
-            "CST": "US/Central",  # US timezone
-            "CDT": "US/Central",  # US timezone
-            "MT": "US/Mountain",  # US timezone
-            "MST": "US/Mountain",  # US timezone
-            "MDT": "US/Mountain",  # US timezone
-            "PT": "US/Pacific",  # US timezone
-            "PST": "US/Pacific",  # US timezone
-            "PDT": "US/Pacific",  # US timezone
-        }
+            _FMT = FormatEngine.get(kwargs.get("fmt"))(dt_in)
+            # Trace event
+            if trace is not None:
+                trace("fmt", matched=True, dt=_FMT)
+            return "fmt", _FMT
 
         # Resolve a "local" datetime format(s)
-        dt = {}
-        # Date time pattern component parts
-        parts = {
-            "year": r"(?P<year>\d{4})",
-            "month": r"(?P<month>\S+)",
-            "day": r"(?P<weekday>\S+)",
-            "date": r"(?P<day>\d{1,2})",
-            "iso86001_date": r"(?P<year>\d{4})\-(?P<month>\d{2})\-(?P<day>\d{1,2})",
-            "hour": r"(?P<hour>\d{1,2})",
-            "minute": r"(?P<minute>\d{2})",
-            "second": r"(:(?P<second>\d{2}))?",
-            "meridiem": r"(\s*(?P<meridiem>(am|pm)))?",
-            "tzinfo_required": r"(?P<tzinfo>\S+)",
-            "tzinfo": r"(\s(?P<tzinfo>\S+))?",
-        }
-        for pattern in [
-            # YYYY-mm-dd HH:MM[:SS][ Z]
-            r"{iso86001_date}.{hour}:{minute}{second}{tzinfo}".format(**parts),
-            # Month dd HH:MM[:SS] Z YYYY
-            r"{month}\s{date}\s{hour}:{minute}{second}{meridiem}\s{tzinfo_required}\s{year}".format(
-                **parts
-            ),
-            # Day, Month dd, YYYY HH:MM[:SS][ Z]
-            r"{day},\s{month}\s{date},\s{year}\s{hour}:{minute}{second}{meridiem}{tzinfo}".format(
-                **parts
-            ),
-            # Day, dd Month YYYY HH:MM[:SS][ Z]
-            r"{day},\s{date}\s{month}\s{year}\s{hour}:{minute}{second}{meridiem}{tzinfo}".format(
-                **parts
-            ),
-            # Month dd HH:MM[:SS][am|pm] YYYY[ Z]
-            r"{month}\s{date}\s{hour}:{minute}{second}{meridiem}\s{year}{tzinfo}".format(
-                **parts
-            ),
-            # dd Month YYYY HH:MM[:SS] [Z]
-            r"{date}\s{month}\s{year}\s{hour}:{minute}{second}{tzinfo}".format(**parts),
-            # HH:MM[:SS][am|pm][ Z]
-            r"{hour}:{minute}{second}{meridiem}{tzinfo}".format(**parts),
-            # No pattern matched
-            None,
-        ]:
-            # Raise and error as no patterns matched,
-            if pattern is None:
-                raise ValueError(f"No pattern matched: {dt_in!r}")
-            # Check the pattern
-            m = search(pattern, dt_in)
-            if m is not None:
-                if debug:
-                    print(
-                        f"DEBUG: DT.resolve_input - used pattern {type(pattern)}: {pattern!r}"
-                    )
+        # Only the patterns which can possibly match the input are tried
+        m = PatternEngine.search(dt_in, trace=trace)
+        # Raise and error as no patterns matched
+        if m is None:
+            raise ValueError(f"No pattern matched: {dt_in!r}")
 
-                dt = m.groupdict()
-                if debug:
-                    print(f"DEBUG: DT.resolve_input - dt {type(dt)}: {dt!r}")
-
-                # Drop keys with a None value
-                # A default value is used when converted later
-                for key in sorted(dt.keys()):
-                    if dt.get(key) is None:
-                        _ = dt.pop(key)
-                if debug:
-                    print(f"DEBUG: DT.resolve_input - dt {type(dt)}: {dt!r}")
-
-                # Translate a Month name into an integer
-                if dt.get("month", False) and not dt.get("month").isdigit():
-                    dt.update(month=month_to_int.get(dt.get("month").lower()[:3]))
-                    # Debug message
-                    if debug:
-                        print(f"DEBUG: DT.resolve_input - dt {type(dt)}: {dt!r}")
-
-                # Translate ante/post meridian
-                # twelve hour clock to twenty four hour clock
-                if (
-                    dt.get("meridiem", "").lower() == "pm"
-                    and int(dt.get("hour", 99)) < 12
-                ):
-                    dt.update(hour=int(dt.get("hour")) + 12)
-                    if debug:
-                        print(f"DEBUG: DT.resolve_input - dt {type(dt)}: {dt!r}")
-
-                # UTC<+/-OFFSET> may be used in place of a timezone name
-                offset_pattern = r"UTC(?P<modifier>[\+\-])(?P<hours>\d{1,2})(:)?((?P<minutes>\d{2}))?"
-                offset = search(offset_pattern, str(dt.get("tzinfo")))
-                if offset is not None:
-                    offset = offset.groupdict()
-                    # Handle abbreviated offsets which lack minutes
-                    if offset.get("minutes") is None:
-                        offset.pop("minutes")
-                dt.update(offset=offset)
-                if debug:
-                    print(
-                        f"DEBUG: DT.resolve_input - offset {type(offset)}: {offset!r}"
-                    )
+        return m, DT.resolve_match(m, trace=trace)
 
-                # Translate a timezone name into a ZoneInfo
-                # Default to UTC if no timezone name was matched in `abbr_to_zone' map
-                tzinfo = abbr_to_zone.get(dt.get("tzinfo"), "UTC")
-                if debug:
-                    print(
-                        f"DEBUG: DT.resolve_input - tzinfo {type(tzinfo)}: {tzinfo!r}"
-                    )
-                dt.update(tzinfo=ZoneInfo(tzinfo))
+    @staticmethod
+    def resolve_epoch(dt_in: str, unit: str = None):
+        """Return a UTC datetime for a Unix epoch timestamp or None when the
+        input is not one
 
-                # No need to try additional date time patterns
-                break
+        The unit (s, ms, us, ns) is detected by the number of integer digits
+        unless given. Integer arithmetic is used so the datetime is exact to
+        the microsecond instead of subject to float rounding.
+        """
+        if dt_in.isdecimal():
+            seconds, fraction = dt_in, ""
+        else:
+            seconds, point, fraction = dt_in.partition(".")
+            if not (point and seconds.isdecimal() and fraction.isdecimal()):
+                return None
+        scale = EPOCH_UNITS[unit] if unit else _EPOCH_SCALES.get(len(seconds), 1)
+        try:
+            # Seconds with an optional fraction map directly onto a timedelta
+            if scale == 10**9:
+                microseconds = int(fraction[:6].ljust(6, "0")) if fraction else 0
+                return _EPOCH_UTC + timedelta(0, int(seconds), microseconds)
+            nanoseconds = int(seconds) * scale
+            if fraction:
+                nanoseconds += int(fraction[:9].ljust(9, "0")) * scale // 10**9
+            return _EPOCH_UTC + timedelta(0, 0, nanoseconds // 1000)
+        except OverflowError:
+            raise ValueError(f"Unix epoch timestamp out of range: {dt_in!r}")
 
-        # Debug message
-        if debug:
-            print(f"DEBUG: DT.resolve_input - dt {type(dt)}: {dt!r}")
+    @staticmethod
+    def resolve_iso(dt_in: str) -> datetime:
+        """Return a datetime object for an ISO 86001 datetime, UTC is assumed
+        when no offset is included, raises ValueError for other input"""
+        if dt_in.endswith("Z"):
+            dt_in = dt_in.replace("Z", "+00:00")
+        elif _ISO_OFFSET_PATTERN.search(dt_in) is None:
+            dt_in += "+00:00"
+        return datetime.fromisoformat(dt_in)
+
+    @staticmethod
+    def resolve_match(m, now: datetime = None, **kwargs) -> datetime:
+        """Return a datetime object for a "local" datetime pattern match"""
+        trace = get_tracer(**kwargs)
+
+        # Missing date parts are filled in from the current datetime
+        if now is None:
+            now = datetime.now(tz=UTC)
+
+        dt = m.groupdict()
+
+        # Drop keys with a None value
+        # A default value is used when converted later
+        for key in sorted(dt.keys()):
+            if dt.get(key) is None:
+                _ = dt.pop(key)
+
+        # Translate a Month name into an integer
+        if dt.get("month", False) and not dt.get("month").isdigit():
+            dt.update(month=MONTH_TO_INT.get(dt.get("month").lower()[:3]))
+
+        # Translate ante/post meridian
+        # twelve hour clock to twenty four hour clock
+        if dt.get("meridiem", "").lower() == "pm" and int(dt.get("hour", 99)) < 12:
+            dt.update(hour=int(dt.get("hour")) + 12)
+
+        # Trace event
+        if trace is not None:
+            trace("groups", dt=dict(dt))
+
+        # UTC<+/-OFFSET> may be used in place of a timezone name
+        offset = _UTC_OFFSET_PATTERN.search(str(dt.get("tzinfo")))
+        if offset is not None:
+            offset = offset.groupdict()
+            # Handle abbreviated offsets which lack minutes
+            if offset.get("minutes") is None:
+                offset.pop("minutes")
+        dt.update(offset=offset)
+
+        # Translate a timezone name into a ZoneInfo
+        # Default to UTC if no timezone name was matched in `ABBR_TO_ZONE' map
+        tzinfo = ABBR_TO_ZONE.get(dt.get("tzinfo"), "UTC")
+        dt.update(tzinfo=ZoneInfo(tzinfo))
+
+        # Trace event
+        if trace is not None:
+            trace("tzinfo", tzinfo=tzinfo, offset=offset)
 
         # Convert a dictionary to a datetime object
         if isinstance(dt, dict):
@@ -299,11 +1380,6 @@ class DT(object):
                     offset_modifier = "ahead of UTC"
                 else:
                     offset_modifier = "behind UTC"
-            if debug:
-                print(f"DEBUG: DT.resolve_input - offset {type(offset)}: {offset!r}")
-                print(
-                    f"DEBUG: DT.resolve_input - offset_modifier {type(offset_modifier)}: {offset_modifier!r}"
-                )
 
             # Create a datetime object from a dictionary object
             dt = datetime(
@@ -314,12 +1390,8 @@ class DT(object):
                 minute=int(dt.get("minute", 0)),
                 second=int(dt.get("second", 0)),
                 microsecond=int(dt.get("microsecond", 0)),
-                tzinfo=dt.get("tzinfo", ZoneInfo("UTC")),
+                tzinfo=dt.get("tzinfo", UTC),
             )
-            if debug:
-                print(
-                    f"DEBUG: DT.resolve_input - dt (dict to datetime) {type(dt)}: {dt!r}"
-                )
 
             if offset:
                 # Subtract the offset from UTC when the modifier was positive
@@ -328,107 +1400,1541 @@ class DT(object):
                 # Add the offset from UTC when the modifier was negative
                 elif offset_modifier == "behind UTC":
                     dt = dt + offset
-                if debug:
-                    print(
-                        f"DEBUG: DT.resolve_input - dt (offset adjusted) {type(dt)}: {dt!r}"
-                    )
 
-        # Debug message
-        if debug:
-            print(f"DEBUG: DT.resolve_input - dt {type(dt)}: {dt!r}")
+            # Trace event
+            if trace is not None:
+                trace("offset", offset=offset, offset_modifier=offset_modifier, dt=dt)
 
         return dt
 
+    @staticmethod
+    def locate(line: str) -> tuple:
+        """Return a (re.Match, strptime format) tuple for the first timestamp
+        found in a line of text, (None, None) when the line has no timestamp"""
+        # Well known timestamps are the most specific,
+        # fall back to the "local" datetime patterns
+        for pattern, fmt in _LOCATE_PATTERNS:
+            m = pattern.search(line)
+            if m is not None:
+                return m, fmt
+        return None, None
 
-# -----------------------------------------------------------------------------
-def main(**kwargs):
-    """Pretty print some info for a datetime object"""
-    debug = kwargs.get("debug", False)
+    @staticmethod
+    def span(m: re.Match) -> tuple:
+        """Return the (start, end) of the timestamp in a `DT.locate' match,
+        the "ts" group when the pattern also matches its context"""
+        if "ts" in m.re.groupindex:
+            return m.span("ts")
+        return m.span()
 
-    # Debug message
-    if debug:
-        print(f"DEBUG: main - **kwargs {type(kwargs)}: {kwargs!r}")
+    @staticmethod
+    def find_input(line: str, **kwargs):
+        """Return a (start, end, datetime) tuple for the first timestamp found
+        in a line of text or None when the line has no timestamp"""
+        m, fmt = DT.locate(line)
+        if m is None:
+            return None
+        if fmt is not None:
+            kwargs.update(fmt=fmt)
+        start, end = DT.span(m)
+        if m.re is _SYSLOG_PATTERN:
+            return start, end, DT.resolve_match(m, **kwargs)
+        return start, end, DT.resolve_input(line[start:end], **kwargs)
 
-    # Use ISO 8600 format
-    # 2021-12-29 21:17:15 (UTC-0700) MST
-    if kwargs.get("iso", False):
-        kwargs.update(fmt=DEFAULT_FORMAT_ISO)
-    # Wed Dec 29 21:17:15 2021 (UTC-0700) MST
-    else:
-        kwargs.update(fmt=DEFAULT_FORMAT)
-    # Debug message
-    if debug:
-        print(f"DEBUG: main - kwargs.get('fmt'): {kwargs.get('fmt')!r}")
+    @staticmethod
+    def resolve_batch(values, **kwargs):
+        """Return a datetime64[ns] UTC array for a column of Unix epoch
+        timestamps or ISO 86001 datetimes
 
-    dt = DT()
+        Epoch units (s, ms, us, ns) are detected by the number of digits. Rows
+        which can not be vectorized are resolved one at a time with
+        `DT.resolve_input', empty or unresolvable rows are NaT.
 
-    try:
-        result = dt.resolve_input(" ".join(kwargs.get("values")), debug=debug)
-    except Exception as err:
-        print(f"Error: {err}")
-        if kwargs.get("debug", False):
-            raise
+        **kwargs
+          fmt <str>: datetime format passed to `DT.resolve_input'
+          epoch_unit <str>: "s", "ms", "us" or "ns" instead of detecting it
+        """
+        numpy = _import_numpy()
+
+        text = numpy.char.strip(numpy.asarray(values).astype(str))
+        size = len(text)
+        lengths = numpy.char.str_len(text)
+        result = numpy.full(size, numpy.datetime64("NaT", "ns"))
+        pending = lengths > 0
+        limit = numpy.iinfo(numpy.int64).max
+        unit = kwargs.get("epoch_unit")
+
+        def epoch_scale(digits):
+            """Return nanoseconds per unit for integer digit counts"""
+            if unit:
+                return numpy.full(digits.shape, EPOCH_UNITS[unit], dtype=numpy.int64)
+            return numpy.select(
+                [digits <= maximum for maximum, _ in EPOCH_DIGITS],
+                [scale for _, scale in EPOCH_DIGITS],
+            )
+
+        # Unix epoch timestamps as integers
+        mask = pending & numpy.char.isdigit(text) & (lengths <= EPOCH_DIGITS[-1][0])
+        if mask.any():
+            rows = numpy.flatnonzero(mask)
+            ints = text[rows].astype(numpy.int64)
+            scale = epoch_scale(lengths[rows])
+            ok = ints <= limit // scale
+            rows = rows[ok]
+            result[rows] = (ints[ok] * scale[ok]).astype("datetime64[ns]")
+            pending[rows] = False
+
+        # Unix epoch timestamps with a decimal fraction
+        parts = numpy.char.partition(text, ".")
+        seconds, point, fraction = parts[:, 0], parts[:, 1], parts[:, 2]
+        digits = numpy.char.str_len(seconds)
+        mask = (
+            pending
+            & (point == ".")
+            & numpy.char.isdigit(seconds)
+            & numpy.char.isdigit(fraction)
+            & (digits <= EPOCH_DIGITS[-1][0])
+        )
+        if mask.any():
+            rows = numpy.flatnonzero(mask)
+            ints = seconds[rows].astype(numpy.int64)
+            scale = epoch_scale(digits[rows])
+            fractions = numpy.char.ljust(fraction[rows], 9, "0").astype("U9")
+            ok = ints < limit // scale - 1
+            rows = rows[ok]
+            result[rows] = (
+                ints[ok] * scale[ok]
+                + fractions[ok].astype(numpy.int64) * scale[ok] // 10**9
+            ).astype("datetime64[ns]")
+            pending[rows] = False
+
+        # ISO 86001 datetimes, YYYY-mm-dd[THH:MM[:SS[.f]]][Z|+HH:MM]
+        width = text.dtype.itemsize // 4
+        if width >= 10:
+            chars = numpy.ascontiguousarray(text).view("U1").reshape(size, width)
+            mask = pending & (lengths >= 10)
+            mask &= (chars[:, 4] == "-") & (chars[:, 7] == "-")
+            rows = numpy.flatnonzero(mask)
         else:
-            exit(1)
+            rows = numpy.array([], dtype=numpy.intp)
+        if rows.size:
+            chars = chars[rows].copy()
+            ends = lengths[rows].copy()
+            index = numpy.arange(rows.size)
 
-    # Debug message
-    if debug:
-        print(f"DEBUG: main - result {type(result)}: {result!r}")
+            # Drop a trailing "Z"
+            zulu = chars[index, ends - 1] == "Z"
+            chars[index[zulu], ends[zulu] - 1] = ""
+            ends[zulu] -= 1
 
-    localzone = kwargs.get("localzone", "UTC")
-    # Debug message
-    if debug:
-        print(f"DEBUG: main - localzone {type(localzone)}: {localzone!r}")
-        print("- - - -")
-
-    # Pretty print a list of timezones
-    kolor = Kolor()
-    print(result.astimezone(ZoneInfo(localzone)).strftime(kwargs.get("fmt")))
-    print(result.astimezone(ZoneInfo("UTC")).strftime(kwargs.get("fmt")))
-    print(f"Unix timestamp: {result.astimezone(ZoneInfo(localzone)).strftime('%s')}")
-    print("----------------------------------------------------------------")
-    for zone in [
-        "UTC",
-        "GMT",
-        "NZ",  # +12:00
-        "Australia/Sydney",  # +11:00 +10:00
-        "Asia/Tokyo",  # +09:00
-        "Asia/Seoul",  # +09:00
-        "Asia/Shanghai",  # +08:00
-        "Asia/Singapore",  # +08:00
-        "Asia/Qatar",  # +03:00
-        "Europe/Moscow",  # +03:00
-        "Europe/Warsaw",  # +02:00 +01:00
-        "Europe/Copenhagen",  # +02:00 +01:00
-        "Europe/Paris",  # +02:00 +01:00
-        "Europe/London",  # +01:00 +00:00
-        "Atlantic/Reykjavik",  # +00:00 +00:00
-        "America/Sao_Paulo",  # -03:00
-        "America/New_York",  # -04:00 -05:00
-        "America/Chicago",  # -05:00 -06:00
-        "America/Denver",  # -06:00 -07:00
-        "America/Los_Angeles",  # -07:00 -08:00
-        "Pacific/Honolulu",  # -10:00
-    ]:
-        zone = result.astimezone(ZoneInfo(zone))
-        zone = f"{zone.strftime(kwargs.get('fmt')):<40} {zone.tzinfo}"
-        # Apply color to the `localzone'
-        if zone.endswith(localzone):
-            zone = kolor(
-                zone, background="yellow", color="black", style="bold", bright=True
+            # Drop a trailing UTC offset, minutes east of UTC are kept
+            minutes = numpy.zeros(rows.size, dtype=numpy.int64)
+            tail = ends[:, None] + numpy.arange(-6, 0)
+            tail = chars[index[:, None], numpy.clip(tail, 0, None)]
+            offset = (
+                ~zulu
+                & (ends >= 16)
+                & ((tail[:, 0] == "+") | (tail[:, 0] == "-"))
+                & (tail[:, 3] == ":")
+                & numpy.char.isdigit(tail[:, [1, 2, 4, 5]]).all(axis=1)
             )
-        print(zone)
-    print("----------------------------------------------------------------")
-    print("")
+            if offset.any():
+                digits = tail[offset][:, [1, 2, 4, 5]].astype(numpy.int64)
+                sign = numpy.where(tail[offset, 0] == "-", -1, 1)
+                minutes[offset] = sign * (
+                    (digits[:, 0] * 10 + digits[:, 1]) * 60
+                    + digits[:, 2] * 10
+                    + digits[:, 3]
+                )
+                blank = ends[offset][:, None] + numpy.arange(-6, 0)
+                chars[index[offset][:, None], blank] = ""
 
+            # Only plain ISO 86001 datetimes are passed to numpy, checked with
+            # a lookup table of code points where 0 is the string padding
+            allowed = numpy.zeros(128, dtype=bool)
+            allowed[[0] + [ord(char) for char in _ISO_CHARS]] = True
+            codes = chars.view(numpy.uint32)
+            plain = (codes < 128).all(axis=1)
+            plain &= allowed[numpy.minimum(codes, 127)].all(axis=1)
+            body = chars.view(f"U{width}").ravel()[plain]
+            try:
+                parsed = body.astype("datetime64[ns]")
+            except ValueError:
+                # Parse one at a time to find the rows numpy rejects
+                parsed = numpy.full(body.size, numpy.datetime64("NaT", "ns"))
+                for i, item in enumerate(body):
+                    try:
+                        parsed[i] = numpy.datetime64(item, "ns")
+                    except ValueError:
+                        pass
+            ok = ~numpy.isnat(parsed)
+            minutes = minutes[plain][ok] * numpy.timedelta64(1, "m")
+            rows = rows[plain][ok]
+            result[rows] = parsed[ok] - minutes
+            pending[rows] = False
 
-# -----------------------------------------------------------------------------
-if __name__ == "__main__":
-    parser = ArgumentParser(
-        prog=PROGRAM_NAME,
-        description="List different time zones based on input or current datetime",
+        # Fall back to the scalar parser for the remaining rows
+        for i in numpy.flatnonzero(pending):
+            try:
+                dt = DT.resolve_input(
+                    str(text[i]), fmt=kwargs.get("fmt"), epoch_unit=unit
+                )
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone(UTC).replace(tzinfo=None)
+                # Avoid silently wrapping around the datetime64[ns] range
+                if _DATETIME64_MIN <= dt <= _DATETIME64_MAX:
+                    result[i] = numpy.datetime64(dt, "ns")
+            except (ValueError, OverflowError, OSError):
+                pass
+
+        return result
+
+    @staticmethod
+    def render_batch(values, to: str = "UTC", fmt: str = None, unit: str = "s"):
+        """Return a string array for a datetime64 UTC array rendered in a zone
+        or as Unix epoch timestamps, NaT rows are rendered as "NaT"
+
+        The ISO 86001 rendering is vectorized, a strftime `fmt' is applied
+        one row at a time
+        """
+        numpy = _import_numpy()
+
+        values = numpy.asarray(values, dtype="datetime64[ns]")
+        missing = numpy.isnat(values)
+        if to == "epoch":
+            seconds = values.astype(numpy.int64) // 10**9
+            return numpy.where(missing, "NaT", seconds.astype(str))
+        if fmt is None and to == "UTC":
+            values = numpy.where(missing, numpy.datetime64(0, "ns"), values)
+            rendered = numpy.datetime_as_string(values, unit=unit, timezone="UTC")
+            return numpy.where(missing, "NaT", rendered)
+        table = ZoneTable.get(to)
+        if fmt is None:
+            # Shift each instant by the offset in effect and append the offset
+            values = numpy.where(missing, numpy.datetime64(0, "ns"), values)
+            seconds = values.astype("datetime64[s]").astype(numpy.int64)
+            offsets = table.lookup_batch(seconds)
+            local = values + offsets * numpy.timedelta64(1, "s")
+            rendered = numpy.datetime_as_string(local, unit=unit)
+            unique, inverse = numpy.unique(offsets, return_inverse=True)
+            suffixes = numpy.array(
+                [
+                    f"{'-' if offset < 0 else '+'}{abs(offset) // 3600:02d}{abs(offset) // 60 % 60:02d}"
+                    for offset in unique.tolist()
+                ]
+            )
+            rendered = numpy.char.add(rendered, suffixes[inverse.ravel()])
+            return numpy.where(missing, "NaT", rendered)
+        rendered = [
+            "NaT"
+            if value is None
+            else table.astimezone(value.replace(tzinfo=UTC)).strftime(fmt)
+            for value in values.astype("datetime64[us]").tolist()
+        ]
+        return numpy.array(rendered, dtype=str)
+
+    @staticmethod
+    def render(result: datetime, to: str = "UTC", fmt: str = None) -> str:
+        """Return a datetime as a string in a zone or as a Unix epoch timestamp"""
+        # Naive datetimes (--fmt without %z) are UTC
+        if result.tzinfo is None:
+            result = result.replace(tzinfo=UTC)
+        if to == "epoch":
+            if result.microsecond:
+                return f"{result.timestamp():.6f}"
+            return str(int(result.timestamp()))
+        result = ZoneTable.get(to).astimezone(result)
+        if fmt:
+            return result.strftime(fmt)
+        return result.isoformat()
+
+
+class Resolver(object):
+    """Resolve many inputs which are likely to share a single format
+
+    The matcher which resolved the previous input is tried first and the
+    full `DT.resolve' search is only used when it misses. A "local" datetime
+    pattern is only reused when the input is not an ISO 86001 datetime and
+    none of the patterns before it match, so the result is always the same
+    as `DT.resolve'. Likewise the pattern which located the previous
+    timestamp in a line is reused unless an earlier one matches.
+
+    Resolved inputs are kept in a least recently used cache of `cache_size'
+    entries keyed on (input, format). Inputs which take the date from the
+    current datetime (HH:MM) are only reused until the next UTC midnight.
+    """
+
+    def __init__(self, **kwargs):
+        self.fmt = kwargs.get("fmt") or None
+        self.epoch_unit = kwargs.get("epoch_unit") or None
+        self.trace = get_tracer(**kwargs)
+        self.cache = OrderedDict()
+        self.cache_size = kwargs.get("cache_size", RESOLVE_CACHE_SIZE)
+        self.matcher = None
+        self.finder = None
+        self.hits = 0
+        self.misses = 0
+        self.find_hits = 0
+        self.find_misses = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, dt_in: str) -> datetime:
+        return self.resolve_input(dt_in)
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters of the cache and the recently matched
+        fast path"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "find_hits": self.find_hits,
+            "find_misses": self.find_misses,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def add_stats(self, stats: dict):
+        """Add the counters of another resolver's stats()"""
+        for key, value in stats.items():
+            if key != "cache_hit_rate":
+                setattr(self, key, getattr(self, key) + value)
+
+    def resolve_input(self, dt_in: str) -> datetime:
+        """Return a datetime object"""
+        return self._cached(dt_in, self.fmt, self._resolve)
+
+    def _cached(self, dt_in: str, fmt: str, resolve, *args) -> datetime:
+        """Return a cached datetime object or the result of
+        resolve(dt_in, *args)"""
+        key = (dt_in, fmt)
+        entry = self.cache.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time()):
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return entry[0]
+        self.cache_misses += 1
+        started = time()
+        result = resolve(dt_in, *args)
+        if not self.cache_size or not dt_in:
+            return result
+        # Partial inputs are only valid until the date they were filled in
+        # from changes
+        expires = None
+        if resolve == self._resolve and isinstance(self.matcher, re.Pattern):
+            partial = self.matcher in PatternEngine.partial
+        else:
+            partial = fmt is _SYSLOG_PATTERN
+        if partial:
+            expires = (started // 86400 + 1) * 86400
+        self.cache[key] = (result, expires)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def _resolve(self, dt_in: str) -> datetime:
+        """Return a datetime object trying the last matcher first"""
+        if self.matcher is not None and dt_in:
+            result = self._retry(dt_in)
+            if result is not None:
+                self.hits += 1
+                return result
+        self.misses += 1
+        matcher, result = DT.resolve(
+            dt_in, fmt=self.fmt, epoch_unit=self.epoch_unit, trace=self.trace
+        )
+        if isinstance(matcher, re.Match):
+            matcher = matcher.re
+        self.matcher = matcher
+        return result
+
+    def _retry(self, dt_in: str):
+        """Return a datetime object using the last matcher or None"""
+        matcher = self.matcher
+        # Unix epoch timestamps always take precedence
+        result = DT.resolve_epoch(dt_in, unit=self.epoch_unit)
+        if result is not None:
+            return result if matcher == "epoch" else None
+        if matcher == "iso":
+            try:
+                return DT.resolve_iso(dt_in)
+            except ValueError:
+                return None
+        if matcher == "fmt":
+            # ISO 86001 datetimes take precedence
+            try:
+                DT.resolve_iso(dt_in)
+                return None
+            except ValueError:
+                pass
+            try:
+                return FormatEngine.get(self.fmt)(dt_in)
+            except ValueError:
+                return None
+        if isinstance(matcher, re.Pattern):
+            m = matcher.search(dt_in)
+            if m is None:
+                return None
+            # ISO 86001 datetimes and the patterns before it take precedence
+            try:
+                DT.resolve_iso(dt_in)
+                return None
+            except ValueError:
+                pass
+            for pattern in PatternEngine.classify(dt_in):
+                if pattern is matcher:
+                    break
+                if pattern.search(dt_in) is not None:
+                    return None
+            else:
+                return None
+            if self.trace is not None:
+                self.trace.reset()
+            return DT.resolve_match(m, trace=self.trace)
+        return None
+
+    def find_input(self, line: str):
+        """Return a (start, end, datetime) tuple for the first timestamp found
+        in a line of text or None when the line has no timestamp"""
+        m = None
+        if self.finder is not None:
+            pattern, fmt = self.finder
+            m = pattern.search(line)
+            # The locate patterns before it take precedence
+            if m is not None:
+                for earlier, _ in _LOCATE_PATTERNS:
+                    if earlier is pattern:
+                        break
+                    if earlier.search(line) is not None:
+                        m = None
+                        break
+        if m is not None:
+            self.find_hits += 1
+        else:
+            self.find_misses += 1
+            m, fmt = DT.locate(line)
+            if m is None:
+                return None
+            self.finder = (m.re, fmt)
+        start, end = DT.span(m)
+        if fmt is not None:
+            result = self._cached(line[start:end], fmt, FormatEngine.get(fmt))
+            return start, end, result
+        if m.re is _SYSLOG_PATTERN:
+            result = self._cached(
+                line[start:end],
+                _SYSLOG_PATTERN,
+                lambda dt_in: DT.resolve_match(m, trace=self.trace),
+            )
+            return start, end, result
+        return start, end, self.resolve_input(line[start:end])
+
+
+# -----------------------------------------------------------------------------
+def main(**kwargs):
+    """Pretty print some info for a datetime object"""
+    trace = get_tracer(**kwargs)
+
+    # Trace event
+    if trace is not None:
+        trace("main", kwargs=kwargs)
+
+    # Use ISO 8600 format
+    # 2021-12-29 21:17:15 (UTC-0700) MST
+    if kwargs.get("iso", False):
+        kwargs.update(fmt=DEFAULT_FORMAT_ISO)
+    # Wed Dec 29 21:17:15 2021 (UTC-0700) MST
+    else:
+        kwargs.update(fmt=DEFAULT_FORMAT)
+
+    dt = DT()
+
+    try:
+        result = dt.resolve_input(
+            " ".join(kwargs.get("values")),
+            epoch_unit=kwargs.get("epoch_unit"),
+            trace=trace,
+        )
+    except Exception as err:
+        print(f"Error: {err}")
+        if kwargs.get("debug", False):
+            raise
+        else:
+            exit(1)
+
+    localzone = kwargs.get("localzone", "UTC")
+    # Trace event
+    if trace is not None:
+        trace("result", result=result, localzone=localzone, fmt=kwargs.get("fmt"))
+
+    # Pretty print a list of timezones, written at once with color only
+    # when the output is a terminal
+    output = kwargs.get("output")
+    color = kwargs.get("color")
+    kolor = Kolor(Kolor.isatty(output) if color is None else color)
+    fmt = kwargs.get("fmt")
+    lines = [
+        result.astimezone(ZoneInfo(localzone)).strftime(fmt),
+        result.astimezone(ZoneInfo("UTC")).strftime(fmt),
+        f"Unix timestamp: {result.astimezone(ZoneInfo(localzone)).strftime('%s')}",
+        "----------------------------------------------------------------",
+    ]
+    for zone in REPORT_ZONES:
+        local = result.astimezone(ZoneInfo(zone))
+        zone = f"{local.strftime(fmt):<40} {zone}"
+        # Apply color to the `localzone'
+        if zone.endswith(localzone):
+            zone = kolor(
+                zone, background="yellow", color="black", style="bold", bright=True
+            )
+        lines.append(zone)
+    lines.append("----------------------------------------------------------------")
+    lines.append("\n")
+    print("\n".join(lines), end="", file=output)
+
+
+# -----------------------------------------------------------------------------
+def read_lines(paths, **kwargs):
+    """Yield lines from each file path, "-" or no paths reads from stdin"""
+    buffering = kwargs.get("buffering", STREAM_BUFFER_SIZE)
+    for path in paths or ["-"]:
+        if path == "-":
+            handle = open(
+                stdin.fileno(),
+                buffering=buffering,
+                errors="surrogateescape",
+                closefd=False,
+            )
+        else:
+            handle = open(path, buffering=buffering, errors="surrogateescape")
+        with handle:
+            yield from handle
+
+
+def normalize_lines(lines, **kwargs):
+    """Yield lines with the first timestamp found normalized
+
+    **kwargs
+      resolver <Resolver>: resolver used to find timestamps
+        Default: Resolver()
+      to <str>: zone name or "epoch" to normalize timestamps to
+        Default: "UTC"
+      fmt <str>: strftime format used when normalizing to a zone
+        Default: ISO 86001
+    """
+    resolver = kwargs.get("resolver") or Resolver()
+    to = kwargs.get("to") or "UTC"
+    fmt = kwargs.get("fmt") or None
+    find_input = resolver.find_input
+    render = DT.render
+    for line in lines:
+        try:
+            found = find_input(line)
+        except (ValueError, OverflowError, OSError):
+            found = None
+        # Pass lines through untouched when no timestamp is found
+        if found is None:
+            yield line
+            continue
+        start, end, result = found
+        yield f"{line[:start]}{render(result, to=to, fmt=fmt)}{line[end:]}"
+
+
+def open_output(**kwargs):
+    """Return a buffered text stream writing to stdout"""
+    return open(
+        stdout.fileno(),
+        "w",
+        buffering=kwargs.get("buffering", STREAM_BUFFER_SIZE),
+        errors="surrogateescape",
+        closefd=False,
+    )
+
+
+def write_lines(lines, output, **kwargs):
+    """Write lines to output in batches"""
+    batch_size = kwargs.get("batch_size", STREAM_BATCH_SIZE)
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            output.write("".join(batch))
+            batch.clear()
+    if batch:
+        output.write("".join(batch))
+    output.flush()
+
+
+def stream(**kwargs):
+    """Normalize the timestamp in each line read from files or stdin"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("stream", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+
+    # Timestamps are parsed with `--fmt' and written using `--iso' or ISO 86001
+    resolver = Resolver(
+        fmt=kwargs.get("fmt"),
+        epoch_unit=kwargs.get("epoch_unit"),
+        trace=kwargs.get("trace"),
+        debug=debug,
+    )
+    fmt = DEFAULT_FORMAT_ISO if kwargs.get("iso", False) else None
+
+    paths = kwargs.get("values")
+    jobs = kwargs.get("jobs", 1)
+    if jobs != 1 and paths and "-" not in paths:
+        lines = normalize_files(
+            paths,
+            jobs=jobs,
+            resolver=resolver,
+            to=kwargs.get("to"),
+            fmt=fmt,
+        )
+    else:
+        lines = read_lines(paths)
+        lines = normalize_lines(
+            lines, resolver=resolver, to=kwargs.get("to"), fmt=fmt
+        )
+    try:
+        write_lines(lines, output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+    # Report how often the recently matched fast path was taken
+    if kwargs.get("stats", False):
+        for key, value in resolver.stats().items():
+            print(f"{key}: {value}", file=stderr)
+
+
+def chunk_offsets(path: str, size: int = STREAM_CHUNK_SIZE) -> list:
+    """Return (start, end) byte offsets splitting a file into chunks of
+    about size bytes which begin and end on line boundaries"""
+    from mmap import ACCESS_READ, mmap
+
+    with open(path, "rb") as handle:
+        length = handle.seek(0, 2)
+        if not length:
+            return []
+        with mmap(handle.fileno(), 0, access=ACCESS_READ) as mm:
+            starts = {_line_start(mm, offset) for offset in range(0, length, size)}
+    starts = sorted(starts - {length})
+    return list(zip(starts, starts[1:] + [length]))
+
+
+def _normalize_chunk(task: tuple) -> tuple:
+    """Return the normalized text and resolver stats of a file chunk
+
+    Runs in a `--jobs' worker, the file is memory-mapped by each worker so
+    only offsets and output are passed between processes.
+    """
+    from mmap import ACCESS_READ, mmap
+
+    path, start, end, options = task
+    resolver = Resolver(
+        fmt=options.get("parse_fmt"), epoch_unit=options.get("epoch_unit")
+    )
+    with open(path, "rb") as handle:
+        with mmap(handle.fileno(), 0, access=ACCESS_READ) as mm:
+            text = mm[start:end].decode(errors="surrogateescape")
+    # Split and translate newlines the same as the text files of `read_lines'
+    lines = StringIO(text, newline=None)
+    text = "".join(
+        normalize_lines(
+            lines, resolver=resolver, to=options.get("to"), fmt=options.get("fmt")
+        )
+    )
+    return text, resolver.stats()
+
+
+def normalize_files(paths, **kwargs):
+    """Yield the normalized text of files in order, chunks are normalized in
+    parallel by a pool of worker processes
+
+    **kwargs
+      jobs <int>: number of worker processes, 0 for one per CPU
+        Default: 0
+      resolver <Resolver>: parse options are copied from it and the worker
+        stats are added to it
+      chunk_size <int>: bytes normalized by each worker task
+        Default: STREAM_CHUNK_SIZE
+      to, fmt: passed to `normalize_lines'
+    """
+    from multiprocessing import Pool
+
+    resolver = kwargs.get("resolver") or Resolver()
+    chunk_size = kwargs.get("chunk_size", STREAM_CHUNK_SIZE)
+    options = {
+        "parse_fmt": resolver.fmt,
+        "epoch_unit": resolver.epoch_unit,
+        "to": kwargs.get("to"),
+        "fmt": kwargs.get("fmt"),
+    }
+    tasks = (
+        (path, start, end, options)
+        for path in paths
+        for start, end in chunk_offsets(path, chunk_size)
+    )
+    jobs = kwargs.get("jobs") or os.cpu_count() or 1
+    with Pool(jobs) as pool:
+        # Results are returned in task order with at most two chunks per
+        # worker in flight, so a slow output does not buffer whole files
+        def submit(task):
+            return pool.apply_async(_normalize_chunk, (task,))
+
+        pending = deque(map(submit, islice(tasks, 2 * jobs)))
+        while pending:
+            text, stats = pending.popleft().get()
+            pending.extend(map(submit, islice(tasks, 1)))
+            resolver.add_stats(stats)
+            yield text
+
+
+def timeline_lines(lines, **kwargs):
+    """Yield (UTC epoch seconds, line) tuples with the first timestamp found
+    in each line normalized
+
+    Lines without a timestamp keep the timestamp of the previous line so
+    multi-line records (stack traces) stay together, naive datetimes are
+    taken as UTC.
+
+    **kwargs
+      resolver <Resolver>: resolver used to find timestamps
+        Default: Resolver()
+      to <str>: zone name or "epoch" to normalize timestamps to
+        Default: "UTC"
+      fmt <str>: strftime format used when normalizing to a zone
+        Default: ISO 86001
+    """
+    resolver = kwargs.get("resolver") or Resolver()
+    to = kwargs.get("to") or "UTC"
+    fmt = kwargs.get("fmt") or None
+    find_input = resolver.find_input
+    render = DT.render
+    timestamp = float("-inf")
+    for line in lines:
+        try:
+            found = find_input(line)
+        except (ValueError, OverflowError, OSError):
+            found = None
+        if found is not None:
+            start, end, result = found
+            timestamp = _utc_timestamp(result)
+            line = f"{line[:start]}{render(result, to=to, fmt=fmt)}{line[end:]}"
+        # A last line without a newline would run into the next file's line
+        if not line.endswith("\n"):
+            line += "\n"
+        yield timestamp, line
+
+
+def merge_lines(paths, **kwargs):
+    """Yield the lines of many files in timestamp order
+
+    Each file is expected to be in timestamp order already, a heap holds one
+    line per file so memory does not grow with the size of the files. Equal
+    timestamps keep the order of the paths.
+
+    **kwargs
+      fmt <str>: datetime format passed to each file's `Resolver'
+      epoch_unit <str>: Unix epoch unit passed to each file's `Resolver'
+      to, output_fmt: passed to `timeline_lines' as to, fmt
+    """
+    from heapq import merge as heap_merge
+
+    timelines = [
+        timeline_lines(
+            read_lines([path]),
+            # Hosts may log in different formats, one resolver per file
+            resolver=Resolver(
+                fmt=kwargs.get("fmt"), epoch_unit=kwargs.get("epoch_unit")
+            ),
+            to=kwargs.get("to"),
+            fmt=kwargs.get("output_fmt"),
+        )
+        for path in paths
+    ]
+    for _, line in heap_merge(*timelines, key=itemgetter(0)):
+        yield line
+
+
+def merge(**kwargs):
+    """Merge the <value> log files into one timeline ordered by timestamp"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("merge", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+
+    # Timestamps are parsed with `--fmt' and written using `--iso' or ISO 86001
+    lines = merge_lines(
+        kwargs.get("values"),
+        fmt=kwargs.get("fmt"),
+        epoch_unit=kwargs.get("epoch_unit"),
+        to=kwargs.get("to"),
+        output_fmt=DEFAULT_FORMAT_ISO if kwargs.get("iso", False) else None,
+    )
+    try:
+        write_lines(lines, output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+
+def _utc_timestamp(result: datetime) -> float:
+    """Return UTC epoch seconds for a datetime, naive datetimes are UTC"""
+    if result.tzinfo is None:
+        result = result.replace(tzinfo=UTC)
+    return result.timestamp()
+
+
+def _line_start(mm, offset: int) -> int:
+    """Return the offset of the first line starting at or after an offset"""
+    if offset <= 0:
+        return 0
+    index = mm.find(b"\n", offset - 1)
+    return len(mm) if index < 0 else index + 1
+
+
+def _find_timestamp(mm, offset: int, resolver) -> tuple:
+    """Return (UTC epoch seconds, offset) of the first line with a timestamp
+    starting at or after a line offset, (None, size) past the last one"""
+    size = len(mm)
+    while offset < size:
+        end = mm.find(b"\n", offset)
+        end = size if end < 0 else end + 1
+        try:
+            found = resolver.find_input(
+                mm[offset:end].decode(errors="surrogateescape")
+            )
+        except (ValueError, OverflowError, OSError):
+            found = None
+        if found is not None:
+            return _utc_timestamp(found[2]), offset
+        offset = end
+    return None, size
+
+
+def bisect_timestamp(mm, timestamp: float, resolver, right: bool = False) -> int:
+    """Return the offset of the first line with a timestamp at or after
+    (after when right) UTC epoch seconds in a timestamp ordered file
+
+    Only the lines at the probed offsets are parsed, O(log n) of them.
+    """
+    low, high = 0, len(mm)
+    while low < high:
+        middle = (low + high) // 2
+        found, _ = _find_timestamp(mm, _line_start(mm, middle), resolver)
+        if found is None or found > timestamp or (found == timestamp and not right):
+            high = middle
+        else:
+            low = middle + 1
+    return _find_timestamp(mm, _line_start(mm, low), resolver)[1]
+
+
+def between_lines(paths, start: float, end: float, **kwargs):
+    """Yield the lines of timestamp ordered files from the first timestamp
+    at or after start up to the last timestamp at or before end
+
+    Files are memory-mapped and bisected so only the window is read, lines
+    without a timestamp belong to the line with a timestamp before them.
+
+    **kwargs
+      fmt <str>: datetime format passed to each file's `Resolver'
+      epoch_unit <str>: Unix epoch unit passed to each file's `Resolver'
+    """
+    from mmap import ACCESS_READ, mmap
+
+    for path in paths:
+        with open(path, "rb") as handle:
+            # Empty files can not be memory-mapped
+            if not handle.seek(0, 2):
+                continue
+            with mmap(handle.fileno(), 0, access=ACCESS_READ) as mm:
+                resolver = Resolver(
+                    fmt=kwargs.get("fmt"), epoch_unit=kwargs.get("epoch_unit")
+                )
+                offset = bisect_timestamp(mm, start, resolver)
+                stop = bisect_timestamp(mm, end, resolver, right=True)
+                mm.seek(offset)
+                while mm.tell() < stop:
+                    yield mm.readline().decode(errors="surrogateescape")
+
+
+def between(**kwargs):
+    """Print the lines of timestamp ordered <value> files within a window"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("between", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+
+    try:
+        if not kwargs.get("values"):
+            raise ValueError("--between requires <value> files to search")
+        start, end = (
+            _utc_timestamp(DT.resolve_input(value)) for value in kwargs.get("between")
+        )
+        lines = between_lines(
+            kwargs.get("values"),
+            start,
+            end,
+            fmt=kwargs.get("fmt"),
+            epoch_unit=kwargs.get("epoch_unit"),
+        )
+        write_lines(lines, output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+
+class Histogram(object):
+    """Count instants in fixed width buckets of a zone's local time
+
+    Counts are kept in an array of unsigned integers indexed from the
+    earliest bucket seen, memory depends on the time span covered and not
+    on the number of instants. The UTC offset is only looked up again when
+    an instant falls outside the transitions of the previous one.
+    """
+
+    def __init__(self, width: int, zone: str = "UTC"):
+        if width <= 0:
+            raise ValueError(f"Bucket width must be positive: {width!r}")
+        self.width = width
+        self.zone = zone
+        self.table = ZoneTable.get(zone)
+        self.first = None
+        self.counts = array("Q")
+        # UTC offset in effect from `since' until `until'
+        self.offset = 0
+        self.since = float("inf")
+        self.until = float("-inf")
+
+    def add(self, timestamp: float, count: int = 1):
+        """Count an instant given as UTC epoch seconds"""
+        if not self.since <= timestamp < self.until:
+            self._locate(timestamp)
+        bucket = int((timestamp + self.offset) // self.width)
+        if self.first is None:
+            self.first = bucket
+        index = bucket - self.first
+        if index < 0:
+            self._grow(-index)
+            self.counts = array("Q", bytes(8 * -index)) + self.counts
+            self.first = bucket
+            index = 0
+        elif index >= len(self.counts):
+            self._grow(index + 1 - len(self.counts))
+            self.counts.frombytes(bytes(8 * (index + 1 - len(self.counts))))
+        self.counts[index] += count
+
+    def _grow(self, buckets: int):
+        """Raise an error before growing past HISTOGRAM_MAX_BUCKETS"""
+        if len(self.counts) + buckets > HISTOGRAM_MAX_BUCKETS:
+            raise ValueError("Too many buckets, use a wider bucket width")
+
+    def _locate(self, timestamp: float):
+        """Update the UTC offset in effect at UTC epoch seconds"""
+        table = self.table
+        if not table.loaded:
+            self.offset = table.lookup(timestamp)[0]
+            return
+        i = table.index(timestamp)
+        self.offset = table.offsets[i]
+        self.since = table.times[i - 1] if i else float("-inf")
+        self.until = table.times[i] if i < len(table.times) else table.horizon
+
+    def rows(self):
+        """Yield (local bucket start as naive datetime, count) for every
+        bucket from the earliest through the latest instant"""
+        if self.first is None:
+            return
+        for i, count in enumerate(self.counts):
+            local = (self.first + i) * self.width
+            yield _EPOCH_NAIVE + timedelta(seconds=local), count
+
+
+def histogram_lines(counts: Histogram, **kwargs):
+    """Yield the lines of a histogram as a table or CSV
+
+    **kwargs
+      output_format <str>: "table", "csv" or "ndjson"
+        Default: "table"
+    """
+    if kwargs.get("output_format") == "ndjson":
+        import json
+
+        for start, count in counts.rows():
+            yield json.dumps({"bucket": f"{start:%Y-%m-%d %H:%M:%S}", "count": count})
+            yield "\n"
+        return
+    if kwargs.get("output_format") == "csv":
+        yield "bucket,count\n"
+        for start, count in counts.rows():
+            yield f"{start:%Y-%m-%d %H:%M:%S},{count}\n"
+        return
+    header = f"bucket ({counts.zone})"
+    width = max(19, len(header))
+    yield f"{header:<{width}}  count\n"
+    for start, count in counts.rows():
+        yield f"{start:%Y-%m-%d %H:%M:%S}{'':<{width - 19}}  {count}\n"
+
+
+def histogram(**kwargs):
+    """Print the number of timestamps in each bucket of the <value> files or
+    stdin in the `--to' zone's local time"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("histogram", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+
+    resolver = Resolver(
+        fmt=kwargs.get("fmt"), epoch_unit=kwargs.get("epoch_unit"), debug=debug
+    )
+    find_input = resolver.find_input
+    try:
+        zone = kwargs.get("to") or "UTC"
+        counts = Histogram(
+            parse_duration(kwargs.get("histogram")),
+            "UTC" if zone == "epoch" else zone,
+        )
+        add = counts.add
+        for line in read_lines(kwargs.get("values")):
+            try:
+                found = find_input(line)
+            except (ValueError, OverflowError, OSError):
+                continue
+            if found is not None:
+                add(_utc_timestamp(found[2]))
+        lines = histogram_lines(counts, output_format=kwargs.get("output_format"))
+        write_lines(lines, output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+
+def batch_records(values, **kwargs):
+    """Yield a record dict for each value resolved on its own
+
+    A record has the input, the instant as UTC, Unix epoch and local ISO
+    86001 strings, a {zone: ISO 86001} mapping and an error message for
+    values which could not be resolved. Naive datetimes are taken as UTC.
+
+    **kwargs
+      resolver <Resolver>: resolver used for the values
+        Default: Resolver()
+      localzone <str>: zone name of the "local" field
+        Default: "UTC"
+      zones <list>: zone names of the "zones" mapping
+        Default: REPORT_ZONES
+    """
+    resolver = kwargs.get("resolver") or Resolver()
+    local = ZoneTable.get(kwargs.get("localzone") or "UTC")
+    zones = kwargs.get("zones") or REPORT_ZONES
+    tables = [(zone, ZoneTable.get(zone)) for zone in zones]
+    for value in values:
+        try:
+            result = resolver.resolve_input(value)
+        except (ValueError, OverflowError, OSError) as err:
+            yield {
+                "input": value,
+                "utc": None,
+                "epoch": None,
+                "local": None,
+                "zones": None,
+                "error": str(err),
+            }
+            continue
+        if result.tzinfo is None:
+            result = result.replace(tzinfo=UTC)
+        epoch = result.timestamp()
+        yield {
+            "input": value,
+            "utc": result.astimezone(UTC).isoformat(),
+            "epoch": epoch if result.microsecond else int(epoch),
+            "local": local.astimezone(result).isoformat(),
+            "zones": {
+                zone: table.astimezone(result).isoformat() for zone, table in tables
+            },
+            "error": None,
+        }
+
+
+def record_lines(records, **kwargs):
+    """Yield batch records as NDJSON or CSV lines
+
+    **kwargs
+      output_format <str>: "ndjson" or "csv"
+        Default: "ndjson"
+      zones <list>: zone names of the CSV columns
+        Default: REPORT_ZONES
+    """
+    if kwargs.get("output_format") != "csv":
+        import json
+
+        for record in records:
+            yield json.dumps(record) + "\n"
+        return
+    from csv import writer as csv_writer
+
+    zones = kwargs.get("zones") or REPORT_ZONES
+    buffer = StringIO()
+    writer = csv_writer(buffer, lineterminator="\n")
+    writer.writerow(["input", "utc", "epoch", "local", *zones, "error"])
+    yield buffer.getvalue()
+    for record in records:
+        buffer.seek(0)
+        buffer.truncate()
+        mapping = record.get("zones") or {}
+        writer.writerow(
+            [
+                record.get("input"),
+                record.get("utc"),
+                record.get("epoch"),
+                record.get("local"),
+                *(mapping.get(zone) for zone in zones),
+                record.get("error"),
+            ]
+        )
+        yield buffer.getvalue()
+
+
+def batch(**kwargs):
+    """Print a NDJSON or CSV record for each <value> or each stdin line"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("batch", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+
+    resolver = Resolver(
+        fmt=kwargs.get("fmt"), epoch_unit=kwargs.get("epoch_unit"), debug=debug
+    )
+    zones = kwargs.get("zones") or REPORT_ZONES
+    if isinstance(zones, str):
+        zones = [zone.strip() for zone in zones.split(",") if zone.strip()]
+
+    # Each stdin line is a value when no values are given, blank lines are skipped
+    values = kwargs.get("values")
+    if not values:
+        values = (line.strip() for line in read_lines(["-"]))
+        values = (value for value in values if value)
+    try:
+        if kwargs.get("output_format") not in (None, "ndjson", "csv"):
+            raise ValueError("--batch supports ndjson and csv output formats")
+        records = batch_records(
+            values,
+            resolver=resolver,
+            localzone=kwargs.get("localzone"),
+            zones=zones,
+        )
+        lines = record_lines(
+            records, output_format=kwargs.get("output_format"), zones=zones
+        )
+        write_lines(lines, output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+
+# -----------------------------------------------------------------------------
+def parse_duration(value: str) -> int:
+    """Return seconds for a duration such as "90", "5m", "1h30m" or "1w" """
+    value = str(value).strip().lower()
+    if _DURATION_PATTERN.search(value) is None:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return sum(
+        int(m.group("value")) * DURATION_UNITS[m.group("unit")]
+        for m in _DURATION_PART_PATTERN.finditer(value)
+    )
+
+
+def schedule_rows(start: int, end: int, step: int, zones):
+    """Yield (timestamp, cells) for each step from start through end where
+    cells is a list of (offset, abbreviation, changed) for each zone
+
+    Each zone's position in its transition table is advanced as the
+    instants increase, `changed' is True when a transition was crossed
+    since the previous row.
+    """
+    if step <= 0:
+        raise ValueError(f"Step must be positive: {step!r}")
+    if end < start:
+        raise ValueError("End must not be before start")
+
+    tables = [ZoneTable.get(zone) for zone in zones]
+    positions = []
+    for table in tables:
+        if table.loaded:
+            # Generate any transitions from the POSIX TZ rule up front
+            table.index(end)
+            positions.append(table.index(start))
+        else:
+            positions.append(table.lookup(start))
+
+    for timestamp in range(start, end + 1, step):
+        cells = []
+        for k, table in enumerate(tables):
+            if not table.loaded:
+                current = table.lookup(timestamp)
+                cells.append((*current, current != positions[k]))
+                positions[k] = current
+                continue
+            i = positions[k]
+            times = table.times
+            changed = False
+            while i < len(times) and times[i] <= timestamp:
+                i += 1
+                changed = True
+            positions[k] = i
+            cells.append((table.offsets[i], table.abbrs[i], changed))
+        yield timestamp, cells
+
+
+def schedule_lines(start: int, end: int, step: int, zones):
+    """Yield the lines of a matrix of instants across zones, "*" marks an
+    offset change since the previous row"""
+    # Show seconds only when the step is not in whole minutes
+    seconds = bool(start % 60 or step % 60)
+    clock = {}
+    dates = {}
+    width = max([len(zone) for zone in zones] + [len("01-01 00:00:00 +0000*")]) + 2
+
+    def cell(local: int, abbr: str, changed: bool) -> str:
+        day, moment = divmod(local, 86400)
+        date = dates.get(day)
+        if date is None:
+            date = dates[day] = (_EPOCH_NAIVE + timedelta(days=day)).strftime("%m-%d")
+        time = clock.get(moment)
+        if time is None:
+            hours, minutes = divmod(moment // 60, 60)
+            time = f"{hours:02d}:{minutes:02d}"
+            if seconds:
+                time = f"{time}:{moment % 60:02d}"
+            clock[moment] = time
+        return f"{date} {time} {abbr}{'*' if changed else ''}"
+
+    header = [f"{'UTC':<22}"] + [f"{zone:<{width}}" for zone in zones]
+    yield "".join(header).rstrip() + "\n"
+    for timestamp, cells in schedule_rows(start, end, step, zones):
+        utc = datetime.fromtimestamp(timestamp, tz=UTC).strftime("%Y-%m-%d %H:%M:%S")
+        line = [f"{utc:<22}"]
+        for offset, abbr, changed in cells:
+            line.append(f"{cell(timestamp + offset, abbr, changed):<{width}}")
+        yield "".join(line).rstrip() + "\n"
+
+
+def schedule(**kwargs):
+    """Print a matrix of instants from a start through an end across zones"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("schedule", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+    try:
+        start, end = (
+            int(DT.resolve_input(value).timestamp() // 1) for value in kwargs["range"]
+        )
+        step = parse_duration(kwargs.get("step") or "1h")
+        zones = kwargs.get("zones") or REPORT_ZONES
+        if isinstance(zones, str):
+            zones = [zone.strip() for zone in zones.split(",") if zone.strip()]
+        write_lines(schedule_lines(start, end, step, zones), output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+
+def format_offset(offset: int) -> str:
+    """Return UTC offset seconds as +HHMM, with seconds when not whole minutes"""
+    sign = "-" if offset < 0 else "+"
+    minutes, seconds = divmod(abs(offset), 60)
+    hours, minutes = divmod(minutes, 60)
+    if seconds:
+        return f"{sign}{hours:02d}{minutes:02d}{seconds:02d}"
+    return f"{sign}{hours:02d}{minutes:02d}"
+
+
+def transition_rows(start: int, end: int, zones) -> list:
+    """Return (timestamp, zone, (offset, abbreviation) before, (offset,
+    abbreviation) after) for each change in the zones from start up to end
+    ordered by time then zone, see `TransitionCache'"""
+    cache = TransitionCache.get()
+    rows = sorted(
+        (timestamp, zone, before, after)
+        for zone in zones
+        for timestamp, before, after in cache.transitions(zone, start, end)
+    )
+    cache.save()
+    return rows
+
+
+def transition_lines(rows, **kwargs):
+    """Yield the lines of a transitions report as a table, CSV or NDJSON
+
+    **kwargs
+      output_format <str>: "table", "csv" or "ndjson"
+        Default: "table"
+    """
+    output_format = kwargs.get("output_format")
+    records = (
+        (
+            datetime.fromtimestamp(timestamp, tz=UTC).strftime("%Y-%m-%d %H:%M:%S"),
+            (_EPOCH_NAIVE + timedelta(seconds=timestamp + after[0])).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+            zone,
+            timestamp,
+            before,
+            after,
+        )
+        for timestamp, zone, before, after in rows
+    )
+    if output_format == "ndjson":
+        import json
+
+        for utc, local, zone, timestamp, before, after in records:
+            record = {
+                "utc": utc,
+                "epoch": timestamp,
+                "zone": zone,
+                "local": local,
+                "offset_before": format_offset(before[0]),
+                "offset_after": format_offset(after[0]),
+                "abbr_before": before[1],
+                "abbr_after": after[1],
+            }
+            yield json.dumps(record)
+            yield "\n"
+        return
+    if output_format == "csv":
+        yield "utc,epoch,zone,local,offset_before,offset_after,abbr_before,abbr_after\n"
+        for utc, local, zone, timestamp, before, after in records:
+            yield (
+                f"{utc},{timestamp},{zone},{local},{format_offset(before[0])},"
+                f"{format_offset(after[0])},{before[1]},{after[1]}\n"
+            )
+        return
+    yield f"{'UTC':<21}{'local':<21}{'change':<28}zone\n"
+    for utc, local, zone, timestamp, before, after in records:
+        change = (
+            f"{before[1]} {format_offset(before[0])} -> "
+            f"{after[1]} {format_offset(after[0])}"
+        )
+        yield f"{utc:<21}{local:<21}{change:<28}{zone}\n"
+
+
+def transitions(**kwargs):
+    """Print the DST and offset changes of the `--zones' (default: all zones)
+    in the next `--transitions' days from now or a <value> instant"""
+    debug = kwargs.get("debug", False)
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("transitions", kwargs=kwargs)
+
+    output = kwargs.get("output") or open_output()
+    try:
+        days = kwargs.get("transitions")
+        if days is None or days < 0:
+            raise ValueError(f"Days must not be negative: {days!r}")
+        if kwargs.get("values"):
+            result = DT.resolve_input(
+                " ".join(kwargs.get("values")), epoch_unit=kwargs.get("epoch_unit")
+            )
+            start = int(_utc_timestamp(result) // 1)
+        else:
+            start = int(time())
+        zones = kwargs.get("zones") or ZoneIndex.get().names
+        if isinstance(zones, str):
+            zones = [zone.strip() for zone in zones.split(",") if zone.strip()]
+        rows = transition_rows(start, start + days * 86400, zones)
+        lines = transition_lines(rows, output_format=kwargs.get("output_format"))
+        write_lines(lines, output)
+    except Exception as err:
+        print(f"Error: {err}", file=stderr)
+        if debug:
+            raise
+        else:
+            exit(1)
+
+
+# -----------------------------------------------------------------------------
+class ResolverServer(object):
+    """Run command lines in a long running process keeping zone data loaded
+
+    Requests are answered one at a time since output is captured by
+    redirecting stdout and stderr. The Unix socket server is only imported
+    by the daemon.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        from socketserver import UnixStreamServer
+
+        self.parser = get_parser()
+        # Load the zones used by the report ahead of the first request
+        for zone in REPORT_ZONES + [DEFAULT_LOCALZONE]:
+            ZoneInfo(zone)
+        ZoneIndex.get()
+        self.server = UnixStreamServer(path, self.handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    def serve_forever(self, *args, **kwargs):
+        self.server.serve_forever(*args, **kwargs)
+
+    def shutdown(self):
+        self.server.shutdown()
+
+    def server_close(self):
+        self.server.server_close()
+
+    def handle(self, connection, client_address, server):
+        """Answer one JSON request per line:
+        {"argv": [...], "color": false, "cwd": "/path"}"""
+        import json
+
+        with connection.makefile("rb") as rfile, connection.makefile("wb") as wfile:
+            for line in rfile:
+                try:
+                    request = json.loads(line)
+                    response = self.execute(
+                        request.get("argv") or [],
+                        color=bool(request.get("color")),
+                        cwd=request.get("cwd"),
+                    )
+                except ValueError as err:
+                    response = {"status": 2, "output": "", "error": f"Error: {err}\n"}
+                wfile.write(json.dumps(response).encode() + b"\n")
+                wfile.flush()
+
+    def execute(self, args: list, color: bool = False, cwd: str = None) -> dict:
+        """Return the status and output of a command line, color is whether
+        the client's output is a terminal and cwd the client's working
+        directory"""
+        output = StringIO()
+        error = StringIO()
+        status = 0
+        daemon_cwd = os.getcwd()
+        try:
+            with redirect_stdout(output), redirect_stderr(error):
+                argv, remaining_argv = self.parser.parse_known_args(args)
+                if any(getattr(argv, mode[2:]) for mode in LOCAL_MODES):
+                    print("Error: file and serve modes are not available")
+                    status = 2
+                else:
+                    if cwd:
+                        os.chdir(cwd)
+                    run(argv, remaining_argv, output=output, color=color)
+        except SystemExit as err:
+            status = err.code if isinstance(err.code, int) else 1
+        except Exception as err:
+            error.write(f"Error: {err}\n")
+            status = 1
+        finally:
+            os.chdir(daemon_cwd)
+        return {
+            "status": status,
+            "output": output.getvalue(),
+            "error": error.getvalue(),
+        }
+
+
+def serve(**kwargs):
+    """Answer command lines sent by `--connect' clients on a Unix socket"""
+    debug = kwargs.get("debug", False)
+    path = kwargs.get("serve")
+
+    trace = get_tracer(**kwargs)
+    # Trace event
+    if trace is not None:
+        trace("serve", kwargs=kwargs)
+
+    import socket
+    import stat
+    from signal import SIGTERM, signal
+
+    # Remove a stale socket left by a previous daemon, anything else at the
+    # path is left alone
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            print(f"Error: {path!r} exists and is not a socket", file=stderr)
+            exit(1)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)
+            else:
+                print(f"Error: a daemon is already serving {path!r}", file=stderr)
+                exit(1)
+    with ResolverServer(path) as server:
+        os.chmod(path, 0o600)
+        # Exit through the cleanup below when the daemon is stopped
+        signal(SIGTERM, lambda signum, frame: exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+# -----------------------------------------------------------------------------
+def get_parser() -> ArgumentParser:
+    """Return the command line argument parser"""
+    parser = ArgumentParser(
+        prog=PROGRAM_NAME,
+        description="List different time zones based on input or current datetime",
         epilog="alias datetime='python3 ${HOME}/path/to/get_datetime.py $*';",
         add_help=True,
+        # Local modes are recognized by their full option name, see `is_local'
+        allow_abbrev=False,
     )
     parser.add_argument(
         "values",
@@ -448,7 +2954,16 @@ if __name__ == "__main__":
         help=f"use iso format: {DEFAULT_FORMAT_ISO.replace('%', '%%')!r}",
     )
     parser.add_argument(
-        "--list", action="store_true", dest="list_all_zones", help="list zones and exit"
+        "--list",
+        metavar="<prefix>",
+        nargs="?",
+        const="",
+        default=None,
+        dest="list_all_zones",
+        help=(
+            "list zones, or those starting with <prefix>, and exit (the value"
+            " directly after --list is always the <prefix>)"
+        ),
     )
     parser.add_argument(
         "--localzone",
@@ -457,8 +2972,128 @@ if __name__ == "__main__":
         default=DEFAULT_LOCALZONE,
         help=f"local timezone name (default: {DEFAULT_LOCALZONE!r})",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="normalize the timestamp in each line of the <value> files or stdin",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="merge the <value> files into one timeline ordered by timestamp",
+    )
+    parser.add_argument(
+        "--between",
+        metavar=("<start>", "<end>"),
+        nargs=2,
+        default=None,
+        help="print the lines of timestamp ordered <value> files within a window",
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="<n>",
+        type=int,
+        default=1,
+        help="worker processes for --stream of files, 0 for one per CPU",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="print a record for each <value> or stdin line (see --output-format)",
+    )
+    parser.add_argument(
+        "--histogram",
+        metavar="<width>",
+        default=None,
+        help="count timestamps of the <value> files or stdin in buckets (1m, 1h, 1d)",
+    )
+    parser.add_argument(
+        "--transitions",
+        metavar="<days>",
+        nargs="?",
+        type=int,
+        const=TRANSITION_DAYS,
+        default=None,
+        help=(
+            "list DST and offset changes of --zones (default: all zones) in the"
+            f" next <days> (default: {TRANSITION_DAYS}) from now or a <value>, give"
+            " <days> or put the <value> before --transitions"
+        ),
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["table", "csv", "ndjson"],
+        default=None,
+        help=(
+            "--histogram, --transitions (default: table) and --batch (default:"
+            " ndjson) output"
+        ),
+    )
+    parser.add_argument(
+        "--to",
+        metavar="<tz|epoch>",
+        default="UTC",
+        help="zone name or 'epoch' to normalize to in stream mode (default: 'UTC')",
+    )
+    parser.add_argument(
+        "--range",
+        nargs=2,
+        metavar=("<start>", "<end>"),
+        default=None,
+        help="print a matrix of instants from <start> through <end> across zones",
+    )
+    parser.add_argument(
+        "--step",
+        metavar="<duration>",
+        default="1h",
+        help="step between instants in range mode, e.g. 30s, 5m, 1h30m (default: '1h')",
+    )
+    parser.add_argument(
+        "--zones",
+        metavar="<tz,...>",
+        default=None,
+        help=(
+            "comma separated zones for --range, --batch (default: report zones)"
+            " and --transitions"
+        ),
+    )
+    parser.add_argument(
+        "--epoch-unit",
+        choices=sorted(EPOCH_UNITS),
+        default=None,
+        help="unit of Unix epoch timestamps (default: detected by digit count)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print resolver fast path hit/miss counters to stderr in stream mode",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="<socket>",
+        default=None,
+        help="answer requests on a Unix socket keeping zone data loaded",
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="<socket>",
+        default=None,
+        help=f"forward the command line to a --serve daemon (or set {SOCKET_ENV})",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="write timed resolution stages to stderr as JSON lines",
+    )
     parser.add_argument("--debug", action="store_true")
-    argv, remaining_argv = parser.parse_known_args()
+    return parser
+
+
+def run(argv, remaining_argv, **kwargs):
+    """Run the mode selected by parsed command line arguments, **kwargs
+    override the parsed arguments"""
+    options = {**vars(argv), **kwargs}
+    options.update(trace=Tracer(json_sink) if argv.trace else None)
 
     # Notice message
     if remaining_argv:
@@ -467,11 +3102,51 @@ if __name__ == "__main__":
     # Debug message
     if argv.debug:
         for key, value in vars(argv).items():
-            print(f"DEBUG: __main__ - argv.{key} {type(value)}: {value!r}")
+            print(
+                f"DEBUG: __main__ - argv.{key} {type(value)}: {value!r}",
+                file=sys.stderr,
+            )
+
+    # Zone names may be given in any case, as abbreviations or misspelled
+    try:
+        for key in ("localzone", "to"):
+            if options.get(key) and options.get(key) != "epoch":
+                options[key] = resolve_zone(options.get(key))
+        if options.get("zones"):
+            options["zones"] = ",".join(
+                resolve_zone(zone.strip())
+                for zone in options.get("zones").split(",")
+                if zone.strip()
+            )
+    except ValueError as err:
+        print(f"Error: {err}")
+        exit(1)
 
     # Catch list option
-    if argv.list_all_zones:
-        for key in sorted(available_timezones()):
+    if argv.list_all_zones is not None:
+        for key in ZoneIndex.get().prefix(argv.list_all_zones):
             print(key)
+    elif argv.serve:
+        serve(**options)
+    elif argv.stream:
+        stream(**options)
+    elif argv.merge:
+        merge(**options)
+    elif argv.between:
+        between(**options)
+    elif argv.histogram:
+        histogram(**options)
+    elif argv.batch:
+        batch(**options)
+    elif argv.transitions is not None:
+        transitions(**options)
+    elif argv.range:
+        schedule(**options)
     else:
-        main(**vars(argv))
+        main(**options)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    argv, remaining_argv = get_parser().parse_known_args()
+    run(argv, remaining_argv)
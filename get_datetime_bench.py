@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+from json import dump, load
+from pathlib import Path
+from sys import exit
+from timeit import Timer
+
+from datetime import datetime
+
+from get_datetime import DT, FormatEngine, Kolor, main
+
+__version__ = "0.0.1"
+
+PROGRAM_NAME = Path(__file__).name
+DEFAULT_BASELINE = Path(__file__).with_suffix(".json")
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+
+# Representative inputs for each format `DT.resolve_input' supports,
+# "local" patterns are listed in the same order as the pattern table
+CORPUS = {
+    "epoch_int": ["1234567890", "0", "1700000000", "2147483647"],
+    "epoch_float": ["1234567890.1234", "0.5", "1700000000.000001"],
+    "iso": [
+        "2009-02-13T23:31:30+00:00",
+        "2009-02-13T16:31:30-07:00",
+        "2009-02-13 23:31:30.123456",
+        "2009-02-13",
+    ],
+    "iso_z": ["2009-02-13T23:31:30Z", "2009-02-13T23:31:30.123Z"],
+    "local_iso_date": ["2009-02-13 23:31 MST", "2009-02-13 23:31:30 UTC+01:00"],
+    "local_month_tz_year": ["Feb 13 23:31:30 MST 2009", "Feb 13 11:31pm PST 2009"],
+    "local_weekday_month_date": [
+        "Friday, February 13, 2009 11:31pm UTC",
+        "Fri, Feb 13, 2009 23:31:30",
+    ],
+    "local_weekday_date_month": [
+        "Fri, 13 Feb 2009 23:31:30 GMT",
+        "Friday, 13 February 2009 23:31",
+    ],
+    "local_month_year_tz": ["Feb 13 11:31pm 2009 UTC", "February 13 23:31:30 2009"],
+    "local_date_month_year": ["13 February 2009 23:31 UTC+12", "13 Feb 2009 23:31:30"],
+    "local_time": ["23:31:30 PST", "11:31pm", "23:31"],
+    "fmt": ["13/02/2009 23.31", "01/01/1970 00.00"],
+    "unmatched": ["not a datetime", "2009/02/13", "yesterday"],
+}
+
+# Datetime format used with `--fmt' corpus entries
+CORPUS_FORMATS = {"fmt": "%d/%m/%Y %H.%M"}
+
+# Formats parsed by `FormatEngine' compared with `datetime.strptime'
+FORMAT_CORPUS = {
+    "clf": (
+        "%d/%b/%Y:%H:%M:%S %z",
+        ["13/Feb/2009:23:31:30 +0000", "01/Jan/1970:00:00:00 -0700"],
+    ),
+    "fraction": (
+        "%Y-%m-%d %H:%M:%S.%f",
+        ["2009-02-13 23:31:30.123456", "1970-01-01 00:00:00.5"],
+    ),
+    "rfc2822": (
+        "%a, %d %b %Y %H:%M:%S %z",
+        ["Fri, 13 Feb 2009 23:31:30 +0000", "Thu, 01 Jan 1970 00:00:00 -0700"],
+    ),
+}
+
+
+def resolve_all(values: list, fmt: str = None):
+    """Return a function resolving each value, unmatched inputs are ignored"""
+
+    def run():
+        for value in values:
+            try:
+                DT.resolve_input(value, fmt=fmt)
+            except ValueError:
+                pass
+
+    return run
+
+
+def parse_all(parse, values: list, *args):
+    """Return a function calling parse(value, *args) for each value"""
+
+    def run():
+        for value in values:
+            parse(value, *args)
+
+    return run
+
+
+def render_main():
+    """Return a function printing the multi-zone report to a buffer"""
+
+    def run():
+        with redirect_stdout(StringIO()):
+            main(values=["1234567890"], localzone="America/Denver")
+
+    return run
+
+
+def render_kolor():
+    """Return a function applying the report highlight"""
+    kolor = Kolor()
+
+    def run():
+        kolor(
+            "Fri Feb 13 16:31:30 2009 (UTC-0700) MST  America/Denver",
+            background="yellow",
+            color="black",
+            style="bold",
+            bright=True,
+        )
+
+    return run
+
+
+def get_benchmarks() -> dict:
+    """Return a {name: (function, operations per call)} mapping"""
+    benchmarks = {
+        f"resolve_input[{name}]": (
+            resolve_all(values, fmt=CORPUS_FORMATS.get(name)),
+            len(values),
+        )
+        for name, values in CORPUS.items()
+    }
+    for name, (fmt, values) in FORMAT_CORPUS.items():
+        benchmarks[f"strptime[{name}]"] = (
+            parse_all(datetime.strptime, values, fmt),
+            len(values),
+        )
+        benchmarks[f"FormatEngine[{name}]"] = (
+            parse_all(FormatEngine.get(fmt), values),
+            len(values),
+        )
+    benchmarks.update(
+        {
+            "main[report]": (render_main(), 1),
+            "kolor": (render_kolor(), 1),
+        }
+    )
+    return benchmarks
+
+
+def measure(function, operations: int = 1, repeat: int = DEFAULT_REPEAT) -> float:
+    """Return the best nanoseconds per operation of a function"""
+    timer = Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number / operations * 1e9
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return the names of benchmarks slower than the baseline by more than
+    the threshold (0.25 == 25% slower)"""
+    return [
+        name
+        for name, ns in results.items()
+        if name in baseline and ns > baseline.get(name) * (1 + threshold)
+    ]
+
+
+def bench(**kwargs):
+    """Print ns/op and throughput for each benchmark, exit non-zero when
+    a stored baseline regressed"""
+    baseline_path = Path(kwargs.get("baseline") or DEFAULT_BASELINE)
+    threshold = kwargs.get("threshold", DEFAULT_THRESHOLD)
+    pattern = kwargs.get("filter")
+
+    baseline = {}
+    if baseline_path.exists() and not kwargs.get("save", False):
+        with baseline_path.open() as f:
+            baseline = load(f)
+
+    results = {}
+    print(
+        f"{'benchmark':<40} {'ns/op':>12} {'ops/s':>14} {'baseline':>12} {'change':>8}"
+    )
+    for name, (function, operations) in get_benchmarks().items():
+        if pattern and pattern not in name:
+            continue
+        ns = measure(function, operations, repeat=kwargs.get("repeat", DEFAULT_REPEAT))
+        results[name] = ns
+        line = f"{name:<40} {ns:>12.1f} {1e9 / ns:>14,.0f}"
+        if name in baseline:
+            change = ns / baseline.get(name) - 1
+            line += f" {baseline.get(name):>12.1f} {change:>+8.1%}"
+        print(line)
+
+    if kwargs.get("save", False):
+        with baseline_path.open("w") as f:
+            dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline: {baseline_path}")
+        return
+
+    regressions = compare(results, baseline, threshold)
+    if regressions:
+        print(f"Error: regressed more than {threshold:.0%}: {', '.join(regressions)}")
+        exit(1)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog=PROGRAM_NAME,
+        description="Benchmark get_datetime parsing and rendering",
+        add_help=True,
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="<path>",
+        default=DEFAULT_BASELINE,
+        help=f"baseline results (default: {DEFAULT_BASELINE.name})",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="store the results as the baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"allowed slowdown against the baseline (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help=f"timing repetitions, the best is kept (default: {DEFAULT_REPEAT})",
+    )
+    parser.add_argument(
+        "--filter", metavar="<text>", default=None, help="only run matching benchmarks"
+    )
+    argv = parser.parse_args()
+    bench(**vars(argv))
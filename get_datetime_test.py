@@ -1,9 +1,56 @@
 import datetime
+import io
+import json
+import os
+import threading
+import time
 import zoneinfo
 
 import pytest
 
-from get_datetime import DT
+from get_datetime import (
+    DEFAULT_FORMAT,
+    DT,
+    HISTOGRAM_MAX_BUCKETS,
+    REPORT_ZONES,
+    TRANSITION_DAYS,
+    FormatEngine,
+    Kolor,
+    Histogram,
+    PatternEngine,
+    Resolver,
+    ResolverServer,
+    Tracer,
+    TransitionCache,
+    ZoneIndex,
+    ZoneTable,
+    batch,
+    batch_records,
+    between,
+    between_lines,
+    chunk_offsets,
+    connect,
+    get_parser,
+    is_local,
+    main,
+    histogram,
+    merge,
+    merge_lines,
+    normalize_files,
+    normalize_lines,
+    parse_duration,
+    record_lines,
+    resolve_zone,
+    schedule,
+    run,
+    schedule_rows,
+    serve,
+    stream,
+    timeline_lines,
+    transitions,
+    transition_lines,
+    transition_rows,
+)
 
 
 def test_resolve_input_no_input():
@@ -377,6 +424,1162 @@ def test_resolve_input_no_pattern_matched():
         dt.resolve_input("this is not a known datetime")
 
 
+def test_pattern_engine_classify_no_time_component():
+    assert PatternEngine.classify("this is not a known datetime") == ()
+
+
+def test_pattern_engine_classify_time_only():
+    candidates = PatternEngine.classify("23:31:30")
+    assert candidates == (PatternEngine.patterns[-1],)
+
+
+def test_pattern_engine_classify_preserves_order():
+    candidates = PatternEngine.classify("Fri, 13 Feb-2009 23:31")
+    assert candidates == PatternEngine.patterns
+
+
+@pytest.mark.parametrize(
+    "dt_in",
+    [
+        "2009-02-13T23:31:30 MT",
+        "February 13 23:31:30 UTC 2009",
+        "Friday, February 13, 2009 23:31:30",
+        "Friday, 13 February 2009 23:31:30",
+        "February 13 23:31 2009 ET",
+        "21 July 2023 19:32 UTC+12:30",
+        "12:34:56 AM GMT",
+        "[13/Feb/2009:23:31:30 +0000] GET /",
+        "Feb 13 23:31:30 host sshd[1]: message",
+        "this is not a known datetime",
+    ],
+)
+def test_pattern_engine_search_matches_full_pattern_list(dt_in):
+    expected = None
+    for pattern in PatternEngine.patterns:
+        expected = pattern.search(dt_in)
+        if expected is not None:
+            break
+    result = PatternEngine.search(dt_in)
+    print(f"result {type(result)}: {result!r}")
+    if expected is None:
+        assert result is None
+    else:
+        assert result.re is expected.re
+        assert result.groupdict() == expected.groupdict()
+
+
+def test_find_input_iso_86001():
+    line = "127.0.0.1 2009-02-13T23:31:30Z GET /\n"
+    start, end, result = DT.find_input(line)
+    assert line[start:end] == "2009-02-13T23:31:30Z"
+    assert result.timestamp() == 1234567890
+
+
+def test_find_input_common_log_format():
+    line = '127.0.0.1 - - [13/Feb/2009:23:31:30 -0100] "GET / HTTP/1.1" 200\n'
+    start, end, result = DT.find_input(line)
+    assert line[start:end] == "13/Feb/2009:23:31:30 -0100"
+    assert result.timestamp() == 1234571490
+
+
+def test_find_input_unix_epoch_timestamp():
+    line = "id=42 ts=1234567890 msg=hello\n"
+    start, end, result = DT.find_input(line)
+    assert line[start:end] == "1234567890"
+    assert result.timestamp() == 1234567890
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("1234567890 started\n", "1234567890"),
+        ("[1234567890123] started\n", "1234567890123"),
+        ('{"order": 4155550123, "created_at": 1234567890}\n', "1234567890"),
+        ("order 4155550123 paid 1234567890.25\n", "1234567890.25"),
+        ("order 4155550123 shipped to 4155550124\n", None),
+        ("id=x1234567890 counts=1234567890\n", None),
+    ],
+)
+def test_find_input_unix_epoch_timestamp_context(line, expected):
+    found = DT.find_input(line)
+    if expected is None:
+        assert found is None
+    else:
+        assert line[found[0] : found[1]] == expected
+        assert Resolver().find_input(line)[:2] == found[:2]
+
+
+def test_stream_errors_to_stderr(tmp_path, monkeypatch, capsys):
+    err = io.StringIO()
+    monkeypatch.setattr("get_datetime.stderr", err)
+    with pytest.raises(SystemExit):
+        stream(values=[str(tmp_path / "missing.log")], output=io.StringIO())
+    assert capsys.readouterr().out == ""
+    assert err.getvalue().startswith("Error: ")
+
+
+def test_find_input_local_pattern():
+    line = "Feb 13 23:31:30 MST 2009 host sshd[1]: message\n"
+    start, end, result = DT.find_input(line)
+    assert line[start:end] == "Feb 13 23:31:30 MST 2009"
+    assert str(result.tzinfo) == "US/Mountain"
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("Feb 13 23:31:30 myhost sshd[1]: message\n", "Feb 13 23:31:30"),
+        ("Feb  3 23:31:30 myhost sshd[1]: message\n", "Feb  3 23:31:30"),
+        ("Fri, 13 Feb 2009 23:31:30 EST today\n", "Fri, 13 Feb 2009 23:31:30 EST"),
+        ("retry in 10:30 minutes\n", None),
+    ],
+)
+def test_find_input_local_pattern_next_word(line, expected):
+    found = DT.find_input(line)
+    if expected is None:
+        assert found is None
+    else:
+        assert line[found[0] : found[1]] == expected
+        assert Resolver().find_input(line) == found
+
+
+def test_find_input_syslog():
+    line = "Feb 13 23:31:30 myhost sshd[1]: message\n"
+    start, end, result = DT.find_input(line)
+    now = datetime.datetime.now(tz=zoneinfo.ZoneInfo("UTC"))
+    assert result == datetime.datetime(
+        now.year, 2, 13, 23, 31, 30, tzinfo=zoneinfo.ZoneInfo("UTC")
+    )
+
+
+def test_find_input_no_timestamp():
+    assert DT.find_input("nothing to see here\n") is None
+
+
+def test_normalize_lines():
+    lines = [
+        "a 2009-02-13T23:31:30Z GET /\n",
+        "nothing here\n",
+        "b 1234567890.25 c\n",
+    ]
+    result = list(normalize_lines(lines, to="America/Denver"))
+    print(f"result {type(result)}: {result!r}")
+    assert result == [
+        "a 2009-02-13T16:31:30-07:00 GET /\n",
+        "nothing here\n",
+        "b 2009-02-13T16:31:30.250000-07:00 c\n",
+    ]
+
+
+@pytest.mark.parametrize("tz", ["UTC", "America/Denver", "Asia/Tokyo"])
+def test_render_naive_is_utc(tz, monkeypatch):
+    monkeypatch.setenv("TZ", tz)
+    time.tzset()
+    try:
+        result = datetime.datetime(2009, 2, 13, 23, 31, 30)
+        assert DT.render(result, to="America/Denver") == "2009-02-13T16:31:30-07:00"
+        assert DT.render(result, to="epoch") == "1234567890"
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_normalize_lines_epoch():
+    lines = ["a 2009-02-13T23:31:30Z\n", "b 2009-02-13T23:31:30.5Z\n"]
+    result = list(normalize_lines(lines, to="epoch"))
+    assert result == ["a 1234567890\n", "b 1234567890.500000\n"]
+
+
+def test_stream_files(tmp_path):
+    path = tmp_path / "access.log"
+    path.write_text("2009-02-13T23:31:30Z one\n2009-02-13T23:31:31Z two\n")
+    output = io.StringIO()
+    stream(values=[str(path), str(path)], to="UTC", output=output)
+    assert output.getvalue().splitlines() == [
+        "2009-02-13T23:31:30+00:00 one",
+        "2009-02-13T23:31:31+00:00 two",
+    ] * 2
+
+
+def test_stream_debug(tmp_path, capsys):
+    path = tmp_path / "access.log"
+    path.write_text("Feb 13 23:31:30 MST 2009 one\n")
+    output = io.StringIO()
+    stream(values=[str(path)], to="UTC", output=output, debug=True)
+    assert output.getvalue() == "2009-02-14T06:31:30+00:00 one\n"
+    # Each resolved timestamp prints the resolve stages, apart from the output
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    debug = captured.err.splitlines()
+    assert any(line.startswith("DEBUG: stream - kwargs ") for line in debug)
+    assert "DEBUG: start - dt_in <class 'str'>: 'Feb 13 23:31:30 MST 2009'" in debug
+    assert any(line.startswith("DEBUG: tzinfo - ") for line in debug)
+
+
+def test_timeline_lines():
+    lines = ["first\n", "2009-02-13T23:31:30Z a\n", "  trace\n", "1234567891 b"]
+    assert list(timeline_lines(lines)) == [
+        (float("-inf"), "first\n"),
+        (1234567890.0, "2009-02-13T23:31:30+00:00 a\n"),
+        (1234567890.0, "  trace\n"),
+        (1234567891.0, "2009-02-13T23:31:31+00:00 b\n"),
+    ]
+
+
+def test_merge_lines(tmp_path):
+    (tmp_path / "a.log").write_text(
+        "2009-02-13T23:31:30Z a1\ntrace\n2009-02-13T23:31:35Z a2\n"
+    )
+    (tmp_path / "b.log").write_text(
+        "13/Feb/2009:16:31:32 -0700 b1\n13/Feb/2009:16:31:35 -0700 b2"
+    )
+    (tmp_path / "c.log").write_text("Feb 13 23:31:31 UTC 2009 c1\n")
+    paths = [str(tmp_path / name) for name in ["a.log", "b.log", "c.log"]]
+    assert [line.split()[-1] for line in merge_lines(paths)] == [
+        "a1",
+        "trace",
+        "c1",
+        "b1",
+        "a2",
+        "b2",
+    ]
+
+    output = io.StringIO()
+    merge(values=paths[:2], to="epoch", output=output)
+    assert output.getvalue().splitlines() == [
+        "1234567890 a1",
+        "trace",
+        "1234567892 b1",
+        "1234567895 a2",
+        "1234567895 b2",
+    ]
+
+
+def test_between_lines(tmp_path):
+    path = tmp_path / "sorted.log"
+    lines = []
+    for second in range(0, 100, 2):
+        lines.append(f"{1234567800 + second} line {second}\n")
+        if second % 10 == 0:
+            lines.append(f"  continuation {second}\n")
+    path.write_text("".join(lines))
+    empty = tmp_path / "empty.log"
+    empty.write_text("")
+
+    result = list(between_lines([str(empty), str(path)], 1234567810, 1234567821))
+    assert result[0] == "1234567810 line 10\n"
+    assert result[1] == "  continuation 10\n"
+    assert result[-2:] == ["1234567820 line 20\n", "  continuation 20\n"]
+    assert len(result) == 8
+    assert list(between_lines([str(path)], 0, 1)) == []
+    assert list(between_lines([str(path)], 1234567999, 1234568000)) == []
+    assert len(list(between_lines([str(path)], 0, 1234568000))) == len(lines)
+
+    output = io.StringIO()
+    between(
+        values=[str(path)],
+        between=["2009-02-13T23:30:36Z", "2009-02-13T23:30:39Z"],
+        output=output,
+    )
+    assert output.getvalue() == "1234567836 line 36\n1234567838 line 38\n"
+
+
+def test_chunk_offsets(tmp_path):
+    path = tmp_path / "a.log"
+    path.write_bytes(b"0123456789\n" * 10 + b"tail")
+    chunks = chunk_offsets(str(path), 25)
+    assert chunks == [(0, 33), (33, 55), (55, 77), (77, 110), (110, 114)]
+    assert chunk_offsets(str(path), 1000) == [(0, 114)]
+    (tmp_path / "empty.log").write_bytes(b"")
+    assert chunk_offsets(str(tmp_path / "empty.log")) == []
+
+
+def test_normalize_files(tmp_path):
+    lines = [
+        f"{1234567890 + i} a\n" if i % 3 else f"Feb 13 23:31:{i % 60:02d} MST 2009 b\n"
+        for i in range(200)
+    ]
+    path = tmp_path / "a.log"
+    path.write_text("".join(lines) + "no newline")
+    resolver = Resolver()
+    result = "".join(
+        normalize_files([str(path)] * 2, jobs=2, resolver=resolver, chunk_size=500)
+    )
+    expected = "".join(normalize_lines(lines + ["no newline"]))
+    assert result == expected * 2
+    assert resolver.misses + resolver.hits == 2 * len(lines)
+
+
+def test_normalize_files_newlines(tmp_path):
+    path = tmp_path / "crlf.log"
+    path.write_bytes(
+        b"".join(
+            b"%d a\x0cb\x1ec\r\n" % (1234567890 + i)
+            + "2009-02-13T23:31:30Z \x85 \u2028 old mac\r".encode()
+            for i in range(100)
+        )
+    )
+    output = io.StringIO()
+    stream(values=[str(path)], to="UTC", output=output)
+    result = "".join(normalize_files([str(path)], jobs=2, to="UTC", chunk_size=500))
+    assert result == output.getvalue()
+    assert result.count("\n") == 200
+
+
+def test_normalize_files_bounded(tmp_path, monkeypatch):
+    from multiprocessing.pool import Pool
+
+    submitted = []
+    apply_async = Pool.apply_async
+
+    def counting_apply_async(self, *args, **kwargs):
+        submitted.append(args)
+        return apply_async(self, *args, **kwargs)
+
+    monkeypatch.setattr(Pool, "apply_async", counting_apply_async)
+    path = tmp_path / "a.log"
+    path.write_text("".join(f"{1234567890 + i} a\n" for i in range(500)))
+    results = normalize_files([str(path)], jobs=2, chunk_size=100)
+    next(results)
+    assert len(submitted) == 5
+    assert len(list(results)) > 40
+
+
+def test_histogram_local_buckets():
+    counts = Histogram(3600, "America/Denver")
+    # 2009-03-08 01:59:59 MST, 03:00:00 MDT and 00:30 MST, added out of order
+    for timestamp in [1236502799, 1236502800, 1236502800, 1236497400]:
+        counts.add(timestamp)
+    assert [(f"{start:%H:%M}", count) for start, count in counts.rows()] == [
+        ("00:00", 1),
+        ("01:00", 1),
+        ("02:00", 0),
+        ("03:00", 2),
+    ]
+    assert counts.counts.typecode == "Q"
+
+
+def test_histogram_limits():
+    with pytest.raises(ValueError):
+        Histogram(0)
+    counts = Histogram(1)
+    counts.add(0)
+    with pytest.raises(ValueError):
+        counts.add(HISTOGRAM_MAX_BUCKETS + 1)
+    assert list(Histogram(60).rows()) == []
+
+
+def test_histogram(tmp_path):
+    path = tmp_path / "a.log"
+    path.write_text(
+        "2009-02-13T23:31:30Z a\nnothing\n1234567950 b\n13/Feb/2009:23:34:01 +0000 c\n"
+    )
+    output = io.StringIO()
+    histogram(values=[str(path)], histogram="1m", output_format="csv", output=output)
+    assert output.getvalue().splitlines() == [
+        "bucket,count",
+        "2009-02-13 23:31:00,1",
+        "2009-02-13 23:32:00,1",
+        "2009-02-13 23:33:00,0",
+        "2009-02-13 23:34:00,1",
+    ]
+    output = io.StringIO()
+    histogram(values=[str(path)], histogram="1h", to="Asia/Tokyo", output=output)
+    assert output.getvalue().splitlines() == [
+        "bucket (Asia/Tokyo)  count",
+        "2009-02-14 08:00:00  3",
+    ]
+
+
+def test_batch_records():
+    records = list(
+        batch_records(
+            ["1234567890", "2009-02-13T23:31:30.5Z", "bogus"],
+            localzone="America/Denver",
+            zones=["Asia/Tokyo"],
+        )
+    )
+    assert records[0] == {
+        "input": "1234567890",
+        "utc": "2009-02-13T23:31:30+00:00",
+        "epoch": 1234567890,
+        "local": "2009-02-13T16:31:30-07:00",
+        "zones": {"Asia/Tokyo": "2009-02-14T08:31:30+09:00"},
+        "error": None,
+    }
+    assert records[1]["epoch"] == 1234567890.5
+    assert records[2]["utc"] is None
+    assert records[2]["error"] == "No pattern matched: 'bogus'"
+
+    lines = list(record_lines(records, output_format="csv", zones=["Asia/Tokyo"]))
+    assert lines[0] == "input,utc,epoch,local,Asia/Tokyo,error\n"
+    assert lines[1] == (
+        "1234567890,2009-02-13T23:31:30+00:00,1234567890,"
+        "2009-02-13T16:31:30-07:00,2009-02-14T08:31:30+09:00,\n"
+    )
+    assert lines[3] == "bogus,,,,,No pattern matched: 'bogus'\n"
+
+
+def test_batch():
+    output = io.StringIO()
+    batch(values=["1234567890", "x,y"], zones="UTC", output=output)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["input"] for record in records] == ["1234567890", "x,y"]
+    assert records[0]["zones"] == {"UTC": "2009-02-13T23:31:30+00:00"}
+
+    output = io.StringIO()
+    batch(values=["x,y"], zones="UTC", output_format="csv", output=output)
+    line = output.getvalue().splitlines()[1]
+    assert line == '"x,y",,,,,"No pattern matched: \'x,y\'"'
+
+
+def test_resolver_hits_repeated_format():
+    resolver = Resolver()
+    for second in range(10):
+        result = resolver(f"February 13 23:31:{second:02d} MDT 2009")
+        assert result.second == second
+        assert str(result.tzinfo) == "US/Mountain"
+    assert resolver.hits == 9
+    assert resolver.misses == 1
+
+
+@pytest.mark.parametrize(
+    "dt_in",
+    [
+        "1234567890",
+        "2009-02-13T23:31:30Z",
+        "Feb 13 23:31:30 MST 2009",
+        "23:31 MT",
+        "Friday, February 13, 2009 23:31:30",
+        "20090213",
+    ],
+)
+def test_resolver_matches_resolve_input_after_format_change(dt_in):
+    resolver = Resolver()
+    for warm_up in ["February 13 23:31:30 UTC 2009", "2009-02-13T23:31:30", "23:31"]:
+        resolver(warm_up)
+        assert resolver(dt_in) == DT.resolve_input(dt_in)
+
+
+def test_resolver_matches_resolve_input_mixed():
+    import random
+
+    from get_datetime_bench import CORPUS
+
+    values = [
+        "2009-02-13 23:31:30 MST",
+        "2009-02-13 23:31:30 +01:00",
+        "Feb 13 23:31:30 2009",
+        "Feb 13 11:31 pm 2009 EST",
+    ]
+    values += [
+        value
+        for name, corpus in CORPUS.items()
+        if name not in ("fmt", "unmatched")
+        for value in corpus
+    ]
+    sequence = values + random.Random(0).choices(values, k=500)
+    resolver = Resolver(cache_size=0)
+    for dt_in in sequence:
+        assert resolver(dt_in) == DT.resolve_input(dt_in), dt_in
+    assert resolver.hits > 0
+
+    fmt = "%Y-%m-%d %H:%M:%S"
+    resolver = Resolver(fmt=fmt, cache_size=0)
+    for dt_in in ["2009-2-13 23:31:30", "2009-02-14 23:31:30", "2009-2-15 23:31:30"]:
+        result = resolver(dt_in)
+        assert result == DT.resolve_input(dt_in, fmt=fmt), dt_in
+        assert result.tzinfo == DT.resolve_input(dt_in, fmt=fmt).tzinfo, dt_in
+
+
+def test_resolver_fmt():
+    resolver = Resolver(fmt="%d.%m.%Y %H.%M")
+    assert resolver("13.02.2009 23.31") == datetime.datetime(2009, 2, 13, 23, 31)
+    assert resolver("14.02.2009 23.31") == datetime.datetime(2009, 2, 14, 23, 31)
+    assert resolver.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "find_hits": 0,
+        "find_misses": 0,
+        "cache_hits": 0,
+        "cache_misses": 2,
+        "cache_hit_rate": 0.0,
+    }
+
+
+def test_resolver_cache():
+    resolver = Resolver(cache_size=2)
+    for _ in range(3):
+        resolver("February 13 23:31:30 MDT 2009")
+    resolver("1234567890")
+    resolver("2009-02-13T23:31:30Z")
+    # The least recently used entry was evicted
+    resolver("February 13 23:31:30 MDT 2009")
+    assert len(resolver.cache) == 2
+    assert resolver.cache_hits == 2
+    assert resolver.cache_misses == 4
+    assert resolver.stats()["cache_hit_rate"] == round(2 / 6, 4)
+
+
+def test_resolver_cache_partial_expires():
+    resolver = Resolver()
+    today = resolver("23:31")
+    assert resolver("23:31") is today
+    assert resolver.cache[("23:31", None)][1] > 0
+    assert resolver.cache[("23:31", None)][1] % 86400 == 0
+    # Once the current date changes the input is resolved again
+    resolver.cache[("23:31", None)] = (today, 0)
+    assert resolver("23:31") is not today
+    assert resolver("23:31") == today
+    assert resolver("Feb 13 23:31:30 MST 2009") is not None
+    assert resolver.cache[("Feb 13 23:31:30 MST 2009", None)][1] is None
+    resolver("")
+    assert ("", None) not in resolver.cache
+
+
+@pytest.mark.parametrize(
+    "fmt,dt_in",
+    [
+        ("%d/%b/%Y:%H:%M:%S %z", "13/Feb/2009:23:31:30 +0000"),
+        ("%d/%b/%Y:%H:%M:%S %z", "13/feb/2009:16:31:30 -07:00"),
+        ("%a, %d %b %Y %H:%M:%S %z", "Fri, 13 Feb 2009 23:31:30 Z"),
+        ("%Y-%m-%d %H:%M:%S.%f", "2009-02-13 23:31:30.5"),
+        ("%B %d %y", "February 13  09"),
+        ("%d.%m.%Y %H.%M", "13.02.2009 23.31"),
+        ("%Y%m%d", "2009213"),
+        ("%d %% %m", "13 % 2"),
+        ("%I:%M %p", "11:31 PM"),
+    ],
+)
+def test_format_engine_matches_strptime(fmt, dt_in):
+    expected = datetime.datetime.strptime(dt_in, fmt)
+    result = FormatEngine.get(fmt)(dt_in)
+    assert result == expected
+    assert result.tzinfo == expected.tzinfo
+
+
+def test_format_engine_fallback():
+    # Unsupported directives are left to strptime
+    assert FormatEngine.get("%I:%M %p").pattern is None
+    assert FormatEngine.get("%Y %y").pattern is None
+    assert FormatEngine.get("%H:%M").pattern is not None
+    for dt_in in ["24:00", "23:31 ", "12:60", "02-30"]:
+        with pytest.raises(ValueError):
+            datetime.datetime.strptime(dt_in, "%H:%M")
+        with pytest.raises(ValueError):
+            FormatEngine.get("%H:%M")(dt_in)
+    with pytest.raises(ValueError):
+        FormatEngine.get("%m-%d")("02-30")
+
+
+def test_resolver_no_pattern_matched():
+    resolver = Resolver()
+    resolver("23:31")
+    with pytest.raises(ValueError):
+        resolver("this is not a known datetime")
+
+
+def test_resolver_find_input():
+    resolver = Resolver()
+    for line in ["a 2009-02-13T23:31:30Z GET /\n", "b 2009-02-13T23:31:31Z GET /\n"]:
+        start, end, result = resolver.find_input(line)
+        assert (start, end) == DT.find_input(line)[:2]
+        assert result == DT.find_input(line)[2]
+    assert resolver.find_hits == 1
+    assert resolver.find_misses == 1
+
+
+def test_resolver_find_input_mixed():
+    resolver = Resolver()
+    lines = [
+        "Feb 13 23:31:30 myhost sshd[1]: message\n",
+        "Feb 13 23:31:30 MST 2009 host sshd[1]: message\n",
+        "Feb 13 23:31:31 myhost sshd[1]: started 2009-02-13T23:31:30Z\n",
+        '127.0.0.1 - - [13/Feb/2009:23:31:30 +0000] "GET / HTTP/1.1" 200\n',
+        "Feb 13 23:31:31 myhost sshd[1]: message\n",
+    ]
+    for line in lines:
+        assert resolver.find_input(line) == DT.find_input(line)
+
+
+def test_resolve_epoch_units():
+    utc = zoneinfo.ZoneInfo("UTC")
+    expected = datetime.datetime(2009, 2, 13, 23, 31, 30, tzinfo=utc)
+    for value in ("1234567890", "1234567890000", "1234567890000000"):
+        assert DT.resolve_input(value) == expected
+    # Nanoseconds are truncated to microseconds without float rounding
+    result = DT.resolve_input("1234567890123456789")
+    assert result == expected.replace(microsecond=123456)
+    result = DT.resolve_input("1234567890.1234567")
+    assert result == expected.replace(microsecond=123456)
+    assert DT.resolve_input("1234567890", epoch_unit="ms") == datetime.datetime(
+        1970, 1, 15, 6, 56, 7, 890000, tzinfo=utc
+    )
+    assert DT.resolve_epoch("12:00") is None
+    assert DT.resolve_epoch("1.2.3") is None
+    with pytest.raises(ValueError):
+        DT.resolve_input("9" * 30)
+
+
+def test_resolver_epoch_unit():
+    resolver = Resolver(epoch_unit="us")
+    assert resolver("1234567890000000").timestamp() == 1234567890
+    assert resolver("1234567890").timestamp() == 1234.56789
+    assert resolver.stats()["hits"] == 1
+
+
+def test_resolve_batch_unix_epoch_timestamps():
+    numpy = pytest.importorskip("numpy")
+    result = DT.resolve_batch(
+        [
+            "1234567890",
+            "1234567890123",
+            "1234567890123456",
+            "1234567890123456789",
+            "1234567890.25",
+            1234567890,
+        ]
+    )
+    print(f"result {type(result)}: {result!r}")
+    assert result.dtype == numpy.dtype("datetime64[ns]")
+    assert result.astype(numpy.int64).tolist() == [
+        1234567890000000000,
+        1234567890123000000,
+        1234567890123456000,
+        1234567890123456789,
+        1234567890250000000,
+        1234567890000000000,
+    ]
+
+
+def test_resolve_batch_epoch_unit():
+    numpy = pytest.importorskip("numpy")
+    result = DT.resolve_batch(["1234567890", "1234567890.5"], epoch_unit="ms")
+    print(f"result {type(result)}: {result!r}")
+    assert result.astype(numpy.int64).tolist() == [
+        1234567890000000,
+        1234567890500000,
+    ]
+
+
+def test_resolve_batch_ISO_86001_format():
+    numpy = pytest.importorskip("numpy")
+    result = DT.resolve_batch(
+        [
+            "2009-02-13T23:31:30",
+            "2009-02-13T23:31:30Z",
+            "2009-02-13T17:31:30-06:00",
+            "2009-02-14 01:01:30.5+01:30",
+        ]
+    )
+    print(f"result {type(result)}: {result!r}")
+    assert result.astype(numpy.int64).tolist() == [
+        1234567890000000000,
+        1234567890000000000,
+        1234567890000000000,
+        1234567890500000000,
+    ]
+
+
+def test_resolve_batch_scalar_fallback():
+    numpy = pytest.importorskip("numpy")
+    values = ["February 13 23:31 MDT 2009", "2009-02-13T23:31:30 MT", "", "garbage"]
+    result = DT.resolve_batch(values)
+    print(f"result {type(result)}: {result!r}")
+    for value, item in zip(values[:2], result[:2]):
+        expected = DT.resolve_input(value).timestamp()
+        assert item.astype(numpy.int64) == int(expected * 10**9)
+    assert numpy.isnat(result[2:]).all()
+
+
+def test_render_batch():
+    pytest.importorskip("numpy")
+    values = DT.resolve_batch(["1234567890", "garbage"])
+    assert DT.render_batch(values).tolist() == ["2009-02-13T23:31:30Z", "NaT"]
+    assert DT.render_batch(values, to="America/Denver").tolist() == [
+        "2009-02-13T16:31:30-0700",
+        "NaT",
+    ]
+    assert DT.render_batch(values, to="epoch").tolist() == ["1234567890", "NaT"]
+    assert DT.render_batch(values, to="Asia/Tokyo", fmt="%H:%M %Z").tolist() == [
+        "08:31 JST",
+        "NaT",
+    ]
+
+
+@pytest.mark.parametrize(
+    "key", ["UTC", "America/Denver", "Australia/Sydney", "Europe/London", "Asia/Tokyo"]
+)
+def test_zone_table_lookup_matches_zoneinfo(key):
+    table = ZoneTable.get(key)
+    zone = zoneinfo.ZoneInfo(key)
+    # Every hour of 2009 plus a year well past the transitions in TZif files
+    for start in [1230768000, 4102444800]:
+        for timestamp in range(start, start + 366 * 86400, 3600):
+            local = datetime.datetime.fromtimestamp(timestamp, tz=zone)
+            expected = (int(local.utcoffset().total_seconds()), local.tzname())
+            assert table.lookup(timestamp) == expected
+
+
+def test_zone_table_lookup_at_transition():
+    table = ZoneTable.get("America/Denver")
+    # Sun Mar 8 2009 02:00 MST is 09:00 UTC
+    assert table.lookup(1236502800 - 1) == (-25200, "MST")
+    assert table.lookup(1236502800) == (-21600, "MDT")
+
+
+def test_zone_table_get_is_cached():
+    assert ZoneTable.get("America/Denver") is ZoneTable.get("America/Denver")
+
+
+def test_zone_table_astimezone():
+    result = DT.resolve_input("1234567890")
+    for key in REPORT_ZONES:
+        expected = result.astimezone(zoneinfo.ZoneInfo(key))
+        local = ZoneTable.get(key).astimezone(result)
+        assert local == expected
+        assert local.strftime(DEFAULT_FORMAT) == expected.strftime(DEFAULT_FORMAT)
+
+
+def test_render_batch_uses_zone_table_offsets():
+    pytest.importorskip("numpy")
+    values = DT.resolve_batch(["2009-03-08T08:59:59Z", "2009-03-08T09:00:00Z"])
+    assert DT.render_batch(values, to="America/Denver").tolist() == [
+        "2009-03-08T01:59:59-0700",
+        "2009-03-08T03:00:00-0600",
+    ]
+
+
+@pytest.fixture()
+def zone_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(ZoneIndex, "index", None)
+    monkeypatch.setattr(TransitionCache, "cache", None)
+    yield tmp_path / "get_datetime" / "zones.json"
+
+
+def test_zone_index_prefix(zone_index):
+    index = ZoneIndex.get()
+    names = index.prefix("America/Ar")
+    assert "America/Araguaina" in names
+    assert "America/Argentina/Buenos_Aires" in names
+    assert all(name.startswith("America/Ar") for name in names)
+    assert index.prefix("america/ar") == names
+    assert index.prefix("") == sorted(zoneinfo.available_timezones())
+    assert index.prefix("Nowhere/") == []
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("America/Denver", "America/Denver"),
+        ("america/denver", "America/Denver"),
+        ("new york", "America/New_York"),
+        ("Amercia/Denver", "America/Denver"),
+        ("pst", "US/Pacific"),
+        ("JST", "Asia/Tokyo"),
+        ("AEST", "Australia/Brisbane"),
+    ],
+)
+def test_zone_index_resolve(zone_index, name, expected):
+    assert ZoneIndex.get().resolve(name) == expected
+
+
+def test_zone_index_resolve_unknown(zone_index):
+    with pytest.raises(ValueError):
+        ZoneIndex.get().resolve("Nowhere/Zz")
+
+
+def test_zone_index_cache(zone_index):
+    index = ZoneIndex.get()
+    assert zone_index.exists()
+    ZoneIndex.index = None
+    cached = ZoneIndex.get()
+    assert cached is not index
+    assert cached.names == index.names
+    assert cached.abbrs == index.abbrs
+    # A cache written for other tzdata is rebuilt
+    data = json.loads(zone_index.read_text())
+    zone_index.write_text(json.dumps({**data, "signature": ["stale"]}))
+    ZoneIndex.index = None
+    assert ZoneIndex.get().names == index.names
+    assert json.loads(zone_index.read_text())["signature"] == data["signature"]
+
+
+def test_resolve_zone(zone_index):
+    assert resolve_zone("UTC") == "UTC"
+    # Names ZoneInfo loads do not need the index
+    assert ZoneIndex.index is None
+    assert resolve_zone("utc") == "UTC"
+
+
+def test_list_prefix(zone_index, capsys):
+    run(*get_parser().parse_known_args(["--list", "Europe/L"]))
+    assert capsys.readouterr().out.splitlines() == [
+        "Europe/Lisbon",
+        "Europe/Ljubljana",
+        "Europe/London",
+        "Europe/Luxembourg",
+    ]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("90", 90),
+        ("30s", 30),
+        ("5m", 300),
+        ("1h30m", 5400),
+        ("1d", 86400),
+        ("2W", 1209600),
+    ],
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+def test_parse_duration_invalid():
+    with pytest.raises(ValueError):
+        parse_duration("5 minutes")
+
+
+def test_schedule_rows_matches_zoneinfo():
+    zones = ["America/Denver", "Europe/London", "Australia/Sydney", "UTC"]
+    # Sat Mar 7 2009 through Mon Mar 9 2009 crosses the US DST change
+    rows = list(schedule_rows(1236384000, 1236556800, 900, zones))
+    assert len(rows) == 193
+    for timestamp, cells in rows:
+        for zone, (offset, abbr, changed) in zip(zones, cells):
+            zone = zoneinfo.ZoneInfo(zone)
+            local = datetime.datetime.fromtimestamp(timestamp, tz=zone)
+            assert offset == int(local.utcoffset().total_seconds())
+            assert abbr == local.tzname()
+
+
+def test_schedule_rows_marks_changes():
+    rows = list(schedule_rows(1236495600, 1236510000, 3600, ["America/Denver"]))
+    assert [cells[0] for _, cells in rows] == [
+        (-25200, "MST", False),
+        (-25200, "MST", False),
+        (-21600, "MDT", True),
+        (-21600, "MDT", False),
+        (-21600, "MDT", False),
+    ]
+
+
+def test_schedule_rows_invalid():
+    with pytest.raises(ValueError):
+        list(schedule_rows(10, 0, 60, ["UTC"]))
+    with pytest.raises(ValueError):
+        list(schedule_rows(0, 10, 0, ["UTC"]))
+
+
+def test_schedule():
+    output = io.StringIO()
+    schedule(
+        range=["2009-03-08T08:00Z", "2009-03-08T09:00Z"],
+        step="1h",
+        zones="America/Denver,UTC",
+        output=output,
+    )
+    lines = output.getvalue().splitlines()
+    print(f"lines {type(lines)}: {lines!r}")
+    assert lines[0].split() == ["UTC", "America/Denver", "UTC"]
+    assert lines[1] == (
+        "2009-03-08 08:00:00   03-08 01:00 MST        03-08 08:00 UTC"
+    )
+    assert lines[2] == (
+        "2009-03-08 09:00:00   03-08 03:00 MDT*       03-08 09:00 UTC"
+    )
+
+
+@pytest.mark.parametrize(
+    "key", ["America/Denver", "Europe/London", "Australia/Lord_Howe"]
+)
+def test_zone_table_transitions_matches_zoneinfo(key):
+    start, end = 1704067200, 1735689600  # 2024
+    zone = zoneinfo.ZoneInfo(key)
+
+    def current(timestamp):
+        local = datetime.datetime.fromtimestamp(timestamp, tz=zone)
+        return local.utcoffset() // datetime.timedelta(seconds=1), local.tzname()
+
+    expected = [
+        timestamp
+        for timestamp in range(start + 1800, end, 1800)
+        if current(timestamp) != current(timestamp - 1800)
+    ]
+    found = ZoneTable(key).transitions(start, end)
+    assert [timestamp for timestamp, _, _ in found] == expected
+    for timestamp, before, after in found:
+        assert before == current(timestamp - 1)
+        assert after == current(timestamp)
+
+
+def test_zone_table_transitions_without_tzif():
+    table = ZoneTable("America/Denver")
+    expected = table.transitions(1704067200, 1767225600)
+    table.loaded = False
+    table.years = {}
+    assert table.transitions(1704067200, 1767225600) == expected
+    assert len(expected) == 4
+
+
+def test_transition_cache(zone_index, monkeypatch):
+    zones = ["Europe/London", "America/Denver", "UTC"]
+    expected = transition_rows(1709251200, 1711929600, zones)
+    path = zone_index.with_name("transitions.json")
+    assert path.exists()
+    # The cache file answers without loading the zones' transition data
+    monkeypatch.setattr(TransitionCache, "cache", None)
+    monkeypatch.setattr(ZoneTable, "tables", {})
+    assert transition_rows(1709251200, 1711929600, zones) == expected
+    assert ZoneTable.tables == {}
+    # A cache written for other tzdata is not used
+    monkeypatch.setattr(TransitionCache, "cache", None)
+    monkeypatch.setattr(ZoneIndex, "signature", staticmethod(lambda: ["other"]))
+    assert TransitionCache.get().zones == {}
+
+
+def test_transition_lines(zone_index):
+    rows = transition_rows(
+        1709251200, 1711929600, ["Europe/London", "America/Denver", "UTC"]
+    )
+    assert [zone for _, zone, _, _ in rows] == ["America/Denver", "Europe/London"]
+    assert list(transition_lines(rows, output_format="csv")) == [
+        "utc,epoch,zone,local,offset_before,offset_after,abbr_before,abbr_after\n",
+        "2024-03-10 09:00:00,1710061200,America/Denver,2024-03-10 03:00:00,"
+        "-0700,-0600,MST,MDT\n",
+        "2024-03-31 01:00:00,1711846800,Europe/London,2024-03-31 02:00:00,"
+        "+0000,+0100,GMT,BST\n",
+    ]
+    lines = list(transition_lines(rows))
+    assert lines[1].split() == [
+        "2024-03-10",
+        "09:00:00",
+        "2024-03-10",
+        "03:00:00",
+        "MST",
+        "-0700",
+        "->",
+        "MDT",
+        "-0600",
+        "America/Denver",
+    ]
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        (["--list"], ("", None, [])),
+        (["--list", "Europe/"], ("Europe/", None, [])),
+        # The value directly after an optional value option is taken by it
+        (["--list", "1234567890"], ("1234567890", None, [])),
+        (["1234567890", "--list"], ("", None, ["1234567890"])),
+        (["--transitions", "2024-03-01"], None),
+        (["2024-03-01", "--transitions"], (None, TRANSITION_DAYS, ["2024-03-01"])),
+        (["--transitions", "90", "2024-03-01"], (None, 90, ["2024-03-01"])),
+    ],
+)
+def test_optional_value_ordering(args, expected, capsys):
+    parser = get_parser()
+    if expected is None:
+        with pytest.raises(SystemExit):
+            parser.parse_args(args)
+        assert "invalid int value: '2024-03-01'" in capsys.readouterr().err
+        return
+    argv = parser.parse_args(args)
+    assert (argv.list_all_zones, argv.transitions, argv.values) == expected
+
+
+def test_transitions(zone_index):
+    args = ["--transitions", "31", "--zones", "Europe/London", "2024-03-01"]
+    output = io.StringIO()
+    argv, remaining_argv = get_parser().parse_known_args(args + ["-z", "utc"])
+    run(argv, remaining_argv, output_format="ndjson", output=output)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert records == [
+        {
+            "utc": "2024-03-31 01:00:00",
+            "epoch": 1711846800,
+            "zone": "Europe/London",
+            "local": "2024-03-31 02:00:00",
+            "offset_before": "+0000",
+            "offset_after": "+0100",
+            "abbr_before": "GMT",
+            "abbr_after": "BST",
+        }
+    ]
+    with pytest.raises(SystemExit):
+        transitions(transitions=-1, zones="UTC")
+
+
+def test_kolor():
+    kolor = Kolor()
+    text = kolor("x", background="yellow", color="black", style="bold", bright=True)
+    assert text == "\033[103;1;90mx\033[0m"
+    assert ("black", "yellow", "bold", True) in Kolor.prefixes
+    assert kolor("x", color="RED") == "\033[0;0;31mx\033[0m"
+    assert kolor("x") == "x"
+    assert Kolor(enabled=False)("x", color="red") == "x"
+    assert not Kolor.isatty(io.StringIO())
+
+
+def test_main_color():
+    output = io.StringIO()
+    main(values=["1234567890"], localzone="America/Denver", output=output)
+    assert "\033[" not in output.getvalue()
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 4 + len(REPORT_ZONES) + 2
+
+    output = io.StringIO()
+    main(values=["1234567890"], localzone="America/Denver", output=output, color=True)
+    colored = [line for line in output.getvalue().splitlines() if "\033[" in line]
+    assert len(colored) == 1
+    assert colored[0].endswith("America/Denver\033[0m")
+
+
+def test_tracer_stages():
+    events = []
+    trace = Tracer(events.append)
+    DT.resolve_input("1234567890", trace=trace)
+    assert [event["stage"] for event in events] == ["start", "epoch"]
+    assert events[-1]["matched"] is True
+
+    events.clear()
+    DT.resolve_input("Feb 13 23:31:30 UTC 2009", trace=trace)
+    stages = [event["stage"] for event in events]
+    assert stages[:3] == ["start", "epoch", "iso"]
+    assert stages[-4:] == ["pattern", "groups", "tzinfo", "offset"]
+    assert all(event["elapsed"] >= 0 for event in events)
+    patterns = [event for event in events if event["stage"] == "pattern"]
+    assert [event["matched"] for event in patterns][-1] is True
+
+
+def test_tracer_resolver_retry():
+    events = []
+    resolver = Resolver(trace=Tracer(events.append))
+    resolver("a 12:00 x")
+    events.clear()
+    resolver("b 13:00 y")
+    # The recently matched pattern is reused without the full search
+    assert [event["stage"] for event in events] == ["groups", "tzinfo", "offset"]
+
+
+def test_bench_corpus():
+    from get_datetime_bench import CORPUS, CORPUS_FORMATS, compare
+
+    # Each "local" corpus entry exercises its own pattern, in table order
+    local = [name for name in CORPUS if name.startswith("local_")]
+    assert len(local) == len(PatternEngine.patterns)
+    for index, name in enumerate(local):
+        for value in CORPUS[name]:
+            matcher, _ = DT.resolve(value)
+            assert matcher.re is PatternEngine.patterns[index]
+    for name, matcher in (("epoch_int", "epoch"), ("iso_z", "iso"), ("fmt", "fmt")):
+        for value in CORPUS[name]:
+            assert DT.resolve(value, fmt=CORPUS_FORMATS.get(name))[0] == matcher
+    for value in CORPUS["unmatched"]:
+        with pytest.raises(ValueError):
+            DT.resolve_input(value)
+
+    assert compare({"a": 130.0, "b": 120.0}, {"a": 100.0, "b": 100.0}, 0.25) == ["a"]
+
+
+@pytest.fixture()
+def server(tmp_path, zone_index):
+    path = str(tmp_path / "get_datetime.sock")
+    server = ResolverServer(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_connect(server, capsys):
+    args = ["--iso", "2009-02-14T00:31:30+0100"]
+    response = connect(server, args)
+    run(*get_parser().parse_known_args(args))
+    assert response["status"] == 0
+    assert response["output"] == capsys.readouterr().out
+
+
+def test_connect_schedule(server):
+    args = ["--range", "2009-03-08T08:00Z", "2009-03-08T09:00Z", "--zones", "UTC"]
+    response = connect(server, args)
+    assert response["status"] == 0
+    assert response["output"].splitlines()[1] == (
+        "2009-03-08 08:00:00   03-08 08:00 UTC"
+    )
+
+
+def test_connect_errors(server):
+    response = connect(server, ["--step"])
+    assert response["status"] == 2
+    assert "error" in response["error"]
+    response = connect(server, ["--stream"])
+    assert response["status"] == 2
+    # Color is only written for clients writing to a terminal
+    response = connect(server, ["-z", "America/Denver", "0"], color=True)
+    assert "\033[" in response["output"]
+    # The daemon keeps answering after failed requests
+    assert connect(server, ["0"])["status"] == 0
+
+
+def test_connect_local_modes(server, tmp_path, monkeypatch):
+    assert is_local(["--stream"])
+    assert is_local(["--serve=/tmp/get_datetime.sock"])
+    assert not is_local(["-z", "America/Denver", "0"])
+    # Abbreviations are not expanded into a local mode run by the daemon
+    for option in ("--str", "--hist=1h", "--betw=0"):
+        response = connect(server, [option, "0"])
+        assert response["status"] == 0
+        assert response["output"].startswith(f"NOTICE: Ignoring argument(s): {option}")
+    # Requests run in the client's working directory
+    cwd = os.getcwd()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("get_datetime.run", lambda *args, **kwargs: print(os.getcwd()))
+    assert connect(server, ["0"])["output"] == f"{tmp_path}\n"
+    monkeypatch.chdir(cwd)
+    assert connect(server, ["0"])["output"] == f"{cwd}\n"
+
+
+def test_serve_existing_path(server, tmp_path, monkeypatch):
+    err = io.StringIO()
+    monkeypatch.setattr("get_datetime.stderr", err)
+    # Files other than a socket are left alone
+    path = tmp_path / "notes.txt"
+    path.write_text("keep\n")
+    with pytest.raises(SystemExit):
+        serve(serve=str(path))
+    assert path.read_text() == "keep\n"
+    assert err.getvalue().startswith("Error: ")
+    # A socket a daemon is answering on is left alone
+    with pytest.raises(SystemExit):
+        serve(serve=server)
+    assert connect(server, ["0"])["status"] == 0
+
+
+def test_serve_stale_socket(tmp_path, monkeypatch):
+    import socket
+
+    path = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(path)
+
+    class Started(Exception):
+        pass
+
+    def resolver_server(path):
+        assert not os.path.exists(path)
+        raise Started()
+
+    monkeypatch.setattr("get_datetime.ResolverServer", resolver_server)
+    with pytest.raises(Started):
+        serve(serve=path)
+
+
 @pytest.mark.xfail()
 def test_resolve_input_zoneinfo_NotFoundError():
     dt = DT()
@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 
+import atexit
+import csv
+import heapq
 import ipaddress
+import json
 import logging
+import tempfile
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
 from pathlib import Path
-from sys import exc_info
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+from sys import exc_info, stdin, stdout
 
 ## python -m pip install --upgrade pip geoip2
 try:
@@ -19,6 +28,33 @@ __version__ = '0.0.2a'
 
 PROGRAM_NAME = Path(__file__).name
 
+## GeoLite2 database readers by path, see `get_reader'
+READERS = {}
+## GeoLite2 answers cached by path, see `get_cache'
+CACHES = {}
+## Networks kept by each `NetworkCache'
+GEO_CACHE_SIZE = 65536
+
+## Address attributes written by default in bulk mode
+BULK_ATTRIBUTES = 'version,compressed,is_private,is_global'
+## Fields added by `get_geoinfo'
+GEO_FIELDS = ('asn', 'asn_network', 'asn_organization', 'city', 'continent',
+    'country', 'subdivisions')
+## Fields added by a `NetworkIndex' lookup
+INDEX_FIELDS = ('in_network', 'in_label')
+## Records kept for repeated addresses in bulk mode
+BULK_CACHE_SIZE = 65536
+## Lines buffered before each write in bulk mode
+BULK_BATCH_SIZE = 4096
+BULK_BUFFER_SIZE = 1 << 20
+## Boolean address attributes looked up by range, see `FlagTable'
+FLAG_ATTRIBUTES = ('is_global', 'is_link_local', 'is_loopback', 'is_multicast',
+    'is_private', 'is_reserved', 'is_unspecified')
+## Ranges sorted in memory before spilling to a temporary file in aggregate mode
+AGGREGATE_CHUNK_SIZE = 1 << 19
+## Bytes of a range in aggregate mode temporary files, see `_write_run'
+_RANGE_SIZE = 33
+
 
 ## -----------------------------------------------------------------------------
 def echo(item, attr, **kwargs):
@@ -41,6 +77,111 @@ def echo(item, attr, **kwargs):
         print(f"{attr:<{offset}}: {value}")
 
 
+## -----------------------------------------------------------------------------
+def get_reader(path):
+    """Return a GeoLite2 database reader shared by all lookups
+
+    Each database is opened once per process memory-mapped and closed on exit
+
+    path <str>: path to a GeoLite2 database
+    """
+    reader = READERS.get(path)
+    if reader is None:
+        logging.debug(f"get_reader - open {path}")
+        reader = geoip2.database.Reader(path, mode=geoip2.database.MODE_MMAP)
+        READERS[path] = reader
+    return reader
+
+
+@atexit.register
+def close_readers():
+    """Close the shared GeoLite2 database readers"""
+    while READERS:
+        path, reader = READERS.popitem()
+        logging.debug(f"close_readers - close {path}")
+        reader.close()
+
+
+## -----------------------------------------------------------------------------
+class NetworkCache(object):
+    """Answers cached by the network they cover and found for any address
+    inside it by longest prefix match
+
+    Networks are stored by (version, prefixlen, network bits) so a lookup
+    shifts the address to each prefix length in use, longest first. The
+    least recently used network is evicted past the size bound.
+    """
+
+    def __init__(self, size=GEO_CACHE_SIZE):
+        self.size = size
+        self.networks = OrderedDict()
+        ## Number of networks of each prefix length by version
+        self.lengths = {4: {}, 6: {}}
+        ## Prefix lengths in use by version, longest first
+        self.order = {4: [], 6: []}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, address):
+        """Return the answer for the network containing an address or None
+
+        address <obj>: ip_address object
+        """
+        version = address.version
+        bits = address.max_prefixlen
+        value = int(address)
+        for prefixlen in self.order[version]:
+            key = (version, prefixlen, value >> (bits - prefixlen))
+            answer = self.networks.get(key)
+            if answer is not None:
+                self.networks.move_to_end(key)
+                self.hits += 1
+                return answer
+        self.misses += 1
+        return None
+
+    def set(self, network, answer):
+        """Store the answer for every address of a network
+
+        network <obj>: ip_network object
+        answer <dict>: Value returned by `get'
+        """
+        version = network.version
+        prefixlen = network.prefixlen
+        bits = network.max_prefixlen - prefixlen
+        key = (version, prefixlen, int(network.network_address) >> bits)
+        if key not in self.networks:
+            self._count(version, prefixlen, 1)
+        self.networks[key] = answer
+        self.networks.move_to_end(key)
+        while len(self.networks) > self.size:
+            (version, prefixlen, _), _ = self.networks.popitem(last=False)
+            self._count(version, prefixlen, -1)
+
+    def _count(self, version, prefixlen, change):
+        """Track the networks of a prefix length, updating the lookup order
+        when a length comes into or goes out of use"""
+        lengths = self.lengths[version]
+        count = lengths.get(prefixlen, 0) + change
+        if count:
+            lengths[prefixlen] = count
+        else:
+            del lengths[prefixlen]
+        if count in (0, 1):
+            self.order[version] = sorted(lengths, reverse=True)
+
+
+def get_cache(path):
+    """Return the `NetworkCache' of a GeoLite2 database
+
+    path <str>: path to a GeoLite2 database
+    """
+    cache = CACHES.get(path)
+    if cache is None:
+        cache = CACHES[path] = NetworkCache()
+    return cache
+
+
 ## -----------------------------------------------------------------------------
 def get_geoinfo(address, **kwargs):
     """"""
@@ -48,45 +189,647 @@ def get_geoinfo(address, **kwargs):
     logging.debug(f"get_geoinfo - **kwargs: {kwargs}")
     geoinfo = {}
 
+    ## Answers are cached by the network they cover, only addresses are
+    ## looked up in the cache
+    cached = isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address))
+
     ## Query ASN data for the addres 
-    try:
-        geolite2_asn = geoip2.database.Reader(kwargs.get('geolite2_asn'))
-        result = geolite2_asn.asn(str(address))
-        geoinfo.update(asn = result.autonomous_system_number)
-        geoinfo.update(asn_network = result.autonomous_system_organization)
-        geoinfo.update(asn_organization = str(result.network))  # IPv4Network
-    except geoip2.errors.AddressNotFoundError:
-        logging.debug(f"get_geoinfo - {address} asn query {err}")
-    except Exception as err:
-        logging.error(f"get_geoinfo - {address} asn query {err}")
+    path = kwargs.get('geolite2_asn')
+    found = get_cache(path).get(address) if cached else None
+    if found is not None:
+        geoinfo.update(found)
+    else:
+        try:
+            geolite2_asn = get_reader(path)
+            result = geolite2_asn.asn(str(address))
+            found = {}
+            found.update(asn = result.autonomous_system_number)
+            found.update(asn_network = result.autonomous_system_organization)
+            found.update(asn_organization = str(result.network))  # IPv4Network
+            get_cache(path).set(result.network, found)
+            geoinfo.update(found)
+        except geoip2.errors.AddressNotFoundError as err:
+            logging.debug(f"get_geoinfo - {address} asn query {err}")
+            if getattr(err, 'network', None) is not None:
+                get_cache(path).set(err.network, {})
+        except Exception as err:
+            logging.error(f"get_geoinfo - {address} asn query {err}")
 
     ## Query address data
-    try:
-        geolite2_city = geoip2.database.Reader(kwargs.get('geolite2_city'))
-        result = geolite2_city.city(str(address))
-        geoinfo.update(city = result.city.names.get('en'))
-        geoinfo.update(continent = "{}, {}".format(
-            result.continent.code,
-            result.continent.names.get('en'),
-            ))
-        geoinfo.update(country = "{}, {}".format(
-            result.country.iso_code,
-            result.country.names.get('en'),
-            ))
-        #geoinfo.update(location = result.location)
-        #geoinfo.update(postal = result.postal.code)
-        geoinfo.update(subdivisions = "{}, {}".format(
-            result.subdivisions.most_specific.iso_code,
-            result.subdivisions.most_specific.name,
-            ))
-    except geoip2.errors.AddressNotFoundError:
-        logging.debug(f"get_geoinfo - {address} city query {err}")
-    except Exception as err:
-        logging.error(f"get_geoinfo - {address} city query {err}")
+    path = kwargs.get('geolite2_city')
+    found = get_cache(path).get(address) if cached else None
+    if found is not None:
+        geoinfo.update(found)
+    else:
+        try:
+            geolite2_city = get_reader(path)
+            result = geolite2_city.city(str(address))
+            found = {}
+            found.update(city = result.city.names.get('en'))
+            found.update(continent = "{}, {}".format(
+                result.continent.code,
+                result.continent.names.get('en'),
+                ))
+            found.update(country = "{}, {}".format(
+                result.country.iso_code,
+                result.country.names.get('en'),
+                ))
+            #found.update(location = result.location)
+            #found.update(postal = result.postal.code)
+            found.update(subdivisions = "{}, {}".format(
+                result.subdivisions.most_specific.iso_code,
+                result.subdivisions.most_specific.name,
+                ))
+            get_cache(path).set(result.traits.network, found)
+            geoinfo.update(found)
+        except geoip2.errors.AddressNotFoundError as err:
+            logging.debug(f"get_geoinfo - {address} city query {err}")
+            if getattr(err, 'network', None) is not None:
+                get_cache(path).set(err.network, {})
+        except Exception as err:
+            logging.error(f"get_geoinfo - {address} city query {err}")
 
     return geoinfo
 
 
+## -----------------------------------------------------------------------------
+def parse_address(text):
+    """Return an ip_address or ip_network object for a string
+
+    Plain addresses are converted with inet_pton, which accepts the same
+    notation as ipaddress at a fraction of the cost, anything else (networks,
+    scoped IPv6 addresses, errors) is left to ipaddress
+
+    text <str>: IP address or network
+    """
+    try:
+        if ':' in text:
+            return ipaddress.IPv6Address(inet_pton(AF_INET6, text))
+        return ipaddress.IPv4Address(inet_pton(AF_INET, text))
+    except (OSError, ValueError):
+        pass
+    if text.find('/') != -1:
+        return ipaddress.ip_network(text, strict=False)
+    return ipaddress.ip_address(text)
+
+
+def parse_network(text):
+    """Return (version, first, last, prefixlen) integers of a network string,
+    an address is a network of one address
+
+    Host bits are ignored (strict=False), plain CIDR notation is converted
+    with inet_pton and anything else is left to ipaddress
+
+    text <str>: IP network or address
+    """
+    address, _, prefixlen = text.partition('/')
+    try:
+        if ':' in address:
+            version, bits, packed = 6, 128, inet_pton(AF_INET6, address)
+        else:
+            version, bits, packed = 4, 32, inet_pton(AF_INET, address)
+        if not prefixlen:
+            length = bits
+        elif prefixlen.isascii() and prefixlen.isdigit():
+            length = int(prefixlen)
+        else:
+            length = -1
+        if 0 <= length <= bits:
+            host = bits - length
+            first = int.from_bytes(packed, 'big') >> host << host
+            return version, first, first | ((1 << host) - 1), length
+    except (OSError, ValueError):
+        pass
+    network = ipaddress.ip_network(text, strict=False)
+    first = int(network.network_address)
+    return (network.version, first, first + network.num_addresses - 1,
+        network.prefixlen)
+
+
+class FlagTable(object):
+    """Boolean address attributes (is_private, is_global, ...) by range
+
+    The attributes only depend on which of the special networks of the
+    ipaddress module an address is in, so the address space is split at the
+    edges of those networks and each attribute is taken from an ip_address
+    object once per range. A lookup is a binary search instead of building
+    an object and testing it against each network.
+    """
+
+    ## Tables by version, see `get'
+    tables = {}
+
+    def __init__(self, version, edges):
+        self.address = {4: ipaddress.IPv4Address, 6: ipaddress.IPv6Address}[version]
+        self.starts = sorted(edges)
+        ## Attribute values of each range, found on first use
+        self.values = {}
+
+    @classmethod
+    def get(cls, version):
+        """Return the table of an IP version or None when the special
+        networks can not be found
+
+        version <int>: 4 or 6
+        """
+        if version not in cls.tables:
+            edges = cls.edges(version)
+            cls.tables[version] = cls(version, edges) if edges else None
+        return cls.tables[version]
+
+    @staticmethod
+    def edges(version):
+        """Return the first and next to last address of each special network
+        as integers, an empty set when none are found"""
+        types = {
+            4: (ipaddress.IPv4Network, ipaddress.IPv4Address),
+            6: (ipaddress.IPv6Network, ipaddress.IPv6Address),
+        }[version]
+        constants = getattr(ipaddress, f'_IPv{version}Constants', None)
+        edges = set()
+        for value in vars(constants).values() if constants else ():
+            for item in value if isinstance(value, (list, tuple)) else [value]:
+                if isinstance(item, types):
+                    network = ipaddress.ip_network(item)
+                    first = int(network.network_address)
+                    edges.update((first, first + network.num_addresses))
+        if not edges:
+            return edges
+        if version == 6:
+            ## :: and ::1 are tested by value, IPv4-mapped addresses by the
+            ## IPv4 networks they map to
+            edges.update((0, 1, 2))
+            mapped = 0xffff << 32
+            edges.update(mapped + edge for edge in FlagTable.edges(4) or [0])
+            edges.add(mapped + (1 << 32))
+        bits = 32 if version == 4 else 128
+        return {edge for edge in edges | {0} if edge < 1 << bits}
+
+    def lookup(self, attr, value):
+        """Return a boolean attribute of an address
+
+        attr <str>: One of FLAG_ATTRIBUTES
+        value <int>: Address as an integer
+        """
+        i = bisect_right(self.starts, value) - 1
+        values = self.values.get(attr)
+        if values is None:
+            values = self.values[attr] = [None] * len(self.starts)
+        found = values[i]
+        if found is None:
+            found = values[i] = getattr(self.address(self.starts[i]), attr)
+        return found
+
+
+def read_networks(paths):
+    """Yield (network, label) for each line of CIDR list files, the label is
+    the rest of the line after whitespace or a comma or the file name, blank
+    lines and # comments are skipped
+
+    paths <list>: Paths of files with a network on each line
+    """
+    for path in paths:
+        default = Path(path).stem
+        with open(path, errors='replace') as handle:
+            for line in handle:
+                text = line.strip()
+                if not text or text.startswith('#'):
+                    continue
+                network, *label = text.replace(',', ' ', 1).split(None, 1)
+                yield network, label[0] if label else default
+
+
+class NetworkIndex(object):
+    """Networks indexed for the most specific match of an address
+
+    Nested networks are flattened into sorted, disjoint integer ranges which
+    point at the most specific network covering them, so a match is a binary
+    search of the range starts. Each network keeps the network it is nested
+    in for matching networks wider than a range.
+    """
+
+    def __init__(self, networks):
+        """networks <iter>: (network, label) string tuples"""
+        ## (first, last, prefixlen, version, label, parent index) by index
+        self.entries = []
+        ## Network strings by entry index, see `network'
+        self.names = {}
+        ## Range starts, ends and entry indexes by version
+        self.starts = {4: array('Q'), 6: []}
+        self.ends = {4: array('Q'), 6: []}
+        self.owners = {4: array('l'), 6: array('l')}
+
+        pending = {4: [], 6: []}
+        for text, label in networks:
+            try:
+                version, first, last, prefixlen = parse_network(text)
+            except ValueError as err:
+                logging.error(f"NetworkIndex - skip `{text}' {err}")
+                continue
+            pending[version].append((first, -last, len(self.entries)))
+            self.entries.append([first, last, prefixlen, version, label, -1])
+        for version, ranges in pending.items():
+            self._flatten(version, sorted(ranges))
+
+    def _flatten(self, version, ranges):
+        """Add the disjoint ranges of networks sorted by (first, -last)"""
+        starts = self.starts[version]
+        ends = self.ends[version]
+        owners = self.owners[version]
+
+        def emit(first, last, owner):
+            if first > last:
+                return
+            if owners and owners[-1] == owner and ends[-1] + 1 == first:
+                ends[-1] = last
+                return
+            starts.append(first)
+            ends.append(last)
+            owners.append(owner)
+
+        ## Networks containing the current position, innermost last
+        stack = []
+        position = 0
+        for first, last, index in ranges:
+            last = -last
+            while stack and self.entries[stack[-1]][1] < first:
+                closed = stack.pop()
+                emit(position, self.entries[closed][1], closed)
+                position = self.entries[closed][1] + 1
+            if stack:
+                emit(position, first - 1, stack[-1])
+                self.entries[index][5] = stack[-1]
+            stack.append(index)
+            position = first
+        while stack:
+            closed = stack.pop()
+            emit(position, self.entries[closed][1], closed)
+            position = self.entries[closed][1] + 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def network(self, index):
+        """Return the network string of an entry"""
+        name = self.names.get(index)
+        if name is None:
+            first, _, prefixlen, version, _, _ = self.entries[index]
+            if version == 4:
+                network = ipaddress.IPv4Network((first, prefixlen))
+            else:
+                network = ipaddress.IPv6Network((first, prefixlen))
+            name = self.names[index] = str(network)
+        return name
+
+    def lookup(self, address):
+        """Return (network, label) of the most specific network containing an
+        address or network, None without a match
+
+        address <obj>: ip_address or ip_network object
+        """
+        if hasattr(address, 'network_address'):
+            first = int(address.network_address)
+            last = int(address.broadcast_address)
+        else:
+            first = last = int(address)
+        version = address.version
+        i = bisect_right(self.starts[version], first) - 1
+        if i < 0 or first > self.ends[version][i]:
+            return None
+        index = self.owners[version][i]
+        while index != -1:
+            entry = self.entries[index]
+            if entry[1] >= last:
+                return self.network(index), entry[4]
+            index = entry[5]
+        return None
+
+
+def read_addresses(**kwargs):
+    """Yield address strings from the command line, files and stdin, blank
+    lines and # comments are skipped
+
+    **kwargs
+      addresses <list>: A list of IP address strings
+      files <list>: Paths of files with an address on each line
+      stdin <bool>: Read an address from each line of stdin
+    """
+    yield from kwargs.get('addresses') or []
+    handles = [open(path, errors='replace') for path in kwargs.get('files') or []]
+    if kwargs.get('stdin', False):
+        handles.append(open(stdin.fileno(), errors='replace', closefd=False))
+    for handle in handles:
+        with handle:
+            for line in handle:
+                text = line.strip()
+                if text and not text.startswith('#'):
+                    yield text
+
+
+def get_record(text, **kwargs):
+    """Return a tuple of field values for an address string, the address,
+    the attributes, GeoLite2 fields with `geoinfo' and an error message
+
+    text <str>: IP address or network
+
+    **kwargs
+      attributes <list>: Address attribute names
+      geoinfo <bool>: Include GeoLite2 database fields
+      index <obj>: `NetworkIndex' of the --in-file networks
+    """
+    attributes = kwargs.get('attributes')
+    geoinfo = kwargs.get('geoinfo', False)
+    index = kwargs.get('index')
+    try:
+        address = parse_address(text)
+    except ValueError as err:
+        size = len(attributes) + (len(GEO_FIELDS) if geoinfo else 0)
+        size += len(INDEX_FIELDS) if index is not None else 0
+        return (text, *[None] * size, str(err))
+    record = (text, *[getattr(address, attr, None) for attr in attributes])
+    if index is not None:
+        record += index.lookup(address) or (None, None)
+    if geoinfo:
+        found = get_geoinfo(address, **kwargs)
+        record += tuple(found.get(field) for field in GEO_FIELDS)
+    return record + (None,)
+
+
+def record_format(fields, **kwargs):
+    """Return a function formatting a record as a NDJSON or CSV line
+
+    **kwargs
+      output_format <str>: "ndjson" or "csv"
+        Default: "ndjson"
+    """
+    if kwargs.get('output_format') == 'csv':
+        return csv.writer(_Line(), lineterminator='\n').writerow
+    dumps = json.JSONEncoder(ensure_ascii=False, default=str).encode
+    return lambda record: dumps(dict(zip(fields, record))) + '\n'
+
+
+def address_format(**kwargs):
+    """Return a function formatting the line of a plain address string from
+    its inet_pton bytes, or None when an attribute needs an ipaddress object
+
+    `version', `compressed' and FLAG_ATTRIBUTES are found without building
+    an ip_address object. The returned function gives None for anything
+    else (networks, scoped addresses, embedded IPv4 notation, errors) and
+    the line is left to `get_record' and `record_format'.
+
+    **kwargs
+      attributes <list>: Address attribute names
+      output_format <str>: "ndjson" or "csv"
+        Default: "ndjson"
+    """
+    attributes = kwargs.get('attributes')
+    if not set(attributes) <= {'version', 'compressed', *FLAG_ATTRIBUTES}:
+        return None
+    tables = {version: FlagTable.get(version) for version in (4, 6)}
+    flags = [attr for attr in attributes if attr in FLAG_ATTRIBUTES]
+    if flags and None in tables.values():
+        return None
+
+    ## Address strings accepted by inet_pton need no JSON or CSV quoting
+    if kwargs.get('output_format') == 'csv':
+        template = ','.join(['%s'] * (len(attributes) + 1)) + ',\n'
+        booleans = {True: 'True', False: 'False'}
+    else:
+        template = '{%s, "error": null}\n' % ', '.join(
+            f'"{field}": "%s"' if field in ('address', 'compressed')
+            else f'"{field}": %s' for field in ['address', *attributes])
+        booleans = {True: 'true', False: 'false'}
+    compressed = 'compressed' in attributes
+
+    def format_address(address):
+        try:
+            if ':' in address:
+                version, packed = 6, inet_pton(AF_INET6, address)
+            else:
+                version, packed = 4, inet_pton(AF_INET, address)
+        except OSError:
+            return None
+        values = {'version': version}
+        if compressed:
+            values['compressed'] = inet_ntop(AF_INET6 if version == 6 else AF_INET,
+                packed)
+            ## ipaddress writes embedded IPv4 addresses in hexadecimal
+            if version == 6 and '.' in values['compressed']:
+                return None
+        if flags:
+            table = tables[version]
+            value = int.from_bytes(packed, 'big')
+            for attr in flags:
+                values[attr] = booleans[table.lookup(attr, value)]
+        return template % (address, *[values[attr] for attr in attributes])
+
+    return format_address
+
+
+class _Line(object):
+    """File-like object returning what is written, csv.writer's writerow
+    returns the line this way"""
+
+    def write(self, line):
+        return line
+
+
+def bulk(**kwargs):
+    """Write a NDJSON or CSV record for each address from the command line,
+    `--file' paths and stdin
+
+    Lines are cached by address string so repeated addresses are parsed,
+    looked up and formatted once
+
+    **kwargs
+      attributes <str>: Comma separated address attribute names
+      output_format <str>: "ndjson" or "csv"
+      output <file>: Text stream to write to
+        Default: stdout
+    """
+    logging.debug(f"bulk - **kwargs: {kwargs}")
+    attributes = [attr.strip() for attr in
+        (kwargs.get('attributes') or BULK_ATTRIBUTES).split(',') if attr.strip()]
+    kwargs.update(attributes = attributes) # pass through to `get_record'
+    fields = ['address', *attributes]
+    if kwargs.get('index') is not None:
+        fields.extend(INDEX_FIELDS)
+    if kwargs.get('geoinfo', False):
+        fields.extend(GEO_FIELDS)
+    fields.append('error')
+
+    format_record = record_format(fields, **kwargs)
+    format_address = None
+    if kwargs.get('index') is None and not kwargs.get('geoinfo', False):
+        format_address = address_format(**kwargs)
+
+    def lines():
+        if kwargs.get('output_format') == 'csv':
+            yield format_record(fields)
+        cache = {}
+        for text in read_addresses(**kwargs):
+            line = cache.get(text)
+            if line is None:
+                if len(cache) >= BULK_CACHE_SIZE:
+                    cache.clear()
+                if format_address is not None:
+                    line = format_address(text)
+                if line is None:
+                    line = format_record(get_record(text, **kwargs))
+                cache[text] = line
+            yield line
+
+    write_lines(lines(), kwargs.get('output') or open_output())
+
+
+def open_output():
+    """Return a buffered text stream writing to stdout"""
+    return open(stdout.fileno(), 'w', buffering=BULK_BUFFER_SIZE, closefd=False)
+
+
+def write_lines(lines, output):
+    """Write lines to output in batches"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= BULK_BATCH_SIZE:
+            output.write(''.join(batch))
+            batch.clear()
+    output.write(''.join(batch))
+    output.flush()
+
+
+## -----------------------------------------------------------------------------
+def merge_ranges(ranges):
+    """Yield (version, first, last) for each run of overlapping or adjacent
+    ranges sorted by (version, first)
+
+    ranges <iter>: (version, first, last) integer tuples
+    """
+    version = first = last = None
+    for next_version, next_first, next_last in ranges:
+        if next_version == version and next_first <= last + 1:
+            if next_last > last:
+                last = next_last
+            continue
+        if version is not None:
+            yield version, first, last
+        version, first, last = next_version, next_first, next_last
+    if version is not None:
+        yield version, first, last
+
+
+def sorted_ranges(ranges, **kwargs):
+    """Yield (version, first, last) ranges merged in sorted order
+
+    Ranges are sorted and merged in chunks, chunks after the first are
+    written to temporary files and read back by a k-way merge so input
+    larger than memory is sorted externally
+
+    ranges <iter>: (version, first, last) integer tuples
+
+    **kwargs
+      chunk_size <int>: Ranges sorted in memory at a time
+        Default: AGGREGATE_CHUNK_SIZE
+    """
+    chunk_size = kwargs.get('chunk_size', AGGREGATE_CHUNK_SIZE)
+    runs = []
+    chunk = []
+    try:
+        for item in ranges:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                chunk.sort()
+                runs.append(_write_run(merge_ranges(chunk)))
+                chunk.clear()
+        chunk.sort()
+        if runs:
+            logging.debug(f"sorted_ranges - merge {len(runs) + 1} sorted runs")
+            chunk = heapq.merge(chunk, *[_read_run(run) for run in runs])
+        yield from merge_ranges(chunk)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _write_run(ranges):
+    """Return a temporary file of sorted ranges, each packed as a version
+    byte and 16 byte big-endian first and last integers"""
+    run = tempfile.TemporaryFile()
+    batch = []
+    for version, first, last in ranges:
+        batch.append(bytes((version,)) + first.to_bytes(16, 'big')
+            + last.to_bytes(16, 'big'))
+        if len(batch) >= BULK_BATCH_SIZE:
+            run.write(b''.join(batch))
+            batch.clear()
+    run.write(b''.join(batch))
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    """Yield the (version, first, last) ranges of a `_write_run' file"""
+    from_bytes = int.from_bytes
+    while True:
+        data = run.read(_RANGE_SIZE * BULK_BATCH_SIZE)
+        if not data:
+            return
+        for i in range(0, len(data), _RANGE_SIZE):
+            yield (data[i], from_bytes(data[i + 1:i + 17], 'big'),
+                from_bytes(data[i + 17:i + _RANGE_SIZE], 'big'))
+
+
+def range_networks(first, last, bits):
+    """Yield (network, prefixlen) of the fewest networks covering the
+    integers first through last
+
+    bits <int>: 32 for IPv4 or 128 for IPv6
+    """
+    while first <= last:
+        ## Largest block aligned at first which does not pass last
+        host = (first & -first).bit_length() - 1 if first else bits
+        host = min(host, (last - first + 1).bit_length() - 1)
+        yield first, bits - host
+        first += 1 << host
+
+
+def format_network(version, network, prefixlen):
+    """Return a network string for integers"""
+    if version == 4:
+        return f"{inet_ntop(AF_INET, network.to_bytes(4, 'big'))}/{prefixlen}"
+    return str(ipaddress.IPv6Network((network, prefixlen)))
+
+
+def aggregate(**kwargs):
+    """Write the fewest networks covering every address and network from the
+    command line, `--file' paths and stdin, IPv4 networks first
+
+    **kwargs
+      chunk_size <int>: Ranges sorted in memory before spilling to disk
+      output <file>: Text stream to write to
+        Default: stdout
+    """
+    logging.debug(f"aggregate - **kwargs: {kwargs}")
+
+    def ranges():
+        for text in read_addresses(**kwargs):
+            try:
+                version, first, last, _ = parse_network(text)
+            except ValueError as err:
+                logging.error(f"ERROR: `{text}' {err}")
+                continue
+            yield version, first, last
+
+    def lines():
+        for version, first, last in sorted_ranges(ranges(), **kwargs):
+            bits = 32 if version == 4 else 128
+            for network, prefixlen in range_networks(first, last, bits):
+                yield format_network(version, network, prefixlen) + '\n'
+
+    write_lines(lines(), kwargs.get('output') or open_output())
+
+
 ## -----------------------------------------------------------------------------
 def main(*args, **kwargs):
     """Print information about IP addresses to stdout
@@ -103,6 +846,19 @@ def main(*args, **kwargs):
     if addresses is None:
         raise ValueError("`addresses' should not be None-Type")
 
+    ## Index the --in-file networks once for all addresses
+    if kwargs.get('in_files') and kwargs.get('index') is None:
+        kwargs.update(index = NetworkIndex(read_networks(kwargs.get('in_files'))))
+        logging.debug(f"main - index {len(kwargs.get('index'))} networks")
+
+    ## Collapse addresses and networks
+    if kwargs.get('aggregate', False):
+        return aggregate(**kwargs)
+
+    ## Write records for many addresses
+    if kwargs.get('stdin', False) or kwargs.get('files'):
+        return bulk(**kwargs)
+
     ip_network = kwargs.get('ip_network', False)
     if ip_network:
         ip_network = ipaddress.ip_network(ip_network, strict=False)
@@ -164,6 +920,12 @@ def main(*args, **kwargs):
             print("")
             print(f"{str(address)} in network {ip_network}: {(address in ip_network)}")
 
+        # Print the most specific --in-file network
+        if kwargs.get('index') is not None:
+            found = dict(zip(INDEX_FIELDS, kwargs.get('index').lookup(address) or ()))
+            echo(found, 'in_network', **kwargs)
+            echo(found, 'in_label', **kwargs)
+
         # Additional module options not handled currently
         """
         overlaps(other)
@@ -209,10 +971,13 @@ Example Usage:
 $ {PROGRAM_NAME} 140.82.112.3 2a09:bac3:6596:1ceb::/64
 $ {PROGRAM_NAME} 140.82.112.3/25 2a09:bac3:6596:1ceb::2f8:1e
 $ {PROGRAM_NAME} 140.82.113.123 --in 140.82.112.0/23
+$ {PROGRAM_NAME} 140.82.113.123 --in-file cloud-ranges.txt --in-file bogons.txt
+$ cut -d' ' -f1 access.log | {PROGRAM_NAME} --stdin --output-format csv
+$ {PROGRAM_NAME} --aggregate --file blocklist-1.txt --file blocklist-2.txt
         """,
         formatter_class=RawDescriptionHelpFormatter,
         )
-    parser.add_argument('addresses', metavar='<address>', nargs='+',
+    parser.add_argument('addresses', metavar='<address>', nargs='*',
         help='IP network address(es)')
     parser.add_argument('--debug', action='store_true',
         help='run with noisy debug message output')
@@ -222,14 +987,28 @@ $ {PROGRAM_NAME} 140.82.113.123 --in 140.82.112.0/23
         help='run with verbose message output')
     parser.add_argument('--in', metavar='<network>', dest='ip_network', default=False,
         help='check if an address is in a network')
+    parser.add_argument('--in-file', metavar='<path>', dest='in_files', action='append',
+        help='report the most specific network of CIDR list files (<network> [label] lines)')
     parser.add_argument('--geoinfo', '-g', action='store_true',
         help='lookup info for the address in GeoLite2 databases (Default: False)')
     parser.add_argument('--geolite2-asn', default='./GeoLite2-ASN.mmdb', metavar='<path>',
         help='path to a GeoLite2-ASN database (Defaut: ./GeoLite2-ASN.mmdb)')
     parser.add_argument('--geolite2-city', default='./GeoLite2-City.mmdb', metavar='<path>',
         help='path to a GeoLite2-ASN database (Defaut: ./GeoLite2-City.mmdb)')
+    parser.add_argument('--stdin', action='store_true',
+        help='write a record for the address on each line of stdin')
+    parser.add_argument('--file', metavar='<path>', dest='files', action='append',
+        help='write a record for the address on each line of a file')
+    parser.add_argument('--attributes', metavar='<attr,...>', default=BULK_ATTRIBUTES,
+        help=f'address attributes of --stdin/--file records (Default: {BULK_ATTRIBUTES})')
+    parser.add_argument('--aggregate', action='store_true',
+        help='write the fewest networks covering the addresses and networks of <address>, --file and --stdin')
+    parser.add_argument('--output-format', choices=['ndjson', 'csv'], default='ndjson',
+        help='--stdin/--file record format (Default: ndjson)')
     parser.set_defaults(func=main)
     argv, remaining_argv = parser.parse_known_args()
+    if not (argv.addresses or argv.stdin or argv.files):
+        parser.error('the following arguments are required: <address>')
 
     # Setup logging
     logger = logging.getLogger()
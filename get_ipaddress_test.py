@@ -0,0 +1,391 @@
+import io
+import ipaddress
+import json
+import types
+
+import pytest
+
+import get_ipaddress
+from get_ipaddress import (
+    CACHES,
+    BULK_ATTRIBUTES,
+    FLAG_ATTRIBUTES,
+    READERS,
+    FlagTable,
+    NetworkCache,
+    NetworkIndex,
+    address_format,
+    aggregate,
+    bulk,
+    close_readers,
+    get_geoinfo,
+    get_record,
+    parse_address,
+    parse_network,
+    range_networks,
+    read_networks,
+    record_format,
+)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "140.82.112.3",
+        "0.0.0.0",
+        "::1",
+        "::ffff:140.82.112.3",
+        "2a09:bac3:6596:1ceb::2f8:1e",
+        "fe80::1%eth0",
+        "140.82.112.3/25",
+        "2a09:bac3:6596:1ceb::/64",
+    ],
+)
+def test_parse_address(text):
+    if "/" in text:
+        expected = ipaddress.ip_network(text, strict=False)
+    else:
+        expected = ipaddress.ip_address(text)
+    assert parse_address(text) == expected
+    assert type(parse_address(text)) is type(expected)
+
+
+@pytest.mark.parametrize(
+    "text", ["", "140.82.112", "140.82.112.03", "256.0.0.1", " ::1", "1::2::3"]
+)
+def test_parse_address_invalid(text):
+    with pytest.raises(ValueError):
+        parse_address(text)
+
+
+def test_bulk(tmp_path):
+    path = tmp_path / "addresses.txt"
+    path.write_text("# clients\n140.82.112.3\n\nbad\n10.0.0.0/8\n140.82.112.3\n")
+    output = io.StringIO()
+    bulk(addresses=["::1"], files=[str(path)], output=output)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["address"] for record in records] == [
+        "::1",
+        "140.82.112.3",
+        "bad",
+        "10.0.0.0/8",
+        "140.82.112.3",
+    ]
+    assert records[1] == {
+        "address": "140.82.112.3",
+        "version": 4,
+        "compressed": "140.82.112.3",
+        "is_private": False,
+        "is_global": True,
+        "error": None,
+    }
+    assert records[2]["version"] is None
+    assert "does not appear to be" in records[2]["error"]
+    assert records[3]["is_private"] is True
+
+
+def test_bulk_csv():
+    output = io.StringIO()
+    bulk(
+        addresses=["140.82.112.3", "140.82.112.0/20"],
+        attributes="num_addresses, prefixlen",
+        output_format="csv",
+        output=output,
+    )
+    assert output.getvalue().splitlines() == [
+        "address,num_addresses,prefixlen,error",
+        "140.82.112.3,,,",
+        "140.82.112.0/20,4096,20,",
+    ]
+
+
+@pytest.mark.parametrize("output_format", ["ndjson", "csv"])
+@pytest.mark.parametrize(
+    "attributes",
+    ["version,compressed", BULK_ATTRIBUTES, ",".join(FLAG_ATTRIBUTES)],
+)
+def test_address_format(attributes, output_format):
+    attributes = attributes.split(",")
+    format_address = address_format(
+        attributes=attributes, output_format=output_format
+    )
+    format_record = record_format(
+        ["address", *attributes, "error"], output_format=output_format
+    )
+    texts = [
+        "140.82.112.3",
+        "10.1.2.3",
+        "100.64.0.1",
+        "0.0.0.0",
+        "255.255.255.255",
+        "::",
+        "::1",
+        "FE80::1",
+        "2a09:bac3:6596:1ceb::2f8:1e",
+        "2001:db8:0:0:1:0:0:1",
+        "ff02::1",
+    ]
+    for text in texts:
+        assert format_address(text) == format_record(
+            get_record(text, attributes=attributes)
+        )
+    # Embedded IPv4 notation is left to ipaddress for the compressed form
+    for text in ["::ffff:10.1.2.3", "::10.1.2.3"]:
+        expected = format_record(get_record(text, attributes=attributes))
+        if "compressed" in attributes:
+            expected = None
+        assert format_address(text) == expected
+    # Networks, scoped addresses and errors are left to ipaddress
+    for text in ["fe80::1%eth0", "10.0.0.0/8", "bad"]:
+        assert format_address(text) is None
+    assert address_format(attributes=["version", "exploded"]) is None
+
+
+def test_flag_table():
+    for version, bits in ((4, 32), (6, 128)):
+        table = FlagTable.get(version)
+        for start in table.starts:
+            for value in (start - 1, start, start + 1):
+                value %= 1 << bits
+                address = ipaddress.ip_address(value)
+                if address.version != version:
+                    address = ipaddress.IPv6Address(value)
+                for attr in FLAG_ATTRIBUTES:
+                    assert table.lookup(attr, value) == getattr(address, attr)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "140.82.112.0/20",
+        "140.82.113.123/20",
+        "140.82.113.123",
+        "0.0.0.0/0",
+        "2a09:bac3::/32",
+        "::1",
+        "10.0.0.0/255.0.0.0",
+    ],
+)
+def test_parse_network(text):
+    network = ipaddress.ip_network(text, strict=False)
+    assert parse_network(text) == (
+        network.version,
+        int(network.network_address),
+        int(network.broadcast_address),
+        network.prefixlen,
+    )
+
+
+@pytest.mark.parametrize("text", ["10.0.0.0/33", "10.0.0.0/+8", "::/129", "bad/8"])
+def test_parse_network_invalid(text):
+    with pytest.raises(ValueError):
+        parse_network(text)
+
+
+def test_network_index(tmp_path):
+    path = tmp_path / "ranges.txt"
+    path.write_text(
+        "# cloud\n"
+        "140.82.112.0/20 github\n"
+        "140.82.113.0/24, github api\n"
+        "10.0.0.0/8\n"
+        "10.1.2.3\n"
+        "bad\n"
+        "2a09:bac3::/32 cloudflare\n"
+        "192.168.0.0/16\tlan\toffice\n"
+    )
+    index = NetworkIndex(read_networks([str(path)]))
+    assert len(index) == 6
+    lookup = lambda text: index.lookup(parse_address(text))
+    assert lookup("140.82.113.123") == ("140.82.113.0/24", "github api")
+    assert lookup("140.82.114.1") == ("140.82.112.0/20", "github")
+    assert lookup("140.82.112.0") == ("140.82.112.0/20", "github")
+    assert lookup("10.1.2.3") == ("10.1.2.3/32", "ranges")
+    assert lookup("10.1.2.4") == ("10.0.0.0/8", "ranges")
+    assert lookup("2a09:bac3:6596:1ceb::2f8:1e") == ("2a09:bac3::/32", "cloudflare")
+    assert lookup("192.168.1.1") == ("192.168.0.0/16", "lan\toffice")
+    assert lookup("8.8.8.8") is None
+    assert lookup("::ffff:10.1.2.3") is None
+    # Networks match the most specific network containing all of it
+    assert lookup("140.82.113.0/25") == ("140.82.113.0/24", "github api")
+    assert lookup("140.82.113.0/23") == ("140.82.112.0/20", "github")
+    assert lookup("140.82.0.0/16") is None
+
+
+def test_bulk_in_file(tmp_path):
+    path = tmp_path / "ranges.txt"
+    path.write_text("140.82.112.0/20 github\n")
+    output = io.StringIO()
+    index = NetworkIndex(read_networks([str(path)]))
+    bulk(
+        addresses=["140.82.113.123", "bad"],
+        attributes="version",
+        output_format="csv",
+        index=index,
+        output=output,
+    )
+    assert output.getvalue().splitlines() == [
+        "address,version,in_network,in_label,error",
+        "140.82.113.123,4,140.82.112.0/20,github,",
+        "bad,,,,'bad' does not appear to be an IPv4 or IPv6 address",
+    ]
+
+
+def test_network_cache():
+    cache = NetworkCache()
+    cache.set(ipaddress.ip_network("140.82.112.0/20"), {"asn": 36459})
+    cache.set(ipaddress.ip_network("140.82.113.0/24"), {"asn": 1})
+    cache.set(ipaddress.ip_network("2a09:bac3::/32"), {"asn": 13335})
+    assert cache.get(ipaddress.ip_address("140.82.113.123")) == {"asn": 1}
+    assert cache.get(ipaddress.ip_address("140.82.127.255")) == {"asn": 36459}
+    assert cache.get(ipaddress.ip_address("2a09:bac3:6596:1ceb::2f8:1e")) == {
+        "asn": 13335
+    }
+    assert cache.get(ipaddress.ip_address("140.82.128.0")) is None
+    assert cache.get(ipaddress.ip_address("::ffff:140.82.113.123")) is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_network_cache_eviction():
+    cache = NetworkCache(size=2)
+    cache.set(ipaddress.ip_network("10.0.0.0/8"), {"a": 1})
+    cache.set(ipaddress.ip_network("192.168.0.0/16"), {"b": 2})
+    # The least recently used network is evicted
+    assert cache.get(ipaddress.ip_address("10.1.2.3")) == {"a": 1}
+    cache.set(ipaddress.ip_network("172.16.0.0/12"), {"c": 3})
+    assert cache.get(ipaddress.ip_address("192.168.1.1")) is None
+    assert cache.get(ipaddress.ip_address("10.1.2.3")) == {"a": 1}
+    assert cache.order[4] == [12, 8]
+
+
+def test_get_geoinfo_cached_by_network(monkeypatch):
+    queries = []
+
+    class Reader(object):
+        def asn(self, address):
+            queries.append(address)
+            return types.SimpleNamespace(
+                autonomous_system_number=36459,
+                autonomous_system_organization="GITHUB",
+                network=ipaddress.ip_network("140.82.112.0/20"),
+            )
+
+        def city(self, address):
+            queries.append(address)
+            names = {"en": "United States"}
+            return types.SimpleNamespace(
+                city=types.SimpleNamespace(names={}),
+                continent=types.SimpleNamespace(code="NA", names=names),
+                country=types.SimpleNamespace(iso_code="US", names=names),
+                subdivisions=types.SimpleNamespace(
+                    most_specific=types.SimpleNamespace(iso_code=None, name=None)
+                ),
+                traits=types.SimpleNamespace(
+                    network=ipaddress.ip_network("140.82.112.0/22")
+                ),
+            )
+
+    monkeypatch.setitem(READERS, "asn.mmdb", Reader())
+    monkeypatch.setitem(READERS, "city.mmdb", Reader())
+    monkeypatch.setitem(CACHES, "asn.mmdb", NetworkCache())
+    monkeypatch.setitem(CACHES, "city.mmdb", NetworkCache())
+    paths = {"geolite2_asn": "asn.mmdb", "geolite2_city": "city.mmdb"}
+    first = get_geoinfo(ipaddress.ip_address("140.82.112.3"), **paths)
+    assert first["asn"] == 36459
+    assert first["country"] == "US, United States"
+    assert get_geoinfo(ipaddress.ip_address("140.82.113.123"), **paths) == first
+    assert queries == ["140.82.112.3", "140.82.112.3"]
+    # Outside the city answer's /22 only the city database is queried
+    get_geoinfo(ipaddress.ip_address("140.82.127.1"), **paths)
+    assert queries[2:] == ["140.82.127.1"]
+
+
+def test_get_reader_shared(monkeypatch):
+    opened = []
+    closed = []
+
+    class AddressNotFoundError(Exception):
+        pass
+
+    class Reader(object):
+        def __init__(self, path, mode=None):
+            opened.append((path, mode))
+            self.path = path
+
+        def asn(self, address):
+            return types.SimpleNamespace(
+                autonomous_system_number=36459,
+                autonomous_system_organization="GITHUB",
+                network=ipaddress.ip_network(f"{address}/32"),
+            )
+
+        def city(self, address):
+            raise AddressNotFoundError(address)
+
+        def close(self):
+            closed.append(self.path)
+
+    geoip2 = types.SimpleNamespace(
+        database=types.SimpleNamespace(Reader=Reader, MODE_MMAP=1),
+        errors=types.SimpleNamespace(AddressNotFoundError=AddressNotFoundError),
+    )
+    monkeypatch.setattr(get_ipaddress, "geoip2", geoip2, raising=False)
+    monkeypatch.setattr(get_ipaddress, "READERS", {})
+    monkeypatch.setattr(get_ipaddress, "CACHES", {})
+    paths = {"geolite2_asn": "asn.mmdb", "geolite2_city": "city.mmdb"}
+    for i in range(100):
+        geoinfo = get_geoinfo(ipaddress.ip_address(f"140.82.112.{i}"), **paths)
+        assert geoinfo == {
+            "asn": 36459,
+            "asn_network": "GITHUB",
+            "asn_organization": f"140.82.112.{i}/32",
+        }
+    # Each database is opened once, memory-mapped, and closed on exit
+    assert opened == [("asn.mmdb", 1), ("city.mmdb", 1)]
+    close_readers()
+    assert sorted(closed) == ["asn.mmdb", "city.mmdb"]
+    assert get_ipaddress.READERS == {}
+
+
+def test_range_networks():
+    first = int(ipaddress.ip_address("10.0.0.1"))
+    last = int(ipaddress.ip_address("10.0.1.0"))
+    expected = ipaddress.summarize_address_range(
+        ipaddress.ip_address(first), ipaddress.ip_address(last)
+    )
+    assert [
+        str(ipaddress.IPv4Network(network))
+        for network in range_networks(first, last, 32)
+    ] == [str(network) for network in expected]
+    assert list(range_networks(0, 2**128 - 1, 128)) == [(0, 0)]
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1024])
+def test_aggregate(tmp_path, chunk_size):
+    path = tmp_path / "blocklist.txt"
+    path.write_text(
+        "# blocklist\n"
+        "10.0.0.0/25\n"
+        "10.0.0.128/25\n"
+        "10.0.1.0/24\n"
+        "10.0.0.5\n"
+        "bad\n"
+        "192.168.1.7/30\n"
+        "2a09:bac3::/33\n"
+        "2a09:bac3:8000::/33\n"
+        "::1\n"
+        "10.0.3.0/24\n"
+    )
+    output = io.StringIO()
+    aggregate(
+        addresses=["10.0.2.0/24"],
+        files=[str(path)],
+        chunk_size=chunk_size,
+        output=output,
+    )
+    assert output.getvalue().splitlines() == [
+        "10.0.0.0/22",
+        "192.168.1.4/30",
+        "::1/128",
+        "2a09:bac3::/32",
+    ]